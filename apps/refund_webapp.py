@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+from dataclasses import asdict
+import time
+
 import pandas as pd
 import streamlit as st
 
+from refund_engine.analysis_jobs import (
+    ACTIVE_STATUSES,
+    AnalysisJobRunner,
+    job_events,
+    job_row_deltas,
+    list_jobs,
+    request_cancel,
+)
 from refund_engine.config import get_openai_settings
+from refund_engine.datasets import coerce_float
+from refund_engine.resources import SharedResources, get_shared_resources
+from refund_engine.row_selection import default_fields
+from refund_engine.sheet_browser import SheetFilter, selected_row_indices, sheet_page, sheet_shape
 from refund_engine.web_analysis import (
     ColumnMapping,
-    analyze_rows_dataframe,
-    parse_row_selection,
     suggest_column_mapping,
 )
 from refund_engine.workbook_repository import (
@@ -19,9 +32,9 @@ from refund_engine.workbook_repository import (
     list_uploaded_invoice_files,
     list_workbooks,
     read_diff_summary,
-    read_sheet_dataframe,
+    read_sheet_table,
     get_invoice_upload_dir,
-    write_updated_sheet_as_new_version,
+    write_sheet_updates_as_new_version,
 )
 
 
@@ -30,6 +43,29 @@ st.title("Refund Engine Local Webapp")
 st.caption("Upload workbooks, track versions, and run targeted OpenAI row analysis.")
 
 
+JOB_POLL_SECONDS = 1.5
+PAGE_SIZES = (50, 100, 250, 500)
+DECISION_FILTERS = ("Any", "REFUND", "NO REFUND", "REVIEW", "PASS")
+
+
+@st.cache_resource(show_spinner=False)
+def _job_runner(repo_root: str) -> AnalysisJobRunner:
+    # One worker pool per app process, shared by every browser session.
+    return AnalysisJobRunner(repo_root)
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_resources() -> SharedResources:
+    # Warm clients and reference tables once per process, off the request path.
+    resources = get_shared_resources()
+    resources.warm_up_in_background()
+    return resources
+
+
+def _job_label(job: dict) -> str:
+    return f"{job['created_at']} · {job['status']} · {job['done_rows']}/{job['total_rows']} rows · {job['job_id']}"
+
+
 def _version_entry(metadata: dict, version_id: str) -> dict | None:
     for entry in metadata.get("versions", []):
         if entry.get("version_id") == version_id:
@@ -37,16 +73,6 @@ def _version_entry(metadata: dict, version_id: str) -> dict | None:
     return None
 
 
-@st.cache_data(show_spinner=False)
-def _load_sheet(repo_root: str, workbook_id: str, version_id: str, sheet_name: str) -> pd.DataFrame:
-    return read_sheet_dataframe(
-        workbook_id,
-        version_id,
-        sheet_name,
-        root=repo_root,
-    )
-
-
 def _mapping_select(
     label: str,
     columns: list[str],
@@ -89,6 +115,17 @@ with st.sidebar:
         index=["low", "medium", "high"].index(defaults.text_verbosity),
     )
     max_invoice_pages = st.slider("Max Invoice Pages", min_value=1, max_value=20, value=4)
+    use_cache = st.checkbox(
+        "Reuse cached results",
+        value=True,
+        help="Rows identical to an earlier analysis (same evidence, model and knowledge base) skip the model",
+    )
+    shared_resources = _shared_resources()
+    with st.expander("Shared Resources"):
+        st.json(shared_resources.health())
+        if st.button("Warm Up"):
+            shared_resources.warm_up()
+            st.rerun()
 
 
 tab_upload, tab_analyze = st.tabs(["Upload / Versions", "Analyze Rows"])
@@ -213,78 +250,143 @@ with tab_analyze:
                 st.error("No sheets found in selected version.")
             else:
                 sheet = st.selectbox("Sheet", sheets)
-                df = _load_sheet(repo_root, workbook_id, version_id, sheet)
-                st.caption(f"Rows: {len(df):,} | Columns: {len(df.columns)}")
-                st.dataframe(df.head(200), use_container_width=True)
+                with st.spinner("Preparing sheet cache..."):
+                    columns, row_count = sheet_shape(workbook_id, version_id, sheet, root=repo_root)
+                st.caption(f"Rows: {row_count:,} | Columns: {len(columns)}")
 
-                suggestions = suggest_column_mapping(list(df.columns))
+                suggestions = suggest_column_mapping(columns)
 
                 st.markdown("### Column Mapping")
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     vendor_col = _mapping_select(
                         "Vendor Column",
-                        list(df.columns),
+                        columns,
                         suggestions.get("vendor"),
                     )
                     description_col = _mapping_select(
                         "Description Column",
-                        list(df.columns),
+                        columns,
                         suggestions.get("description"),
                     )
                     invoice_1_col = _mapping_select(
                         "Invoice 1 Column",
-                        list(df.columns),
+                        columns,
                         suggestions.get("invoice_1"),
                     )
                 with col2:
                     tax_amount_col = _mapping_select(
                         "Tax Amount Column",
-                        list(df.columns),
+                        columns,
                         suggestions.get("tax_amount"),
                     )
                     analysis_col = _mapping_select(
                         "Analysis Column",
-                        list(df.columns),
+                        columns,
                         suggestions.get("analysis_col"),
                     )
                     invoice_2_col = _mapping_select(
                         "Invoice 2 Column",
-                        list(df.columns),
+                        columns,
                         suggestions.get("invoice_2"),
                         required=False,
                     )
                 with col3:
                     tax_base_col = _mapping_select(
                         "Tax Base Column (optional)",
-                        list(df.columns),
+                        columns,
                         suggestions.get("tax_base"),
                         required=False,
                     )
                     invoice_number_col = _mapping_select(
                         "Invoice Number Column (optional)",
-                        list(df.columns),
+                        columns,
                         suggestions.get("invoice_number"),
                         required=False,
                     )
                     po_number_col = _mapping_select(
                         "PO Number Column (optional)",
-                        list(df.columns),
+                        columns,
                         suggestions.get("po_number"),
                         required=False,
                     )
 
+                st.markdown("### Browse Rows")
+                fcol1, fcol2, fcol3 = st.columns(3)
+                with fcol1:
+                    vendor_contains = st.text_input("Vendor contains", value="")
+                    unanalyzed_only = st.checkbox("Unanalyzed only", value=False)
+                with fcol2:
+                    min_amount = coerce_float(st.text_input("Min tax amount", value=""))
+                    max_amount = coerce_float(st.text_input("Max tax amount", value=""))
+                with fcol3:
+                    decision = st.selectbox("Final decision", DECISION_FILTERS)
+                    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+                sheet_filter = SheetFilter(
+                    vendor_col=vendor_col,
+                    vendor_contains=vendor_contains,
+                    amount_col=tax_amount_col,
+                    min_amount=min_amount,
+                    max_amount=max_amount,
+                    unanalyzed_col=analysis_col if unanalyzed_only else None,
+                    decision_col="Final_Decision",
+                    decision=None if decision == "Any" else decision,
+                )
+                page_number = st.number_input("Page", min_value=1, value=1, step=1)
+                page = sheet_page(
+                    workbook_id,
+                    version_id,
+                    sheet,
+                    sheet_filter,
+                    page=int(page_number) - 1,
+                    page_size=page_size,
+                    root=repo_root,
+                )
+                st.caption(
+                    f"Matched {len(page.matched_rows):,} of {page.total_rows:,} rows | "
+                    f"Page {page.page + 1} of {page.page_count}"
+                )
+                st.dataframe(page.rows, use_container_width=True)
+
                 st.markdown("### Row Selection")
-                row_selection = st.text_input(
-                    "Rows to analyze (e.g. 12,15,20-25)",
-                    value="",
+                selection_mode = st.radio(
+                    "Rows to analyze",
+                    ["Row expression", "All rows matching the filter"],
+                    horizontal=True,
                 )
-                try:
-                    selected_rows = parse_row_selection(row_selection, max_rows=len(df))
-                    st.caption(f"Selected rows: {selected_rows[:20]}{' ...' if len(selected_rows) > 20 else ''}")
-                except Exception as exc:
-                    selected_rows = []
-                    st.error(f"Invalid row selection: {exc}")
+                if selection_mode == "Row expression":
+                    row_selection = st.text_input(
+                        'Rows to analyze (e.g. 12,15,20-25 or vendor~"ORACLE" and tax_amount>=5000 and unanalyzed)',
+                        value="",
+                    )
+                    selection_fields = default_fields(
+                        {
+                            "vendor": vendor_col,
+                            "tax_amount": tax_amount_col,
+                            "description": description_col,
+                            "invoice_1": invoice_1_col,
+                            "analysis_col": analysis_col,
+                            "invoice_2": invoice_2_col,
+                            "tax_base": tax_base_col,
+                            "invoice_number": invoice_number_col,
+                            "po_number": po_number_col,
+                        }
+                    )
+                    try:
+                        selected_rows = selected_row_indices(
+                            workbook_id,
+                            version_id,
+                            sheet,
+                            row_selection,
+                            selection_fields,
+                            root=repo_root,
+                        )
+                    except Exception as exc:
+                        selected_rows = []
+                        st.error(f"Invalid row selection: {exc}")
+                else:
+                    selected_rows = page.matched_rows
+                st.caption(f"Selected rows: {selected_rows[:20]}{' ...' if len(selected_rows) > 20 else ''}")
 
                 can_analyze = all(
                     [
@@ -309,46 +411,80 @@ with tab_analyze:
                         invoice_number=invoice_number_col,
                         po_number=po_number_col,
                     )
-                    with st.spinner("Running OpenAI analysis..."):
-                        analyzed_df, events = analyze_rows_dataframe(
-                            df,
-                            mapping=mapping,
-                            row_indices=selected_rows,
-                            invoice_dir=invoice_dir,
-                            model=model or None,
-                            reasoning_effort=reasoning_effort,
-                            verbosity=verbosity,
-                            max_invoice_pages=max_invoice_pages,
-                        )
-
-                    st.session_state["analyzed_df"] = analyzed_df
-                    st.session_state["analysis_events"] = events
-                    st.session_state["analysis_context"] = {
-                        "workbook_id": workbook_id,
-                        "version_id": version_id,
-                        "sheet": sheet,
-                    }
-                    st.success(f"Analyzed {len(selected_rows)} rows.")
-
-                events = st.session_state.get("analysis_events")
-                analyzed_df = st.session_state.get("analyzed_df")
-                context = st.session_state.get("analysis_context", {})
-                context_matches = (
-                    context.get("workbook_id") == workbook_id
-                    and context.get("version_id") == version_id
-                    and context.get("sheet") == sheet
+                    # The job only needs the mapped columns, not the whole sheet.
+                    df = read_sheet_table(
+                        workbook_id,
+                        version_id,
+                        sheet,
+                        columns=[col for col in dict.fromkeys(asdict(mapping).values()) if col in columns],
+                        root=repo_root,
+                    )
+                    job_id = _job_runner(repo_root).submit(
+                        df,
+                        workbook_id=workbook_id,
+                        version_id=version_id,
+                        sheet_name=sheet,
+                        mapping=mapping,
+                        row_indices=selected_rows,
+                        invoice_dir=invoice_dir,
+                        model=model or None,
+                        reasoning_effort=reasoning_effort,
+                        verbosity=verbosity,
+                        max_invoice_pages=max_invoice_pages,
+                        use_cache=use_cache,
+                    )
+                    st.session_state["analysis_job_id"] = job_id
+                    st.success(f"Queued analysis job `{job_id}` for {len(selected_rows)} rows.")
+
+                # Starting the runner also closes out jobs a previous app process left running.
+                _job_runner(repo_root)
+                jobs = list_jobs(
+                    root=repo_root,
+                    workbook_id=workbook_id,
+                    version_id=version_id,
+                    sheet_name=sheet,
+                    limit=10,
                 )
-
-                if events and analyzed_df is not None and context_matches:
-                    st.markdown("### Analysis Results")
-                    st.dataframe(pd.DataFrame(events), use_container_width=True)
-
-                    if st.button("Save Analyzed Rows as New Version"):
-                        new_ref = write_updated_sheet_as_new_version(
+                job = None
+                if jobs:
+                    st.markdown("### Analysis Jobs")
+                    jobs_by_id = {entry["job_id"]: entry for entry in jobs}
+                    job_ids = list(jobs_by_id)
+                    preferred = st.session_state.get("analysis_job_id")
+                    job_id = st.selectbox(
+                        "Job",
+                        job_ids,
+                        index=job_ids.index(preferred) if preferred in job_ids else 0,
+                        format_func=lambda value: _job_label(jobs_by_id[value]),
+                    )
+                    st.session_state["analysis_job_id"] = job_id
+                    job = jobs_by_id[job_id]
+
+                if job is not None:
+                    active = job["status"] in ACTIVE_STATUSES
+                    total = int(job["total_rows"])
+                    done = int(job["done_rows"])
+                    st.progress(
+                        done / total if total else 1.0,
+                        text=f"{job['status']}: {done}/{total} rows",
+                    )
+                    if job.get("error"):
+                        st.warning(job["error"])
+                    if active and st.button("Cancel Job", disabled=job["status"] == "cancelling"):
+                        request_cancel(job["job_id"], root=repo_root)
+                        st.rerun()
+
+                    events = [item["event"] for item in job_events(job["job_id"], root=repo_root)]
+                    if events:
+                        st.markdown("### Analysis Results")
+                        st.dataframe(pd.DataFrame(events), use_container_width=True)
+
+                    if events and not active and st.button("Save Analyzed Rows as New Version"):
+                        new_ref = write_sheet_updates_as_new_version(
                             workbook_id,
                             version_id,
                             sheet,
-                            analyzed_df,
+                            job_row_deltas(job["job_id"], root=repo_root),
                             note="analyzed",
                             root=repo_root,
                         )
@@ -357,3 +493,8 @@ with tab_analyze:
                             "Saved new version "
                             f"`{new_ref.version_id}` for workbook `{new_ref.workbook_id}`."
                         )
+
+                    if active:
+                        # Poll: rerun the page until the job finishes.
+                        time.sleep(JOB_POLL_SECONDS)
+                        st.rerun()
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from refund_engine.analysis.openai_analyzer import OpenAIAnalyzer, RowEvidence
+from refund_engine.config import CascadeSettings, ModelPricing, get_cascade_settings, get_openai_settings
+from refund_engine.validation_rules import (
+    auto_repair_output_row,
+    normalize_final_decision,
+    validate_output_row,
+)
+
+
+TIERS = ("fast", "analysis", "pro")
+
+
+def _confidence(result: dict[str, Any]) -> float:
+    try:
+        return float(result.get("Confidence") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def tier_cost(usage: dict[str, Any], pricing: ModelPricing | None) -> float | None:
+    if pricing is None:
+        return None
+    input_tokens = int(usage.get("input_tokens") or 0)
+    cached = min(int(usage.get("cached_tokens") or 0), input_tokens)
+    output_tokens = int(usage.get("output_tokens") or 0)
+    return (
+        (input_tokens - cached) * pricing.input
+        + cached * pricing.cached_input
+        + output_tokens * pricing.output
+    ) / 1_000_000
+
+
+class CascadeAnalyzer:
+    """
+    Runs `model_fast` at low effort first and escalates to `model_analysis`
+    and then `model_pro`.
+
+    The fast tier's answer is accepted when it validates, is not REVIEW,
+    meets the confidence threshold and the row's tax amount is within the
+    fast tier's limit (rows above the limit skip it). The analysis tier's
+    answer is accepted unless the row is high-dollar or its decision
+    conflicts with the fast tier's. A tier that fails (e.g. a reply that
+    is not JSON) escalates to the next one; only the pro tier raises. RAG
+    retrieval and the vendor profile are fetched once and shared by every
+    tier.
+    """
+
+    def __init__(self, analyzer: OpenAIAnalyzer, settings: CascadeSettings | None = None):
+        openai_settings = get_openai_settings()
+        self.analyzer = analyzer
+        self.settings = settings or get_cascade_settings()
+        self.models = {
+            "fast": openai_settings.model_fast,
+            "analysis": analyzer.model,
+            "pro": openai_settings.model_pro,
+        }
+        self.efforts = {
+            "fast": self.settings.fast_reasoning_effort,
+            "analysis": analyzer.reasoning_effort,
+            "pro": self.settings.pro_reasoning_effort,
+        }
+
+    def cache_signature(self) -> dict[str, Any]:
+        settings = self.settings
+        return {
+            **self.analyzer.cache_signature(),
+            "cascade": {
+                "models": self.models,
+                "reasoning_efforts": self.efforts,
+                "accept_confidence": settings.accept_confidence,
+                "fast_max_tax_amount": settings.fast_max_tax_amount,
+                "pro_min_tax_amount": settings.pro_min_tax_amount,
+            },
+        }
+
+    def _run_tier(
+        self,
+        tier: str,
+        evidence: RowEvidence,
+        context: Any,
+        *,
+        final: bool = False,
+    ) -> tuple[dict[str, Any] | None, dict[str, Any], dict[str, Any]]:
+        """
+        Run one tier. A failing non-final tier returns no result and a
+        record escalated with reason "error"; only the final tier raises.
+        """
+        started = time.perf_counter()
+        record: dict[str, Any] = {
+            "tier": tier,
+            "model": self.models[tier],
+            "reasoning_effort": self.efforts[tier],
+        }
+        try:
+            result, metadata = self.analyzer.analyze_row(
+                evidence,
+                context=context,
+                model=self.models[tier],
+                reasoning_effort=self.efforts[tier],
+            )
+        except Exception as exc:
+            if final:
+                raise
+            record.update(
+                error=f"{type(exc).__name__}: {exc}",
+                latency_ms=round((time.perf_counter() - started) * 1000.0, 3),
+                outcome="escalated",
+                reason="error",
+            )
+            return None, {}, record
+        result, _ = auto_repair_output_row(result)
+        errors = validate_output_row(result)
+        record.update(
+            final_decision=normalize_final_decision(result.get("Final_Decision")),
+            confidence=_confidence(result),
+            validation_errors=len(errors),
+            input_tokens=metadata.get("input_tokens"),
+            cached_tokens=metadata.get("cached_tokens"),
+            output_tokens=metadata.get("output_tokens"),
+            latency_ms=round((time.perf_counter() - started) * 1000.0, 3),
+        )
+        return result, metadata, record
+
+    def analyze_row(self, evidence: RowEvidence) -> tuple[dict[str, Any], dict[str, Any]]:
+        settings = self.settings
+        context = self.analyzer.prepare_context(evidence)
+        amount = evidence.tax_amount
+        high_dollar = amount is not None and amount >= settings.pro_min_tax_amount
+        records: list[dict[str, Any]] = []
+
+        fast_decision = None
+        if amount is not None and amount <= settings.fast_max_tax_amount:
+            result, metadata, record = self._run_tier("fast", evidence, context)
+            records.append(record)
+            if result is None:
+                pass  # escalated with reason "error"
+            elif record["validation_errors"]:
+                record["outcome"], record["reason"] = "escalated", "validation_failed"
+            elif record["final_decision"] == "REVIEW":
+                record["outcome"], record["reason"] = "escalated", "review"
+            elif record["confidence"] < settings.accept_confidence:
+                record["outcome"], record["reason"] = "escalated", "low_confidence"
+            else:
+                record["outcome"], record["reason"] = "accepted", "confident"
+                return result, {**metadata, "cascade": {"final_tier": "fast", "tiers": records}}
+            if record["reason"] == "low_confidence":
+                # Only a valid, non-REVIEW fast answer can conflict with the analysis tier.
+                fast_decision = record["final_decision"]
+
+        result, metadata, record = self._run_tier("analysis", evidence, context)
+        records.append(record)
+        if result is not None:
+            conflict = fast_decision is not None and fast_decision != record["final_decision"]
+            if not (high_dollar or conflict):
+                record["outcome"], record["reason"] = "accepted", "within_tier"
+                return result, {**metadata, "cascade": {"final_tier": "analysis", "tiers": records}}
+            record["outcome"], record["reason"] = "escalated", "high_dollar" if high_dollar else "conflict"
+
+        result, metadata, record = self._run_tier("pro", evidence, context, final=True)
+        records.append(record)
+        record["outcome"], record["reason"] = "accepted", "final_tier"
+        return result, {**metadata, "cascade": {"final_tier": "pro", "tiers": records}}
+
+    def repair_row(
+        self,
+        evidence: RowEvidence,
+        metadata: dict[str, Any],
+        validation_errors: list[str],
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        """Repair with the wrapped analyzer and charge the call to the accepted (last) tier."""
+        started = time.perf_counter()
+        result, repaired = self.analyzer.repair_row(evidence, metadata, validation_errors)
+        cascade = metadata.get("cascade")
+        if not cascade:
+            return result, repaired
+        # A repair without a stored response id re-runs the row; its usage is top-level.
+        usage = repaired.get("repair") or repaired
+        records = [dict(record) for record in cascade["tiers"]]
+        final = records[-1]
+        for key in ("input_tokens", "cached_tokens", "output_tokens"):
+            final[key] = int(final.get(key) or 0) + int(usage.get(key) or 0)
+        final["latency_ms"] = round(
+            float(final.get("latency_ms") or 0.0) + (time.perf_counter() - started) * 1000.0, 3
+        )
+        final["repaired"] = True
+        return result, {**repaired, "cascade": {**cascade, "tiers": records}}
+
+
+def summarize_cascade(
+    metadatas: list[dict[str, Any]],
+    pricing: dict[str, ModelPricing] | None = None,
+) -> dict[str, Any]:
+    """Per-tier calls, accepted rows, tokens, latency and (when priced) cost."""
+    pricing = pricing or {}
+    tiers = {
+        tier: {
+            "calls": 0,
+            "accepted_rows": 0,
+            "input_tokens": 0,
+            "cached_tokens": 0,
+            "output_tokens": 0,
+            "latency_ms": 0.0,
+            "cost_usd": 0.0 if tier in pricing else None,
+        }
+        for tier in TIERS
+    }
+    for metadata in metadatas:
+        cascade = metadata.get("cascade") or {}
+        for record in cascade.get("tiers", []):
+            stats = tiers[record["tier"]]
+            stats["calls"] += 1
+            stats["accepted_rows"] += 1 if record.get("outcome") == "accepted" else 0
+            for key in ("input_tokens", "cached_tokens", "output_tokens"):
+                stats[key] += int(record.get(key) or 0)
+            stats["latency_ms"] += float(record.get("latency_ms") or 0.0)
+            cost = tier_cost(record, pricing.get(record["tier"]))
+            if cost is not None:
+                stats["cost_usd"] += cost
+
+    rows = sum(stats["accepted_rows"] for stats in tiers.values())
+    for stats in tiers.values():
+        stats["row_share"] = round(stats["accepted_rows"] / rows, 4) if rows else 0.0
+        stats["avg_latency_ms"] = round(stats["latency_ms"] / stats["calls"], 3) if stats["calls"] else 0.0
+        stats["latency_ms"] = round(stats["latency_ms"], 3)
+        if stats["cost_usd"] is not None:
+            stats["cost_usd"] = round(stats["cost_usd"], 6)
+    costs = [stats["cost_usd"] for stats in tiers.values() if stats["cost_usd"] is not None]
+    return {
+        "rows": rows,
+        "tiers": tiers,
+        "total_cost_usd": round(sum(costs), 6) if costs else None,
+    }
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+import hashlib
 import json
 import re
-from typing import Any
+from typing import Any, Protocol
 
 from refund_engine.config import get_openai_settings
 from refund_engine.openai_client import create_openai_client
@@ -14,6 +15,7 @@ from refund_engine.rag import (
 )
 from refund_engine.rate_validator import validate_rate
 from refund_engine.refund_calculator import calculate_refund
+from refund_engine.timing import span
 from refund_engine.validation_rules import (
     ensure_process_token,
     generate_process_token,
@@ -23,7 +25,7 @@ from refund_engine.validation_rules import (
 from refund_engine.vendor_profiles import load_vendor_profile
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class InvoiceEvidence:
     filename: str | None
     path: str | None
@@ -32,7 +34,7 @@ class InvoiceEvidence:
     warnings: tuple[str, ...] = ()
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RowEvidence:
     dataset_id: str
     row_index: int
@@ -48,6 +50,16 @@ class RowEvidence:
     jurisdiction: str | None = None
 
 
+def dataset_tax_type(dataset_id: str) -> str:
+    """Tax type of a dataset from its id, e.g. "use_tax_2024" -> "Use"."""
+    words = set(re.split(r"[^a-z]+", dataset_id.lower()))
+    if "use" in words:
+        return "Use"
+    if "sales" in words:
+        return "Sales"
+    return ""
+
+
 def _safe_str(value: Any) -> str:
     if value is None:
         return ""
@@ -101,6 +113,56 @@ def _invoice_section(name: str, invoice: InvoiceEvidence | None) -> str:
     )
 
 
+# Byte-stable across rows so the provider's prompt cache can reuse it; all
+# per-row content goes after it in `_analysis_prompt`.
+ANALYSIS_PROMPT_PREFIX = """
+You are a Washington state sales/use tax analyst. Transactions are from 2023-2024 and must use pre-October 1, 2025 law.
+Return only a single JSON object (no markdown, no prose outside JSON).
+If uncertain, use final_decision = "REVIEW" with a specific explanation.
+If retrieved legal context conflicts with invoice evidence, explain the conflict and choose "REVIEW".
+
+Use these controlled vocabularies:
+- product_type: License, Services, DAS, Maintenance, HW maintenance, HW\\SW maintenance, Hardware, HW Maintenance, Tangible goods, Digital good, Resale
+- refund_basis: MPU, Non-taxable, Partial OOS services, Wrong rate, Partial OOS shipment, OOS services, OOS shipment, B&O tax, Resale, Discount
+- tax_category: License, Services, Software maintenance, Hardware maintenance, Hardware, Tangible goods, Digital good, DAS, Maintenance
+- methodology (how refund allocation is determined): User location, Non-taxable, Headcount, Equipment Location, Wrong rate, Call center, Call center Retail, Retail stores, Engineering, Resale, RF Engineering, Ship-to location, Delivery out-of-state, Subscribers, MPU, Care+Retail, Fraud team, Project location, Call center + Marketing
+- sales_use_tax: Sales, Use, B&O
+
+Required JSON fields and types:
+{
+  "invoice_number": "string",
+  "invoice_date": "string",
+  "ship_to_address": "string",
+  "matched_line_item": "string",
+  "vendor_research": "string",
+  "product_description": "string",
+  "service_classification": "string",
+  "product_type": "string",
+  "refund_basis": "string",
+  "citation": "string",
+  "citation_source": "string",
+  "taxability_reasoning": "string",
+  "final_decision": "REFUND|NO REFUND|REVIEW|PASS",
+  "confidence": 0.0,
+  "estimated_refund": 0.0,
+  "explanation": "string",
+  "follow_up_questions": "string",
+  "tax_category": "string (from controlled list)",
+  "methodology": "string (from controlled list)",
+  "sales_use_tax": "Sales|Use|B&O"
+}
+
+The transaction to analyze follows.
+""".strip()
+
+ANALYSIS_PROMPT_CACHE_KEY = "refund-analysis-" + hashlib.sha256(ANALYSIS_PROMPT_PREFIX.encode("utf-8")).hexdigest()[:12]
+
+# Bump when the per-row prompt suffix or the payload-to-row mapping changes;
+# prefix edits are already covered by ANALYSIS_PROMPT_CACHE_KEY. Cached
+# analysis results are keyed on both.
+ANALYSIS_PROMPT_VERSION = "1"
+
+
 def _analysis_prompt(
     evidence: RowEvidence,
     *,
@@ -119,6 +181,8 @@ def _analysis_prompt(
         if rag_context is not None
         else "RAG legal context: none\n\nRAG vendor context: none"
     )
+    # The vendor profile is shared by every row of a vendor, so it sits
+    # directly after the static prefix to extend the cacheable span.
     vendor_profile_section = f"\nHistorical vendor profile:\n{vendor_profile}\n" if vendor_profile else ""
     extra_guidance = f"\nValidation feedback to fix:\n{guidance}\n" if guidance else ""
 
@@ -139,19 +203,8 @@ def _analysis_prompt(
             f"Report in matched_line_item as: \"[description] @ $[amount]\"\n"
         )
 
-    return f"""
-You are a Washington state sales/use tax analyst. Transactions are from 2023-2024 and must use pre-October 1, 2025 law.
-Return only a single JSON object (no markdown, no prose outside JSON).
-If uncertain, use final_decision = "REVIEW" with a specific explanation.
-If retrieved legal context conflicts with invoice evidence, explain the conflict and choose "REVIEW".
-
-Use these controlled vocabularies:
-- product_type: License, Services, DAS, Maintenance, HW maintenance, HW\\SW maintenance, Hardware, HW Maintenance, Tangible goods, Digital good, Resale
-- refund_basis: MPU, Non-taxable, Partial OOS services, Wrong rate, Partial OOS shipment, OOS services, OOS shipment, B&O tax, Resale, Discount
-- tax_category: License, Services, Software maintenance, Hardware maintenance, Hardware, Tangible goods, Digital good, DAS, Maintenance
-- methodology (how refund allocation is determined): User location, Non-taxable, Headcount, Equipment Location, Wrong rate, Call center, Call center Retail, Retail stores, Engineering, Resale, RF Engineering, Ship-to location, Delivery out-of-state, Subscribers, MPU, Care+Retail, Fraud team, Project location, Call center + Marketing
-- sales_use_tax: Sales, Use, B&O
-
+    suffix = f"""
+{vendor_profile_section}
 Row context:
 - dataset_id: {evidence.dataset_id}
 - row_index: {evidence.row_index}
@@ -169,32 +222,33 @@ Invoice evidence:
 {line_match_section}
 Internal RAG retrieval context:
 {rag_section}
-{vendor_profile_section}{rate_section}{extra_guidance}
-
-Required JSON fields and types:
-{{
-  "invoice_number": "string",
-  "invoice_date": "string",
-  "ship_to_address": "string",
-  "matched_line_item": "string",
-  "vendor_research": "string",
-  "product_description": "string",
-  "service_classification": "string",
-  "product_type": "string",
-  "refund_basis": "string",
-  "citation": "string",
-  "citation_source": "string",
-  "taxability_reasoning": "string",
-  "final_decision": "REFUND|NO REFUND|REVIEW|PASS",
-  "confidence": 0.0,
-  "estimated_refund": 0.0,
-  "explanation": "string",
-  "follow_up_questions": "string",
-  "tax_category": "string (from controlled list)",
-  "methodology": "string (from controlled list)",
-  "sales_use_tax": "Sales|Use|B&O"
-}}
+{rate_section}{extra_guidance}
 """.strip()
+    return f"{ANALYSIS_PROMPT_PREFIX}\n\n{suffix}"
+
+
+def _repair_prompt(validation_errors: list[str]) -> str:
+    issues = "\n".join(f"- {error}" for error in validation_errors)
+    return (
+        "Your previous JSON output failed validation:\n"
+        f"{issues}\n"
+        "Return the complete corrected JSON object only, with every required field."
+    )
+
+
+def _usage_metadata(response: Any) -> dict[str, Any]:
+    usage = getattr(response, "usage", None)
+    return {
+        "response_id": getattr(response, "id", None),
+        "input_tokens": getattr(usage, "input_tokens", None) if usage else None,
+        "output_tokens": getattr(usage, "output_tokens", None) if usage else None,
+        "cached_tokens": _cached_tokens(usage),
+    }
+
+
+def _cached_tokens(usage: Any) -> int | None:
+    details = getattr(usage, "input_tokens_details", None) if usage else None
+    return getattr(details, "cached_tokens", None) if details else None
 
 
 def _build_ai_reasoning(payload: dict[str, Any], evidence: RowEvidence, process_token: str) -> str:
@@ -248,7 +302,7 @@ def _build_ai_reasoning(payload: dict[str, Any], evidence: RowEvidence, process_
     return ensure_process_token("\n".join(lines), token=process_token)
 
 
-def _to_output_row(payload: dict[str, Any], evidence: RowEvidence) -> dict[str, Any]:
+def build_output_row(payload: dict[str, Any], evidence: RowEvidence) -> dict[str, Any]:
     process_token = generate_process_token()
     final_decision = normalize_final_decision(payload.get("final_decision"))
     confidence = _coerce_float(payload.get("confidence"), default=0.0)
@@ -285,6 +339,30 @@ def _to_output_row(payload: dict[str, Any], evidence: RowEvidence) -> dict[str,
     return output
 
 
+@dataclass(frozen=True, slots=True)
+class AnalysisContext:
+    """Retrieved context for a row; reusable across calls for the same row."""
+
+    rag_context: RAGContext | None
+    rag_warnings: tuple[str, ...]
+    vendor_profile: str | None
+
+
+class RowAnalyzer(Protocol):
+    """What the pipeline and web analysis need: `OpenAIAnalyzer` or `CascadeAnalyzer`."""
+
+    def analyze_row(self, evidence: RowEvidence) -> tuple[dict[str, Any], dict[str, Any]]: ...
+
+    def repair_row(
+        self,
+        evidence: RowEvidence,
+        metadata: dict[str, Any],
+        validation_errors: list[str],
+    ) -> tuple[dict[str, Any], dict[str, Any]]: ...
+
+    def cache_signature(self) -> dict[str, Any]: ...
+
+
 class OpenAIAnalyzer:
     def __init__(
         self,
@@ -293,26 +371,34 @@ class OpenAIAnalyzer:
         reasoning_effort: str | None = None,
         verbosity: str | None = None,
         rag_retriever: SupabaseRAGRetriever | None = None,
+        client: Any | None = None,
+        rag_from_env: bool = True,
     ):
         settings = get_openai_settings()
         self.model = model or settings.model_analysis
         self.reasoning_effort = reasoning_effort or settings.reasoning_effort
         self.verbosity = verbosity or settings.text_verbosity
-        self.client = create_openai_client(settings=settings)
+        self.client = client or create_openai_client(settings=settings)
         self.rag_retriever = rag_retriever
         self.rag_init_warning: str | None = None
         self.max_rag_chunk_chars = 420
-        if self.rag_retriever is None:
-            self.rag_retriever, self.rag_init_warning = SupabaseRAGRetriever.from_env()
+        # Callers that already resolved RAG setup (see resources.SharedResources) pass rag_from_env=False.
+        if self.rag_retriever is None and rag_from_env:
+            self.rag_retriever, self.rag_init_warning = SupabaseRAGRetriever.from_env(openai_client=self.client)
         if self.rag_retriever is not None:
             self.max_rag_chunk_chars = self.rag_retriever.rag_settings.max_chunk_chars
 
-    def analyze_row(
-        self,
-        evidence: RowEvidence,
-        *,
-        guidance: str | None = None,
-    ) -> tuple[dict[str, Any], dict[str, Any]]:
+    def cache_signature(self) -> dict[str, Any]:
+        """Settings that change this analyzer's output for the same evidence."""
+        return {
+            "model": self.model,
+            "reasoning_effort": self.reasoning_effort,
+            "verbosity": self.verbosity,
+            "rag_enabled": self.rag_retriever is not None,
+            "max_rag_chunk_chars": self.max_rag_chunk_chars,
+        }
+
+    def prepare_context(self, evidence: RowEvidence) -> AnalysisContext:
         rag_context: RAGContext | None = None
         rag_warnings: list[str] = []
         if self.rag_init_warning:
@@ -330,7 +416,25 @@ class OpenAIAnalyzer:
                 rag_warnings.append(f"RAG retrieval failed: {exc}")
                 rag_context = None
 
-        vendor_profile = load_vendor_profile(evidence.vendor)
+        with span("vendor.profile"):
+            vendor_profile = load_vendor_profile(evidence.vendor)
+        return AnalysisContext(rag_context, tuple(rag_warnings), vendor_profile)
+
+    def analyze_row(
+        self,
+        evidence: RowEvidence,
+        *,
+        guidance: str | None = None,
+        context: AnalysisContext | None = None,
+        model: str | None = None,
+        reasoning_effort: str | None = None,
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        if context is None:
+            context = self.prepare_context(evidence)
+        model = model or self.model
+        reasoning_effort = reasoning_effort or self.reasoning_effort
+        rag_context = context.rag_context
+        vendor_profile = context.vendor_profile
 
         prompt = _analysis_prompt(
             evidence,
@@ -339,31 +443,74 @@ class OpenAIAnalyzer:
             guidance=guidance,
             vendor_profile=vendor_profile,
         )
-        response = self.client.responses.create(
-            model=self.model,
-            input=prompt,
-            reasoning={"effort": self.reasoning_effort},
-            text={"verbosity": self.verbosity},
-        )
+        with span("openai.responses"):
+            response = self.client.responses.create(
+                model=model,
+                input=prompt,
+                reasoning={"effort": reasoning_effort},
+                text={"verbosity": self.verbosity},
+                prompt_cache_key=ANALYSIS_PROMPT_CACHE_KEY,
+            )
         output_text = (response.output_text or "").strip()
         payload = _parse_json_object(output_text)
-        result = _to_output_row(payload, evidence)
+        result = build_output_row(payload, evidence)
 
-        usage = getattr(response, "usage", None)
         metadata = {
-            "model": self.model,
-            "reasoning_effort": self.reasoning_effort,
+            "model": model,
+            "reasoning_effort": reasoning_effort,
             "verbosity": self.verbosity,
-            "response_id": getattr(response, "id", None),
-            "input_tokens": getattr(usage, "input_tokens", None) if usage else None,
-            "output_tokens": getattr(usage, "output_tokens", None) if usage else None,
+            **_usage_metadata(response),
             "rag_enabled": self.rag_retriever is not None,
             "rag_legal_chunks": len(rag_context.legal_chunks) if rag_context else 0,
             "rag_vendor_chunks": len(rag_context.vendor_chunks) if rag_context else 0,
-            "rag_warnings": rag_warnings,
+            "rag_warnings": list(context.rag_warnings),
             "vendor_profile_matched": vendor_profile is not None,
             "rate_validation": validate_rate(
                 evidence.rate, evidence.jurisdiction, evidence.tax_base, evidence.tax_amount,
             ).message,
         }
         return result, metadata
+
+    def repair_row(
+        self,
+        evidence: RowEvidence,
+        metadata: dict[str, Any],
+        validation_errors: list[str],
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        """
+        Ask for corrected JSON after a validation failure.
+
+        Continues the stored response via `previous_response_id` and sends
+        only the validation errors, so RAG retrieval, the vendor profile and
+        invoice text are not resent. Without a response id this falls back
+        to a full `analyze_row` with the errors as guidance.
+        """
+        previous_id = metadata.get("response_id")
+        if not previous_id:
+            guidance = (
+                "Your previous output failed validation. "
+                f"Fix these issues and return corrected JSON only: {validation_errors}"
+            )
+            return self.analyze_row(
+                evidence,
+                guidance=guidance,
+                model=metadata.get("model"),
+                reasoning_effort=metadata.get("reasoning_effort"),
+            )
+
+        # Continue on the model that produced the response.
+        with span("openai.repair"):
+            response = self.client.responses.create(
+                model=metadata.get("model") or self.model,
+                previous_response_id=previous_id,
+                input=_repair_prompt(validation_errors),
+                reasoning={"effort": metadata.get("reasoning_effort") or self.reasoning_effort},
+                text={"verbosity": self.verbosity},
+            )
+        payload = _parse_json_object((response.output_text or "").strip())
+        result = build_output_row(payload, evidence)
+        repaired = {
+            **metadata,
+            "repair": {**_usage_metadata(response), "validation_errors": list(validation_errors)},
+        }
+        return result, repaired
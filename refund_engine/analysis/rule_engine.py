@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+import threading
+from typing import Any, Iterable
+
+from refund_engine.analysis.openai_analyzer import RowEvidence, build_output_row, dataset_tax_type
+from refund_engine.constants import PROJECT_ROOT
+from refund_engine.rate_validator import validate_rate
+from refund_engine.refund_calculator import calculate_refund
+from refund_engine.validation_rules import (
+    auto_repair_output_row,
+    is_valid_citation,
+    normalize_final_decision,
+    validate_output_row,
+)
+from refund_engine.vendor_profiles import confidence_label, match_vendor_profile
+
+_TAX_RULES_PATH = PROJECT_ROOT / "knowledge_base" / "states" / "washington" / "tax_rules.json"
+_SCENARIOS: dict[str, Any] | None = None
+_SCENARIOS_LOCK = threading.Lock()
+
+RULE_REFUND_SOURCE = "rule_engine"
+
+# Refund bases whose legal support is a single tax_rules.json scenario.
+# "OOS services" and "Non-taxable" cover several scenarios and go to the model.
+_BASIS_SCENARIOS = {
+    "MPU": "multi_point_use",
+    "OOS shipment": "out_of_state_delivery",
+    "Partial OOS shipment": "out_of_state_delivery",
+    "Resale": "resale",
+}
+
+_PROFILE_FIELDS = {
+    "tax_category": "dominant_tax_category",
+    "product_type": "dominant_product_type",
+    "refund_basis": "dominant_refund_basis",
+    "methodology": "dominant_methodology",
+}
+
+
+@dataclass(frozen=True)
+class RulePolicy:
+    # Share of historical rows that must agree on the claim decision and on
+    # every dominant classification.
+    min_agreement: float = 0.9
+
+
+@dataclass(frozen=True)
+class RuleDecision:
+    result: dict[str, Any] | None
+    metadata: dict[str, Any]
+
+    @property
+    def decided(self) -> bool:
+        return self.result is not None
+
+
+def _scenarios() -> dict[str, Any]:
+    global _SCENARIOS
+    if _SCENARIOS is not None:
+        return _SCENARIOS
+    with _SCENARIOS_LOCK:
+        if _SCENARIOS is None:
+            scenarios: dict[str, Any] = {}
+            if _TAX_RULES_PATH.exists():
+                with open(_TAX_RULES_PATH) as f:
+                    scenarios = json.load(f).get("refund_scenarios", {})
+            _SCENARIOS = scenarios
+    return _SCENARIOS
+
+
+def _scenario_citation(scenario: dict[str, Any]) -> str:
+    legal_basis = scenario.get("legal_basis", {})
+    parts = [f"RCW {rcw}" for rcw in legal_basis.get("rcws", [])]
+    parts += [f"WAC {wac}" for wac in legal_basis.get("wacs", [])]
+    return ", ".join(part for part in parts if is_valid_citation(part))
+
+
+def _deferred(reason: str, **details: Any) -> RuleDecision:
+    return RuleDecision(None, {"engine": "rules", "decided": False, "reason": reason, **details})
+
+
+def classify_row(evidence: RowEvidence, policy: RulePolicy = RulePolicy()) -> RuleDecision:
+    """
+    Decide a row without the model when the vendor's history is clear-cut.
+
+    A row is decided when its vendor has a HIGH-confidence profile where
+    at least `min_agreement` of historical rows were claimed and share the
+    dominant tax category, product type, refund basis and methodology, the
+    refund basis maps to a single legal scenario, the rate check shows no
+    anomaly, and the resulting row passes validation. Everything else is
+    deferred with a reason.
+    """
+    if evidence.tax_amount is None:
+        return _deferred("no_tax_amount")
+    match = match_vendor_profile(evidence.vendor)
+    if match is None:
+        return _deferred("no_vendor_profile")
+    vendor_name, profile = match
+
+    total = int(profile.get("total_rows") or 0)
+    if confidence_label(total) != "HIGH":
+        return _deferred("profile_not_high_confidence", profile_vendor=vendor_name, profile_rows=total)
+
+    agreement = {"claimed": int(profile.get("claimed_count") or 0) / total}
+    for field, key in _PROFILE_FIELDS.items():
+        agreement[field] = int(profile.get(key, {}).get("count") or 0) / total
+    weakest = min(agreement, key=agreement.get)
+    if agreement[weakest] < policy.min_agreement:
+        return _deferred(
+            "profile_disagreement",
+            profile_vendor=vendor_name,
+            weakest=weakest,
+            agreement=round(agreement[weakest], 4),
+        )
+
+    values = {field: str(profile[key]["value"]).strip() for field, key in _PROFILE_FIELDS.items()}
+    scenario_key = _BASIS_SCENARIOS.get(values["refund_basis"])
+    scenario = _scenarios().get(scenario_key or "")
+    citation = _scenario_citation(scenario) if scenario else ""
+    if not citation:
+        return _deferred("refund_basis_not_rule_backed", profile_vendor=vendor_name, refund_basis=values["refund_basis"])
+
+    rate_check = validate_rate(evidence.rate, evidence.jurisdiction, evidence.tax_base, evidence.tax_amount)
+    if rate_check.is_wa and not (rate_check.rate_ok and rate_check.tax_calc_ok):
+        return _deferred("rate_anomaly", profile_vendor=vendor_name, rate_validation=rate_check.message)
+
+    # The vendor's own historical allocation beats the methodology-wide default.
+    mix = profile.get("methodology_mix", {}).get(values["methodology"], {})
+    if mix.get("avg_pct") is not None:
+        allocation = float(mix["avg_pct"])
+        estimated_refund = max(0.0, evidence.tax_amount * allocation)
+    else:
+        estimated_refund, source = calculate_refund(evidence.tax_amount, values["methodology"], 0.0)
+        if source != "calculated":
+            return _deferred("no_allocation", profile_vendor=vendor_name, methodology=values["methodology"])
+        allocation = estimated_refund / evidence.tax_amount if evidence.tax_amount else 0.0
+
+    confidence = round(min(agreement.values()), 4)
+    claimed = int(profile.get("claimed_count") or 0)
+    payload = {
+        "invoice_number": evidence.invoice_number or "",
+        "invoice_date": "",
+        "ship_to_address": "Not extracted (rule engine decision from vendor history)",
+        "matched_line_item": evidence.description,
+        "vendor_research": (
+            f"Historical vendor profile {vendor_name}: {claimed} of {total} rows claimed, "
+            f"{confidence:.0%} agreement on classification."
+        ),
+        "product_description": evidence.description or values["product_type"],
+        "service_classification": values["product_type"],
+        "product_type": values["product_type"],
+        "refund_basis": values["refund_basis"],
+        "citation": citation,
+        "citation_source": f"tax_rules.json: {scenario.get('name', scenario_key)}",
+        "taxability_reasoning": scenario.get("description", ""),
+        "final_decision": "REFUND",
+        "confidence": confidence,
+        "estimated_refund": estimated_refund,
+        "explanation": (
+            f"Decided by the rule engine: {values['refund_basis']} via {values['methodology']} "
+            f"at {allocation:.2%} allocation, consistent with {claimed}/{total} historical claims."
+        ),
+        "follow_up_questions": "",
+        "tax_category": values["tax_category"],
+        "methodology": values["methodology"],
+        "sales_use_tax": dataset_tax_type(evidence.dataset_id),
+    }
+    result, repairs = auto_repair_output_row(build_output_row(payload, evidence))
+    result["Estimated_Refund"] = round(estimated_refund, 2)
+    result["Refund_Source"] = RULE_REFUND_SOURCE
+    errors = validate_output_row(result)
+    if errors:
+        return _deferred("rule_output_invalid", profile_vendor=vendor_name, validation_errors=errors)
+
+    return RuleDecision(
+        result,
+        {
+            "engine": "rules",
+            "decided": True,
+            "rule": "vendor_consensus",
+            "profile_vendor": vendor_name,
+            "profile_rows": total,
+            "agreement": {key: round(value, 4) for key, value in agreement.items()},
+            "scenario": scenario_key,
+            "allocation": round(allocation, 4),
+            "auto_repairs": repairs,
+            "rate_validation": rate_check.message,
+        },
+    )
+
+
+@dataclass(frozen=True)
+class LabelledRow:
+    """A historically decided row, e.g. from the Phase 2 Master Refunds file."""
+
+    vendor: str
+    description: str
+    tax_amount: float | None
+    claimed: bool
+    tax_category: str = ""
+    refund_basis: str = ""
+    methodology: str = ""
+
+
+def _same(left: Any, right: Any) -> bool:
+    return " ".join(str(left or "").lower().split()) == " ".join(str(right or "").lower().split())
+
+
+def evaluate_rules(rows: Iterable[LabelledRow], policy: RulePolicy = RulePolicy()) -> dict[str, Any]:
+    """
+    Coverage of the rule engine and its precision against historical labels.
+
+    The vendor profiles are built from the same history, so the precision is
+    in-sample: it shows the fast path agrees with the labels it was derived
+    from, not how it does on new rows.
+    """
+    total = 0
+    decided = 0
+    decision_hits = 0
+    field_hits = {"tax_category": 0, "refund_basis": 0, "methodology": 0}
+    field_labelled = dict.fromkeys(field_hits, 0)
+    deferred: dict[str, int] = {}
+
+    for index, row in enumerate(rows):
+        total += 1
+        evidence = RowEvidence(
+            dataset_id="labels",
+            row_index=index,
+            vendor=row.vendor,
+            description=row.description,
+            tax_amount=row.tax_amount,
+            tax_base=None,
+            invoice_number=None,
+            po_number=None,
+            invoice_1=None,
+            invoice_2=None,
+        )
+        decision = classify_row(evidence, policy)
+        if not decision.decided:
+            reason = decision.metadata["reason"]
+            deferred[reason] = deferred.get(reason, 0) + 1
+            continue
+        decided += 1
+        result = decision.result or {}
+        if row.claimed == (normalize_final_decision(result.get("Final_Decision")) == "REFUND"):
+            decision_hits += 1
+        for field, column in (("tax_category", "Tax_Category"), ("refund_basis", "Refund_Basis"), ("methodology", "Methodology")):
+            label = getattr(row, field)
+            if not label:
+                continue
+            field_labelled[field] += 1
+            if _same(label, result.get(column)):
+                field_hits[field] += 1
+
+    return {
+        "rows": total,
+        "decided": decided,
+        "coverage": round(decided / total, 4) if total else 0.0,
+        "decision_precision": round(decision_hits / decided, 4) if decided else None,
+        "field_precision": {
+            field: round(field_hits[field] / field_labelled[field], 4) if field_labelled[field] else None
+            for field in field_hits
+        },
+        "deferred": dict(sorted(deferred.items(), key=lambda item: item[1], reverse=True)),
+    }
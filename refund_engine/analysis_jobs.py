@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+import uuid
+
+import pandas as pd
+
+from refund_engine import workbook_catalog as catalog
+from refund_engine.analysis.openai_analyzer import RowAnalyzer
+from refund_engine.resources import get_shared_resources
+from refund_engine.web_analysis import ColumnMapping, analyze_rows_dataframe, row_delta
+from refund_engine.workbook_repository import DEFAULT_REPOSITORY_ROOT
+
+
+ACTIVE_STATUSES = ("queued", "running", "cancelling")
+FINISHED_STATUSES = ("completed", "cancelled", "failed", "interrupted")
+# Runners refresh their active jobs' heartbeat this often; a job whose
+# heartbeat is older than HEARTBEAT_STALE_S has lost its runner.
+HEARTBEAT_INTERVAL_S = 10.0
+HEARTBEAT_STALE_S = 60.0
+_ACTIVE = ", ".join(f"'{status}'" for status in ACTIVE_STATUSES)
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _root(root: str | Path | None) -> Path:
+    return Path(root or DEFAULT_REPOSITORY_ROOT).expanduser()
+
+
+def _job_dict(row: Any) -> dict[str, Any]:
+    job = dict(row)
+    job["params"] = json.loads(job.pop("params_json"))
+    return job
+
+
+def get_job(job_id: str, *, root: str | Path | None = None) -> dict[str, Any] | None:
+    with catalog.connect(_root(root)) as conn:
+        row = conn.execute("SELECT * FROM analysis_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _job_dict(row) if row is not None else None
+
+
+def list_jobs(
+    *,
+    root: str | Path | None = None,
+    workbook_id: str | None = None,
+    version_id: str | None = None,
+    sheet_name: str | None = None,
+    limit: int = 20,
+) -> list[dict[str, Any]]:
+    """Newest first, optionally narrowed to one workbook version sheet."""
+    clauses, params = [], []
+    for column, value in (("workbook_id", workbook_id), ("version_id", version_id), ("sheet_name", sheet_name)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with catalog.connect(_root(root)) as conn:
+        rows = conn.execute(
+            f"SELECT * FROM analysis_jobs {where} ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (*params, max(0, int(limit))),
+        ).fetchall()
+    return [_job_dict(row) for row in rows]
+
+
+def job_events(job_id: str, *, root: str | Path | None = None, after_seq: int = 0) -> list[dict[str, Any]]:
+    """Row events recorded after `after_seq`, each with its `seq` and stored `result`."""
+    with catalog.connect(_root(root)) as conn:
+        rows = conn.execute(
+            """
+            SELECT seq, event_json, result_json FROM analysis_job_events
+             WHERE job_id = ? AND seq > ?
+             ORDER BY seq
+            """,
+            (job_id, int(after_seq)),
+        ).fetchall()
+    return [
+        {
+            "seq": int(row["seq"]),
+            "event": json.loads(row["event_json"]),
+            "result": json.loads(row["result_json"]) if row["result_json"] else None,
+        }
+        for row in rows
+    ]
+
+
+def job_row_deltas(job_id: str, *, root: str | Path | None = None) -> dict[int, dict[str, Any]]:
+    """Cell deltas of the rows a job has finished so far, keyed by row index."""
+    job = get_job(job_id, root=root)
+    if job is None:
+        raise KeyError(f"Unknown analysis job: {job_id}")
+    mapping = ColumnMapping(**job["params"]["mapping"])
+    # Jobs submitted before the flag was recorded always wrote the analysis column.
+    columns = (mapping.analysis_col,) if job["params"].get("analysis_col_in_sheet", True) else ()
+    return {
+        int(item["event"]["row_index"]): row_delta(item["result"], mapping, columns)
+        for item in job_events(job_id, root=root)
+        if item["result"] is not None
+    }
+
+
+def request_cancel(job_id: str, *, root: str | Path | None = None) -> bool:
+    """Ask a queued or running job to stop after its current row."""
+    with catalog.connect(_root(root), write=True) as conn:
+        cursor = conn.execute(
+            "UPDATE analysis_jobs SET status = 'cancelling' WHERE job_id = ? AND status IN ('queued', 'running')",
+            (job_id,),
+        )
+    return cursor.rowcount > 0
+
+
+def mark_interrupted_jobs(
+    *,
+    root: str | Path | None = None,
+    stale_after_s: float = HEARTBEAT_STALE_S,
+) -> int:
+    """
+    Close out active jobs whose runner has stopped heartbeating (e.g. the
+    app was restarted). Jobs of other live runners keep their status.
+    """
+    cutoff = time.time() - stale_after_s
+    with catalog.connect(_root(root), write=True) as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE analysis_jobs
+               SET status = 'interrupted', finished_at = ?,
+                   error = COALESCE(error, 'Worker process exited before the job finished')
+             WHERE status IN ({_ACTIVE}) AND COALESCE(heartbeat_at, 0) < ?
+            """,
+            (_now(), cutoff),
+        )
+    return cursor.rowcount
+
+
+class AnalysisJobRunner:
+    """
+    Runs webapp row analysis in the background on a local thread pool.
+
+    Job state and per-row events are written to the workbook catalog as each
+    row finishes, so progress can be polled from any session and completed
+    jobs outlive the app process. Cancellation is a status flag checked
+    between rows. A background thread refreshes the heartbeat of this
+    runner's active jobs so other processes can tell them from abandoned ones.
+    """
+
+    def __init__(
+        self,
+        root: str | Path | None = None,
+        *,
+        max_workers: int = 2,
+        analyzer_factory: Callable[..., RowAnalyzer] | None = None,
+        heartbeat_interval_s: float = HEARTBEAT_INTERVAL_S,
+    ):
+        self.root = _root(root)
+        self.token = uuid.uuid4().hex
+        self.analyzer_factory = analyzer_factory or get_shared_resources().analyzer
+        self.heartbeat_interval_s = heartbeat_interval_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._stopped = threading.Event()
+        mark_interrupted_jobs(root=self.root)
+        self._heartbeat = threading.Thread(
+            target=self._heartbeat_loop, name="analysis-job-heartbeat", daemon=True
+        )
+        self._heartbeat.start()
+
+    def submit(
+        self,
+        df: pd.DataFrame,
+        *,
+        workbook_id: str,
+        version_id: str,
+        sheet_name: str,
+        mapping: ColumnMapping,
+        row_indices: list[int],
+        invoice_dir: str,
+        model: str | None = None,
+        reasoning_effort: str | None = None,
+        verbosity: str | None = None,
+        max_invoice_pages: int = 4,
+        use_cache: bool = True,
+    ) -> str:
+        job_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        params = {
+            "mapping": asdict(mapping),
+            "analysis_col_in_sheet": mapping.analysis_col in df.columns,
+            "row_indices": [int(idx) for idx in row_indices],
+            "invoice_dir": invoice_dir,
+            "model": model,
+            "reasoning_effort": reasoning_effort,
+            "verbosity": verbosity,
+            "max_invoice_pages": max_invoice_pages,
+            "use_cache": use_cache,
+        }
+        with catalog.connect(self.root, write=True) as conn:
+            conn.execute(
+                """
+                INSERT INTO analysis_jobs (
+                    job_id, workbook_id, version_id, sheet_name, status, total_rows,
+                    params_json, worker_pid, runner_token, heartbeat_at, created_at
+                ) VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job_id,
+                    workbook_id,
+                    version_id,
+                    sheet_name,
+                    len(row_indices),
+                    json.dumps(params),
+                    os.getpid(),
+                    self.token,
+                    time.time(),
+                    _now(),
+                ),
+            )
+        self._executor.submit(self._run, job_id, df, params)
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        return request_cancel(job_id, root=self.root)
+
+    def shutdown(self, *, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        self._stopped.set()
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.heartbeat_interval_s):
+            try:
+                with catalog.connect(self.root, write=True) as conn:
+                    conn.execute(
+                        f"""
+                        UPDATE analysis_jobs SET heartbeat_at = ?
+                         WHERE runner_token = ? AND status IN ({_ACTIVE})
+                        """,
+                        (time.time(), self.token),
+                    )
+            except sqlite3.OperationalError:
+                # Busy catalog; the next beat is well within the stale cutoff.
+                continue
+
+    def _status(self, job_id: str) -> str | None:
+        with catalog.connect(self.root) as conn:
+            row = conn.execute("SELECT status FROM analysis_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row["status"] if row is not None else None
+
+    def _finish(self, job_id: str, status: str, error: str | None = None):
+        # A job another runner already closed out (e.g. as interrupted) stays closed.
+        with catalog.connect(self.root, write=True) as conn:
+            conn.execute(
+                f"""
+                UPDATE analysis_jobs SET status = ?, error = ?, finished_at = ?
+                 WHERE job_id = ? AND status IN ({_ACTIVE})
+                """,
+                (status, error, _now(), job_id),
+            )
+
+    def _run(self, job_id: str, df: pd.DataFrame, params: dict[str, Any]):
+        with catalog.connect(self.root, write=True) as conn:
+            started = conn.execute(
+                "UPDATE analysis_jobs SET status = 'running', started_at = ? WHERE job_id = ? AND status = 'queued'",
+                (_now(), job_id),
+            ).rowcount
+        if not started:
+            # Cancelled while still queued.
+            self._finish(job_id, "cancelled")
+            return
+
+        seq = 0
+
+        def on_row(event: dict[str, Any], result: dict[str, Any] | None):
+            nonlocal seq
+            seq += 1
+            with catalog.connect(self.root, write=True) as conn:
+                conn.execute(
+                    """
+                    INSERT INTO analysis_job_events (job_id, seq, row_index, event_json, result_json)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        job_id,
+                        seq,
+                        event.get("row_index"),
+                        json.dumps(event, default=str),
+                        json.dumps(result, default=str) if result is not None else None,
+                    ),
+                )
+                conn.execute("UPDATE analysis_jobs SET done_rows = ? WHERE job_id = ?", (seq, job_id))
+
+        try:
+            analyzer = self.analyzer_factory(
+                model=params["model"],
+                reasoning_effort=params["reasoning_effort"],
+                verbosity=params["verbosity"],
+            )
+            analyze_rows_dataframe(
+                df,
+                mapping=ColumnMapping(**params["mapping"]),
+                row_indices=params["row_indices"],
+                invoice_dir=params["invoice_dir"],
+                max_invoice_pages=params["max_invoice_pages"],
+                use_cache=params["use_cache"],
+                analyzer=analyzer,
+                on_row=on_row,
+                should_cancel=lambda: self._status(job_id) == "cancelling",
+            )
+        except Exception as exc:
+            self._finish(job_id, "failed", f"{type(exc).__name__}: {exc}")
+            return
+        cancelled = self._status(job_id) == "cancelling" and seq < len(params["row_indices"])
+        self._finish(job_id, "cancelled" if cancelled else "completed")
@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime
+import json
+from pathlib import Path
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from typing import Any
+
+from openpyxl import Workbook
+import yaml
+
+from refund_engine.analysis.openai_analyzer import OpenAIAnalyzer
+from refund_engine.config import SupabaseSettings, get_openai_settings, get_rag_settings
+from refund_engine.constants import PROJECT_ROOT, RUNS_DIR
+from refund_engine.dataset_session import DatasetSession
+from refund_engine.datasets import get_dataset_config, load_datasets_config, projected_columns
+from refund_engine.fake_services import FakeOpenAIClient, FakeSupabaseClient
+from refund_engine.pipeline import AnalyzeOptions, analyze_dataset
+from refund_engine.rag import SupabaseRAGRetriever
+from refund_engine.timing import profile_run_log
+
+
+DEFAULT_RESULTS_PATH = RUNS_DIR / "benchmarks" / "results.jsonl"
+
+_DESCRIPTIONS = (
+    "Cloud hosting subscription",
+    "Network switch hardware",
+    "Professional services - implementation",
+    "Software license renewal",
+    "Hardware maintenance agreement",
+    "Consulting services performed remotely",
+    "Data analytics platform access",
+    "Field engineering support",
+)
+
+
+@dataclass(frozen=True)
+class WorkloadSpec:
+    dataset_id: str = "use_tax_2024"
+    rows: int = 200
+    vendors: int = 25
+    extra_columns: int = 20
+    text_invoice_share: float = 0.7
+    scanned_invoice_share: float = 0.2
+    invoice_pool: int = 40
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class BenchmarkSettings:
+    openai_latency_ms: float = 0.0
+    embedding_latency_ms: float = 0.0
+    rag_latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    max_invoice_pages: int = 2
+    flush_every: int = 0
+    rag_enabled: bool = True
+    cascade: bool = False
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def text_pdf_bytes(lines: list[str]) -> bytes:
+    """Minimal single-page PDF with a real text layer (pdfplumber can read it)."""
+    content = "BT /F1 11 Tf 14 TL 50 760 Td " + " ".join(
+        f"({_pdf_escape(line)}) Tj T*" for line in lines
+    ) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets: list[int] = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n"
+    ).encode("latin-1")
+    return bytes(out)
+
+
+def scanned_pdf_bytes(lines: list[str]) -> bytes:
+    """Image-only PDF (no text layer), which forces the OCR path."""
+    from io import BytesIO
+
+    from PIL import Image, ImageDraw
+
+    image = Image.new("L", (1275, 1650), 255)
+    draw = ImageDraw.Draw(image)
+    for idx, line in enumerate(lines):
+        draw.text((90, 90 + idx * 28), line, fill=0)
+    buffer = BytesIO()
+    image.save(buffer, format="PDF", resolution=150.0)
+    return buffer.getvalue()
+
+
+def _invoice_lines(vendor: str, number: int, description: str, amount: float) -> list[str]:
+    return [
+        f"{vendor}",
+        "1200 Commerce Way, Austin, TX 78701",
+        f"INVOICE #INV-{number:06d}",
+        "Invoice date: 2024-03-01",
+        "Bill to: Example Wireless LLC, 1 Main St, Seattle, WA 98101",
+        "Ship to: Example Wireless LLC, 1 Main St, Seattle, WA 98101",
+        "",
+        "Description                                   Qty      Amount",
+        f"{description:<44}  1   {amount:>10,.2f}",
+        f"{'Support services':<44}  1   {amount * 0.1:>10,.2f}",
+        "",
+        f"Subtotal: {amount * 1.1:,.2f}",
+        f"Sales tax: {amount * 0.101:,.2f}",
+        f"Total due: {amount * 1.201:,.2f}",
+        "Terms: Net 30. Thank you for your business.",
+    ]
+
+
+def generate_workload(out_dir: str | Path, spec: WorkloadSpec = WorkloadSpec()) -> Path:
+    """
+    Write a synthetic dataset shaped like `spec.dataset_id` in datasets.yaml:
+    a source workbook, a pool of text and scanned invoice PDFs, and a
+    datasets.yaml pointing at them. Returns the config path.
+    """
+    out_dir = Path(out_dir)
+    invoices_dir = out_dir / "invoices"
+    invoices_dir.mkdir(parents=True, exist_ok=True)
+    template = load_datasets_config()[spec.dataset_id]
+    cols = template.columns
+    rng = random.Random(spec.seed)
+
+    vendors = [f"Synthetic Vendor {idx:03d} Inc" for idx in range(spec.vendors)]
+    # Skewed vendor mix: a few vendors account for most rows.
+    weights = [1.0 / (rank + 1) for rank in range(len(vendors))]
+
+    pool: list[str] = []
+    text_count = round(spec.invoice_pool * spec.text_invoice_share)
+    scanned_count = round(spec.invoice_pool * spec.scanned_invoice_share)
+    for idx in range(text_count + scanned_count):
+        vendor = vendors[idx % len(vendors)]
+        description = _DESCRIPTIONS[idx % len(_DESCRIPTIONS)]
+        lines = _invoice_lines(vendor, idx, description, 1000.0 + 37.5 * idx)
+        if idx < text_count:
+            name = f"text_{idx:04d}.pdf"
+            (invoices_dir / name).write_bytes(text_pdf_bytes(lines))
+        else:
+            name = f"scanned_{idx:04d}.pdf"
+            (invoices_dir / name).write_bytes(scanned_pdf_bytes(lines))
+        pool.append(name)
+    missing_share = max(0.0, 1.0 - spec.text_invoice_share - spec.scanned_invoice_share)
+
+    headers = list(projected_columns(template))
+    headers.extend(f"Extra Column {idx:02d}" for idx in range(spec.extra_columns))
+    filter_values = {
+        rule.column: (rule.value if rule.op == "equals" else "x") for rule in template.filters
+    }
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=template.sheet_name or "Sheet1")
+    ws.append(headers)
+    for row_idx in range(spec.rows):
+        vendor = rng.choices(vendors, weights=weights)[0]
+        amount = round(rng.uniform(10.0, 5000.0), 2)
+        if pool and rng.random() >= missing_share:
+            invoice_1 = rng.choice(pool)
+        else:
+            invoice_1 = f"missing_{row_idx:05d}.pdf"
+        values = {
+            cols.vendor: vendor,
+            cols.tax_amount: amount,
+            cols.invoice_1: invoice_1,
+            cols.analysis_col: None,
+        }
+        if cols.description:
+            values[cols.description] = rng.choice(_DESCRIPTIONS)
+        if cols.tax_base:
+            values[cols.tax_base] = round(amount / 0.101, 2)
+        if cols.invoice_number:
+            values[cols.invoice_number] = f"INV-{row_idx:06d}"
+        if cols.po_number:
+            values[cols.po_number] = f"PO-{row_idx:06d}"
+        if cols.rate:
+            values[cols.rate] = 0.101
+        if cols.jurisdiction:
+            values[cols.jurisdiction] = "WA"
+        values.update(filter_values)
+        ws.append(
+            [values.get(header, f"filler-{row_idx}" if header.startswith("Extra Column") else None) for header in headers]
+        )
+    source_file = out_dir / "source.xlsx"
+    wb.save(source_file)
+
+    spec_out = {
+        "description": f"Synthetic benchmark workload ({spec.rows} rows)",
+        "source_file": str(source_file),
+        "output_file": str(out_dir / "output.xlsx"),
+        "sheet_name": template.sheet_name,
+        "invoice_path": str(invoices_dir),
+        "columns": {key: value for key, value in asdict(cols).items() if value},
+        "filters": [
+            {"column": rule.column, "op": rule.op, "value": rule.value} for rule in template.filters
+        ],
+    }
+    config_path = out_dir / "datasets.yaml"
+    with open(config_path, "w") as f:
+        yaml.safe_dump({"datasets": {spec.dataset_id: spec_out}}, f, sort_keys=False)
+    return config_path
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def build_fake_analyzer(settings: BenchmarkSettings) -> tuple[OpenAIAnalyzer, FakeOpenAIClient, FakeSupabaseClient]:
+    openai_client = FakeOpenAIClient(
+        latency_ms=settings.openai_latency_ms,
+        embedding_latency_ms=settings.embedding_latency_ms,
+        jitter_ms=settings.jitter_ms,
+    )
+    supabase_client = FakeSupabaseClient(latency_ms=settings.rag_latency_ms, jitter_ms=settings.jitter_ms)
+    retriever = None
+    if settings.rag_enabled:
+        retriever = SupabaseRAGRetriever(
+            openai_settings=replace(get_openai_settings(), api_key="benchmark"),
+            supabase_settings=SupabaseSettings(url="http://benchmark.invalid", service_role_key="benchmark"),
+            rag_settings=replace(get_rag_settings(), enabled=True),
+            openai_client=openai_client,
+            supabase_client=supabase_client,
+        )
+    analyzer = OpenAIAnalyzer(client=openai_client, rag_retriever=retriever)
+    return analyzer, openai_client, supabase_client
+
+
+def run_benchmark(
+    config_path: str | Path,
+    dataset_id: str,
+    *,
+    work_dir: str | Path,
+    settings: BenchmarkSettings = BenchmarkSettings(),
+    rows: int | None = None,
+    scenario: str = "default",
+) -> dict[str, Any]:
+    """Run the full pipeline against the fakes and return a comparable result record."""
+    work_dir = Path(work_dir)
+    config = get_dataset_config(dataset_id, config_path=config_path)
+    session = DatasetSession(config, snapshot_dir=work_dir / "cache")
+    analyzer, openai_client, supabase_client = build_fake_analyzer(settings)
+    options = AnalyzeOptions(
+        dataset_id=dataset_id,
+        limit=rows if rows is not None else 1_000_000_000,
+        max_invoice_pages=settings.max_invoice_pages,
+        flush_every=settings.flush_every,
+        resume=False,
+        cascade=settings.cascade,
+        use_cache=False,
+        ledger_path=work_dir / "ledger.sqlite3",
+        run_log_dir=work_dir / "runs",
+        measure_memory=True,
+        config_path=config_path,
+    )
+
+    started = time.perf_counter()
+    summary = analyze_dataset(options, session=session, analyzer=analyzer)
+    wall_s = time.perf_counter() - started
+
+    processed = int(summary.get("selected_rows", 0))
+    profile = profile_run_log(summary["run_log"], top=5) if summary.get("run_log") else {}
+    return {
+        "scenario": scenario,
+        "created_at": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "dataset_id": dataset_id,
+        "settings": asdict(settings),
+        "rows": processed,
+        "wall_s": round(wall_s, 3),
+        "rows_per_sec": round(processed / wall_s, 3) if wall_s > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "memory": summary.get("memory"),
+        "status_counts": summary.get("status_counts", {}),
+        "token_usage": summary.get("token_usage", {}),
+        "cascade": summary.get("cascade"),
+        "stages": {
+            stage: {key: stats[key] for key in ("p50_ms", "p95_ms", "p99_ms", "total_ms")}
+            for stage, stats in profile.get("stages", {}).items()
+        },
+        "subsystem_share": profile.get("subsystem_share", {}),
+        "fake_calls": {
+            "responses": openai_client.calls["responses"],
+            "embeddings": openai_client.calls["embeddings"],
+            "rpc": supabase_client.calls,
+        },
+        "run_log": summary.get("run_log"),
+    }
+
+
+def append_result(result: dict[str, Any], path: str | Path = DEFAULT_RESULTS_PATH) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(result, default=str) + "\n")
+    return path
+
+
+def previous_result(scenario: str, path: str | Path = DEFAULT_RESULTS_PATH) -> dict[str, Any] | None:
+    path = Path(path)
+    if not path.exists():
+        return None
+    latest = None
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("scenario") == scenario:
+                latest = record
+    return latest
+
+
+def _pct_change(old: float | None, new: float | None) -> float | None:
+    if not old or new is None:
+        return None
+    return round((new - old) / old * 100.0, 1)
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any]) -> dict[str, Any]:
+    """Percent change of throughput, memory and per-stage p95 between two records."""
+    stages = {}
+    for stage, stats in current.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(stage)
+        if old:
+            stages[stage] = _pct_change(old.get("p95_ms"), stats.get("p95_ms"))
+    return {
+        "baseline_commit": baseline.get("git_commit"),
+        "current_commit": current.get("git_commit"),
+        "rows_per_sec_pct": _pct_change(baseline.get("rows_per_sec"), current.get("rows_per_sec")),
+        "peak_rss_mb_pct": _pct_change(baseline.get("peak_rss_mb"), current.get("peak_rss_mb")),
+        "result_bytes_per_row_pct": _pct_change(
+            (baseline.get("memory") or {}).get("bytes_per_row"),
+            (current.get("memory") or {}).get("bytes_per_row"),
+        ),
+        "stage_p95_pct": stages,
+    }
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Iterator
+import uuid
+
+
+BLOBS_DIRNAME = "blobs"
+_HASH_CHUNK_BYTES = 1 << 20
+
+
+def _blobs_dir(root: Path) -> Path:
+    return root / BLOBS_DIRNAME
+
+
+def blob_path(root: Path, digest: str) -> Path:
+    return _blobs_dir(root) / digest[:2] / digest
+
+
+def has_blob(root: Path, digest: str) -> bool:
+    return blob_path(root, digest).exists()
+
+
+def _reuse(target: Path) -> bool:
+    # A dedup hit refreshes the blob's mtime: compaction only sweeps
+    # unreferenced blobs older than its start, so a blob about to be
+    # referenced again is left alone.
+    try:
+        os.utime(target)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _finalize(root: Path, digest: str, temp_path: Path) -> str:
+    target = blob_path(root, digest)
+    if _reuse(target):
+        temp_path.unlink(missing_ok=True)
+        return digest
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, target)
+    return digest
+
+
+def put_bytes(root: Path, data: bytes) -> str:
+    """Store `data` under its sha256 digest and return the digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    if _reuse(blob_path(root, digest)):
+        return digest
+    _blobs_dir(root).mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=_blobs_dir(root), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return _finalize(root, digest, Path(temp_name))
+
+
+def put_file(root: Path, path: Path) -> str:
+    """Stream `path` into the store; identical content is stored once."""
+    _blobs_dir(root).mkdir(parents=True, exist_ok=True)
+    hasher = hashlib.sha256()
+    fd, temp_name = tempfile.mkstemp(dir=_blobs_dir(root), suffix=".tmp")
+    with os.fdopen(fd, "wb") as out, open(path, "rb") as src:
+        while True:
+            block = src.read(_HASH_CHUNK_BYTES)
+            if not block:
+                break
+            hasher.update(block)
+            out.write(block)
+    return _finalize(root, hasher.hexdigest(), Path(temp_name))
+
+
+def read_bytes(root: Path, digest: str) -> bytes:
+    path = blob_path(root, digest)
+    if not path.exists():
+        raise FileNotFoundError(f"Blob {digest} is missing from {_blobs_dir(root)}")
+    return path.read_bytes()
+
+
+def link_or_copy(root: Path, digest: str, target: Path):
+    """
+    Expose a blob at `target`, hard-linking when the filesystem allows it.
+
+    Callers must treat `target` as read-only: writing through a hard link
+    would change the shared blob.
+    """
+    source = blob_path(root, digest)
+    if not source.exists():
+        raise FileNotFoundError(f"Blob {digest} is missing from {_blobs_dir(root)}")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_target = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        os.link(source, temp_target)
+    except OSError:
+        shutil.copyfile(source, temp_target)
+    os.replace(temp_target, target)
+
+
+def iter_blobs(root: Path) -> Iterator[tuple[str, Path]]:
+    base = _blobs_dir(root)
+    if not base.exists():
+        return
+    for shard in sorted(base.iterdir()):
+        if not shard.is_dir():
+            continue
+        for path in sorted(shard.iterdir()):
+            if path.is_file():
+                yield path.name, path
@@ -7,10 +7,17 @@ from pathlib import Path
 from refund_engine.pipeline import (
     AnalyzeOptions,
     analyze_dataset,
+    convert_dataset_source,
+    export_dataset_output,
     list_datasets,
     preflight_dataset,
     validate_dataset_output,
 )
+from refund_engine.resources import get_shared_resources
+from refund_engine.result_cache import ResultCache
+from refund_engine.results_ledger import ResultsLedger
+from refund_engine.timing import profile_run_log
+from refund_engine.workbook_repository import compact_repository
 
 
 def _print_json(data):
@@ -50,6 +57,12 @@ def build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Minimum tax amount filter",
     )
+    analyze.add_argument(
+        "--where",
+        type=str,
+        default=None,
+        help='Row selection expression, e.g. \'vendor~"ORACLE" and tax_amount>=5000\' or \'100-199\'',
+    )
     analyze.add_argument(
         "--max-invoice-pages",
         type=int,
@@ -66,6 +79,38 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Run analysis but skip writing updates to output workbook",
     )
+    analyze.add_argument(
+        "--flush-every",
+        type=int,
+        default=0,
+        help="Write results to the output workbook every N rows (default: once at the end)",
+    )
+    analyze.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=0,
+        help="Stream the source in chunks of N rows instead of loading it whole (for very large sheets)",
+    )
+    analyze.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Re-analyze rows that already have a completed result in the ledger",
+    )
+    analyze.add_argument(
+        "--rules",
+        action="store_true",
+        help="Decide clear-cut rows from vendor history and tax rules without calling the model",
+    )
+    analyze.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Try the fast model first and escalate to the analysis/pro models (see CASCADE_* settings)",
+    )
+    analyze.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the model instead of reusing cached results for identical rows",
+    )
     analyze.add_argument("--model", type=str, default=None, help="Override analysis model")
     analyze.add_argument(
         "--reasoning-effort",
@@ -89,6 +134,71 @@ def build_parser() -> argparse.ArgumentParser:
         help="Optional row limit for validation scan",
     )
 
+    export = subparsers.add_parser(
+        "export",
+        help="Write the latest ledger results into the output workbook",
+    )
+    export.add_argument("--dataset", required=True, help="Dataset id")
+    export.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Write to this workbook instead of the dataset's output_file",
+    )
+
+    report = subparsers.add_parser("report", help="Summarize ledger results for a dataset")
+    report.add_argument("--dataset", required=True, help="Dataset id")
+
+    subparsers.add_parser(
+        "health",
+        help="Warm up the shared OpenAI/RAG clients and reference tables and report their status",
+    )
+
+    cache = subparsers.add_parser("cache", help="Inspect or purge the analysis result cache")
+    cache.add_argument("action", choices=["stats", "purge-expired"], help="What to do")
+
+    profile = subparsers.add_parser(
+        "profile",
+        help="Per-stage latency percentiles and slowest rows of a run log",
+    )
+    profile.add_argument("run_log", type=Path, help="Path to a runs/*.jsonl run log")
+    profile.add_argument("--top", type=int, default=10, help="How many slowest rows to list")
+
+    convert = subparsers.add_parser(
+        "convert",
+        help="Convert a dataset's Excel source to Parquet once, for faster loads",
+    )
+    convert.add_argument("--dataset", required=True, help="Dataset id")
+    convert.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Parquet file to write (default: the source path with a .parquet suffix)",
+    )
+
+    compact = subparsers.add_parser(
+        "compact-repository",
+        help="Apply workbook version retention and garbage-collect unreferenced blobs",
+    )
+    compact.add_argument(
+        "--root",
+        type=Path,
+        default=None,
+        help="Workbook repository root (default: webapp_data/)",
+    )
+    compact.add_argument(
+        "--keep-versions",
+        type=int,
+        default=None,
+        help="Keep only the newest N versions of each workbook",
+    )
+    compact.add_argument(
+        "--max-delta-chain",
+        type=int,
+        default=8,
+        help="Rebase delta versions onto a full blob past this chain length",
+    )
+
     return parser
 
 
@@ -118,9 +228,16 @@ def main() -> int:
             row_index=args.row,
             vendor=args.vendor,
             min_amount=args.min_amount,
+            where=args.where,
             max_invoice_pages=args.max_invoice_pages,
             dry_run=args.dry_run,
             write_output=not args.no_write,
+            flush_every=args.flush_every,
+            chunk_rows=args.chunk_rows,
+            resume=not args.no_resume,
+            rules=args.rules,
+            cascade=args.cascade,
+            use_cache=not args.no_cache,
             model=args.model,
             reasoning_effort=args.reasoning_effort,
             verbosity=args.verbosity,
@@ -139,6 +256,54 @@ def main() -> int:
         _print_json(report)
         return 0 if report.get("ok") else 1
 
+    if args.command == "export":
+        result = export_dataset_output(
+            args.dataset,
+            output_path=args.output,
+            config_path=config_path,
+        )
+        _print_json(result)
+        return 0 if result.get("ok") else 1
+
+    if args.command == "report":
+        _print_json(ResultsLedger().summary(args.dataset))
+        return 0
+
+    if args.command == "health":
+        report = get_shared_resources().warm_up()
+        _print_json(report)
+        return 0 if report.get("ok") else 1
+
+    if args.command == "cache":
+        result_cache = ResultCache()
+        if args.action == "purge-expired":
+            _print_json({"purged": result_cache.purge_expired(), **result_cache.stats()})
+        else:
+            _print_json(result_cache.stats())
+        return 0
+
+    if args.command == "profile":
+        _print_json(profile_run_log(args.run_log, top=args.top))
+        return 0
+
+    if args.command == "convert":
+        result = convert_dataset_source(
+            args.dataset,
+            output_path=args.output,
+            config_path=config_path,
+        )
+        _print_json(result)
+        return 0 if result.get("ok") else 1
+
+    if args.command == "compact-repository":
+        report = compact_repository(
+            root=args.root,
+            keep_versions=args.keep_versions,
+            max_delta_chain=args.max_delta_chain,
+        )
+        _print_json(report)
+        return 0
+
     parser.print_help()
     return 1
 
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Vectorized counterparts of datasets.coerce_float / is_blank, applied to
+# whole columns once instead of to every cell as it is read.
+
+
+def amount_series(series: pd.Series) -> pd.Series:
+    """float64 amounts; currency symbols and thousands separators are parsed, blanks and junk are NaN."""
+    if pd.api.types.is_float_dtype(series) and series.dtype != "Float64":
+        return series
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return pd.Series(series.to_numpy(dtype=float, na_value=np.nan), index=series.index, name=series.name)
+    text = series.astype("string").str.replace(r"[$,]", "", regex=True).str.strip()
+    values = pd.to_numeric(text, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def text_series(series: pd.Series) -> pd.Series:
+    """Stripped `string` dtype with blank cells as <NA>, so `isna()` is the blank mask."""
+    text = series.astype("string").str.strip()
+    return text.mask(text == "")
+
+
+def is_text_series(series: pd.Series) -> bool:
+    return series.dtype == "string"
+
+
+def blank_mask(series: pd.Series) -> pd.Series:
+    """True where a cell is missing or whitespace only."""
+    if is_text_series(series):
+        return series.isna()
+    return text_series(series).isna()
+
+
+def parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy of `df` Parquet can store: string headers and one type per column."""
+    # Mixed object columns (numbers and text in the same Excel column) are
+    # stored as text.
+    out = df.copy()
+    out.columns = [str(col) for col in out.columns]
+    for col in out.columns:
+        if out[col].dtype != object:
+            continue
+        try:
+            pa.array(out[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            out[col] = out[col].map(lambda value: None if pd.isna(value) else str(value))
+    return out
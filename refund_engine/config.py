@@ -41,6 +41,32 @@ class RAGSettings:
     max_chunk_chars: int
 
 
+@dataclass(frozen=True)
+class ModelPricing:
+    """USD per million tokens."""
+
+    input: float
+    cached_input: float
+    output: float
+
+
+@dataclass(frozen=True)
+class CascadeSettings:
+    accept_confidence: float
+    fast_max_tax_amount: float
+    pro_min_tax_amount: float
+    fast_reasoning_effort: ReasoningEffort
+    pro_reasoning_effort: ReasoningEffort
+    pricing: dict[str, ModelPricing]
+
+
+@dataclass(frozen=True)
+class ResultCacheSettings:
+    enabled: bool
+    ttl_s: float
+    knowledge_base_tag: str
+
+
 def _get_env(name: str, default: str | None = None) -> str | None:
     value = os.environ.get(name)
     if value is None:
@@ -193,6 +219,93 @@ def get_rag_settings() -> RAGSettings:
     )
 
 
+def _coerce_pricing(name: str, value: str | None) -> ModelPricing | None:
+    if value is None:
+        return None
+    parts = [part.strip() for part in value.split(",")]
+    try:
+        numbers = [float(part) for part in parts]
+    except ValueError as exc:
+        raise ValueError(f"{name} must be 'input,cached_input,output' USD per 1M tokens (got {value!r})") from exc
+    if len(numbers) == 2:
+        numbers = [numbers[0], numbers[0], numbers[1]]
+    if len(numbers) != 3 or min(numbers) < 0:
+        raise ValueError(f"{name} must be 'input,cached_input,output' USD per 1M tokens (got {value!r})")
+    return ModelPricing(*numbers)
+
+
+def get_cascade_settings() -> CascadeSettings:
+    """
+    Load model-cascade settings from environment variables.
+
+    Optional:
+      - CASCADE_ACCEPT_CONFIDENCE (default: 0.85)
+      - CASCADE_FAST_MAX_TAX_AMOUNT (default: 500)
+      - CASCADE_PRO_MIN_TAX_AMOUNT (default: 25000)
+      - CASCADE_FAST_REASONING_EFFORT (default: low)
+      - CASCADE_PRO_REASONING_EFFORT (default: high)
+      - OPENAI_PRICE_FAST / OPENAI_PRICE_ANALYSIS / OPENAI_PRICE_PRO as
+        "input,cached_input,output" USD per 1M tokens; cost is only
+        reported for tiers with a price.
+    """
+    pricing: dict[str, ModelPricing] = {}
+    for tier in ("fast", "analysis", "pro"):
+        name = f"OPENAI_PRICE_{tier.upper()}"
+        price = _coerce_pricing(name, _get_env(name))
+        if price is not None:
+            pricing[tier] = price
+    return CascadeSettings(
+        accept_confidence=_coerce_float(
+            "CASCADE_ACCEPT_CONFIDENCE",
+            _get_env("CASCADE_ACCEPT_CONFIDENCE"),
+            default=0.85,
+            min_value=0.0,
+            max_value=1.0,
+        ),
+        fast_max_tax_amount=_coerce_float(
+            "CASCADE_FAST_MAX_TAX_AMOUNT",
+            _get_env("CASCADE_FAST_MAX_TAX_AMOUNT"),
+            default=500.0,
+            min_value=0.0,
+            max_value=float("inf"),
+        ),
+        pro_min_tax_amount=_coerce_float(
+            "CASCADE_PRO_MIN_TAX_AMOUNT",
+            _get_env("CASCADE_PRO_MIN_TAX_AMOUNT"),
+            default=25000.0,
+            min_value=0.0,
+            max_value=float("inf"),
+        ),
+        fast_reasoning_effort=_coerce_reasoning_effort(_get_env("CASCADE_FAST_REASONING_EFFORT", "low")),
+        pro_reasoning_effort=_coerce_reasoning_effort(_get_env("CASCADE_PRO_REASONING_EFFORT", "high")),
+        pricing=pricing,
+    )
+
+
+def get_result_cache_settings() -> ResultCacheSettings:
+    """
+    Load analysis result cache settings from environment variables.
+
+    Optional:
+      - RESULT_CACHE_ENABLED (default: true)
+      - RESULT_CACHE_TTL_DAYS (default: 30)
+      - KNOWLEDGE_BASE_VERSION: free-form tag folded into every cache key;
+        bump it after re-ingesting the Supabase legal/vendor corpus.
+    """
+    ttl_days = _coerce_float(
+        "RESULT_CACHE_TTL_DAYS",
+        _get_env("RESULT_CACHE_TTL_DAYS"),
+        default=30.0,
+        min_value=0.0,
+        max_value=3650.0,
+    )
+    return ResultCacheSettings(
+        enabled=_coerce_bool(_get_env("RESULT_CACHE_ENABLED"), default=True),
+        ttl_s=ttl_days * 86400.0,
+        knowledge_base_tag=_get_env("KNOWLEDGE_BASE_VERSION", "") or "",
+    )
+
+
 def require_openai_api_key(settings: OpenAISettings | None = None) -> str:
     settings = settings or get_openai_settings()
     if settings.api_key:
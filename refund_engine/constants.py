@@ -6,6 +6,8 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DEFAULT_DATASETS_PATH = PROJECT_ROOT / "config" / "datasets.yaml"
 RUNS_DIR = PROJECT_ROOT / "runs"
+DATASET_CACHE_DIR = RUNS_DIR / "dataset_cache"
+RESULTS_LEDGER_PATH = RUNS_DIR / "results_ledger.sqlite3"
 
 AI_OUTPUT_COLUMNS = (
     "Product_Desc",
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+import uuid
+
+import pandas as pd
+
+from refund_engine.constants import DATASET_CACHE_DIR
+from refund_engine.datasets import (
+    SOURCE_TYPES_VERSION,
+    DatasetConfig,
+    filter_unanalyzed_rows,
+    get_dataset_config,
+    iter_source_chunks,
+    projected_columns,
+    read_source_dataframe,
+    source_signature,
+)
+
+
+@dataclass
+class DatasetSession:
+    """
+    Source frame of one dataset, loaded once and shared by preflight,
+    selection, analysis and validation.
+
+    The frame is keyed by the source files' mtimes and sizes; when
+    `snapshot_dir` is set it is also pickled there so the next CLI
+    invocation against an unchanged source skips the Excel read. Mapped
+    columns are typed once at load (`coerce_source_columns`) and the
+    snapshot keeps those types. `source_chunks` reads the source in
+    bounded chunks instead, for sources too large to hold at once.
+    """
+
+    config: DatasetConfig
+    snapshot_dir: Path | None = DATASET_CACHE_DIR
+    _source: pd.DataFrame | None = field(default=None, init=False, repr=False)
+    _unanalyzed: pd.DataFrame | None = field(default=None, init=False, repr=False)
+    _key: str | None = field(default=None, init=False, repr=False)
+
+    @classmethod
+    def open(
+        cls,
+        dataset_id: str,
+        *,
+        config_path: str | Path | None = None,
+        snapshot_dir: Path | None = DATASET_CACHE_DIR,
+    ) -> DatasetSession:
+        return cls(get_dataset_config(dataset_id, config_path=config_path), snapshot_dir)
+
+    def _cache_key(self) -> str:
+        spec = {
+            "source_file": str(self.config.source_file),
+            "files": source_signature(self.config),
+            "sheet_name": self.config.sheet_name,
+            "columns": list(projected_columns(self.config)),
+            "filters": [[rule.column, rule.op, rule.value] for rule in self.config.filters],
+            "dtypes": list(self.config.dtypes),
+            "types": SOURCE_TYPES_VERSION,
+        }
+        return hashlib.sha256(json.dumps(spec, default=str).encode("utf-8")).hexdigest()[:20]
+
+    def _snapshot_path(self, key: str) -> Path | None:
+        if self.snapshot_dir is None:
+            return None
+        return self.snapshot_dir / f"{self.config.dataset_id}-{key}.pkl"
+
+    def _load_snapshot(self, key: str) -> pd.DataFrame | None:
+        path = self._snapshot_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception:
+            path.unlink(missing_ok=True)
+            return None
+
+    def _save_snapshot(self, key: str, df: pd.DataFrame):
+        path = self._snapshot_path(key)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for stale in path.parent.glob(f"{self.config.dataset_id}-*.pkl"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        df.to_pickle(temp_path)
+        os.replace(temp_path, path)
+
+    def source_frame(self) -> pd.DataFrame:
+        key = self._cache_key()
+        if self._source is not None and self._key == key:
+            return self._source
+
+        df = self._load_snapshot(key)
+        if df is None:
+            df = read_source_dataframe(self.config)
+            self._save_snapshot(key, df)
+        self._source = df
+        self._unanalyzed = None
+        self._key = key
+        return df
+
+    def unanalyzed_frame(self) -> pd.DataFrame:
+        source = self.source_frame()
+        if self._unanalyzed is None:
+            self._unanalyzed = filter_unanalyzed_rows(source, self.config)
+        return self._unanalyzed
+
+    def source_chunks(self, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        The source frame in chunks of at most `chunk_rows` rows.
+
+        Slices the frame when it is already loaded; otherwise streams the
+        source file without loading or snapshotting it whole.
+        """
+        if self._source is not None and self._key == self._cache_key():
+            source = self._source
+            for start in range(0, max(len(source), 1), chunk_rows):
+                yield source.iloc[start : start + chunk_rows]
+            return
+        yield from iter_source_chunks(self.config, chunk_rows)
@@ -1,13 +1,52 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+import glob
+import os
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
+import uuid
 
+from openpyxl import load_workbook
 import pandas as pd
 import yaml
 
+from refund_engine.column_types import amount_series, blank_mask, is_text_series, parquet_safe, text_series
 from refund_engine.constants import DEFAULT_DATASETS_PATH
+from refund_engine.row_selection import (
+    And,
+    Predicate,
+    RowRanges,
+    Selection,
+    default_fields,
+    parse_selection,
+    selection_mask,
+)
+
+
+# Mapped column fields holding amounts; coerce_source_columns types them as float64.
+AMOUNT_FIELDS = ("tax_amount", "tax_base", "rate")
+# Bump when coerce_source_columns changes so cached session snapshots are rebuilt.
+SOURCE_TYPES_VERSION = 1
+EXCEL_SUFFIXES = (".xlsx", ".xlsm", ".xlsb")
+# Columnar source formats by file suffix. `source_file` may also be a glob
+# of partition files in one of these formats.
+TABLE_FORMATS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".csv": "csv",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+# Partition files are read on up to this many threads.
+SOURCE_READ_WORKERS = 8
+# Rows per batch when a table source is streamed whole (output workbook build).
+SOURCE_BATCH_ROWS = 50_000
+# Row group size of Parquet files written by `convert_source_to_parquet`.
+PARQUET_ROW_GROUP_SIZE = 50_000
 
 
 @dataclass(frozen=True)
@@ -42,14 +81,29 @@ class DatasetConfig:
     invoice_path: Path
     columns: DatasetColumns
     filters: tuple[DatasetFilter, ...]
+    # CSV dtype hints, (column, pandas dtype) pairs.
+    dtypes: tuple[tuple[str, str], ...] = ()
 
 
 def _expand_path(path_str: str) -> Path:
     return Path(path_str).expanduser()
 
 
+_CONFIG_CACHE: dict[Path, tuple[tuple[int, int], dict[str, DatasetConfig]]] = {}
+
+
+def file_signature(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
 def load_datasets_config(config_path: str | Path | None = None) -> dict[str, DatasetConfig]:
     path = Path(config_path or DEFAULT_DATASETS_PATH)
+    signature = file_signature(path)
+    cached = _CONFIG_CACHE.get(path)
+    if cached is not None and cached[0] == signature:
+        return dict(cached[1])
+
     with open(path, "r") as f:
         raw = yaml.safe_load(f) or {}
 
@@ -74,8 +128,10 @@ def load_datasets_config(config_path: str | Path | None = None) -> dict[str, Dat
             invoice_path=_expand_path(spec["invoice_path"]),
             columns=columns,
             filters=filters,
+            dtypes=tuple((str(column), str(dtype)) for column, dtype in (spec.get("dtypes") or {}).items()),
         )
-    return configs
+    _CONFIG_CACHE[path] = (signature, configs)
+    return dict(configs)
 
 
 def get_dataset_config(dataset_id: str, config_path: str | Path | None = None) -> DatasetConfig:
@@ -101,8 +157,404 @@ def read_excel_dataframe(path: Path, sheet_name: str | None) -> pd.DataFrame:
     return df
 
 
+def table_format(path: Path) -> str | None:
+    """'parquet', 'csv' or 'arrow' for a columnar source path, None for Excel."""
+    return TABLE_FORMATS.get(path.suffix.lower())
+
+
+def _is_pattern(path: Path) -> bool:
+    return glob.has_magic(str(path))
+
+
+def source_paths(config: DatasetConfig) -> list[Path]:
+    """Files behind a dataset source: the file itself, or the sorted matches of a glob."""
+    if _is_pattern(config.source_file):
+        return sorted(Path(path) for path in glob.glob(str(config.source_file)))
+    return [config.source_file] if config.source_file.exists() else []
+
+
+def source_signature(config: DatasetConfig) -> list[tuple[str, int, int]]:
+    """(path, mtime_ns, size) of every source file, for cache keys."""
+    return [(str(path.resolve()), *file_signature(path)) for path in source_paths(config)]
+
+
+def projected_columns(config: DatasetConfig) -> tuple[str, ...]:
+    """Source columns analysis actually needs: every mapped column plus filter columns."""
+    names: list[str] = []
+    for field in fields(DatasetColumns):
+        value = getattr(config.columns, field.name)
+        if value and value not in names:
+            names.append(value)
+    for rule in config.filters:
+        if rule.column not in names:
+            names.append(rule.column)
+    return tuple(names)
+
+
+def _filter_predicate(rule: DatasetFilter) -> Callable[[Any], bool]:
+    if rule.op == "equals":
+        return lambda value: value == rule.value
+    if rule.op == "not_empty":
+        return lambda value: value is not None and str(value).strip() != ""
+    raise ValueError(f"Unsupported filter op '{rule.op}' for {rule.column}")
+
+
+def _iter_xlsx_rows(path: Path, sheet_name: str | None) -> Iterator[tuple[Any, ...]]:
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _xlsb_value(value: Any) -> Any:
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iter_xlsb_rows(path: Path, sheet_name: str | None) -> Iterator[tuple[Any, ...]]:
+    from pyxlsb import open_workbook
+
+    with open_workbook(str(path)) as wb:
+        with wb.get_sheet(sheet_name or wb.sheets[0]) as sheet:
+            next_row = 0
+            for row in sheet.rows(sparse=True):
+                if not row:
+                    continue
+                # Sparse iteration skips empty rows; pad them so positions
+                # keep matching sheet rows.
+                while next_row < row[0].r:
+                    yield ()
+                    next_row += 1
+                yield tuple(_xlsb_value(cell.v) for cell in row)
+                next_row += 1
+
+
+def iter_sheet_rows(path: Path, sheet_name: str | None) -> Iterator[tuple[Any, ...]]:
+    """Stream raw row tuples (header row first) from an .xlsx/.xlsm/.xlsb sheet."""
+    if path.suffix.lower() == ".xlsb":
+        return _iter_xlsb_rows(path, sheet_name)
+    return _iter_xlsx_rows(path, sheet_name)
+
+
+def _frame(
+    index: list[int],
+    selected: list[str],
+    buckets: list[list[Any]],
+    count: int,
+    source_rows: int,
+) -> pd.DataFrame:
+    df = pd.DataFrame(
+        {name: bucket[:count] for name, bucket in zip(selected, buckets)},
+        index=pd.Index(index[:count]),
+        columns=selected,
+    )
+    df.attrs["source_rows"] = source_rows
+    return df
+
+
+def _stream_projected(
+    path: Path,
+    sheet_name: str | None,
+    columns: tuple[str, ...] | list[str] | None,
+    filters: tuple[DatasetFilter, ...],
+    chunk_rows: int | None,
+) -> Iterator[pd.DataFrame]:
+    # Yields frames of up to `chunk_rows` kept rows (a single frame when None),
+    # holding `columns` (every column when None).
+    if path.suffix.lower() not in EXCEL_SUFFIXES:
+        df = read_excel_dataframe(path, sheet_name)
+        out = _project(df, columns, filters, len(df))
+        step = chunk_rows or max(len(out), 1)
+        for start in range(0, max(len(out), 1), step):
+            part = out.iloc[start : start + step]
+            part.attrs["source_rows"] = out.attrs["source_rows"]
+            yield part
+        return
+
+    rows = iter_sheet_rows(path, sheet_name)
+    try:
+        header = next(rows, ())
+        positions: dict[str, int] = {}
+        for idx, name in enumerate(header):
+            key = name.strip() if isinstance(name, str) else name
+            if key not in positions:
+                positions[key] = idx
+        if columns is None:
+            columns = list(positions)
+        selected = [c for c in dict.fromkeys(columns) if c in positions]
+        picks = [positions[c] for c in selected]
+        checks = [
+            (positions[rule.column], _filter_predicate(rule))
+            for rule in filters
+            if rule.column in positions
+        ]
+
+        index: list[int] = []
+        buckets: list[list[Any]] = [[] for _ in selected]
+        last_nonempty = -1
+        emitted = False
+        for pos, values in enumerate(rows):
+            width = len(values)
+            if any(v is not None and v != "" for v in values):
+                last_nonempty = pos
+            if not all(check(values[col] if col < width else None) for col, check in checks):
+                continue
+            index.append(pos)
+            for col, bucket in zip(picks, buckets):
+                value = values[col] if col < width else None
+                bucket.append(None if value == "" else value)
+            if chunk_rows and len(index) >= chunk_rows:
+                # Kept blank rows after the last non-empty row wait for the
+                # next chunk; they are dropped if the sheet ends first.
+                keep = bisect_right(index, last_nonempty)
+                if keep:
+                    yield _frame(index, selected, buckets, keep, last_nonempty + 1)
+                    emitted = True
+                    del index[:keep]
+                    for bucket in buckets:
+                        del bucket[:keep]
+    finally:
+        rows.close()
+
+    # Trailing blank rows are not part of the data (pandas drops them too).
+    keep = bisect_right(index, last_nonempty)
+    if keep or not emitted:
+        yield _frame(index, selected, buckets, keep, last_nonempty + 1)
+
+
+def _project(
+    df: pd.DataFrame,
+    columns: tuple[str, ...] | list[str] | None,
+    filters: tuple[DatasetFilter, ...],
+    source_rows: int,
+) -> pd.DataFrame:
+    df = filter_rows(df, filters)
+    out = df if columns is None else df[[c for c in dict.fromkeys(columns) if c in df.columns]]
+    out.attrs["source_rows"] = source_rows
+    return out
+
+
+def _iter_table_frames(
+    path: Path,
+    fmt: str,
+    columns: list[str] | None,
+    dtypes: dict[str, str],
+    batch_rows: int | None,
+) -> Iterator[pd.DataFrame]:
+    # Frames of up to `batch_rows` rows of one columnar file (the whole file
+    # when None), holding `columns` that exist in it (all when None).
+    if fmt == "csv":
+        wanted = None if columns is None else set(columns)
+        usecols = None if wanted is None else (lambda name: name.strip() in wanted)
+        options = {"usecols": usecols, "dtype": dtypes or None}
+        if batch_rows is None:
+            frames: Iterator[pd.DataFrame] = iter([pd.read_csv(path, **options)])
+        else:
+            frames = pd.read_csv(path, chunksize=batch_rows, **options)
+        for frame in frames:
+            frame.columns = [col.strip() if isinstance(col, str) else col for col in frame.columns]
+            yield frame
+        return
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        with pq.ParquetFile(path) as parquet:
+            names = parquet.schema_arrow.names
+            picked = names if columns is None else [c for c in columns if c in names]
+            if batch_rows is None:
+                yield parquet.read(columns=picked).to_pandas()
+                return
+            for batch in parquet.iter_batches(batch_size=batch_rows, columns=picked):
+                yield batch.to_pandas()
+        return
+
+    import pyarrow as pa
+
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        names = reader.schema.names
+        picked = names if columns is None else [c for c in columns if c in names]
+        if batch_rows is None:
+            yield reader.read_all().select(picked).to_pandas()
+            return
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i).select(picked)
+            for start in range(0, batch.num_rows, batch_rows):
+                yield batch.slice(start, batch_rows).to_pandas()
+
+
+def _stream_table(
+    config: DatasetConfig,
+    fmt: str,
+    columns: tuple[str, ...] | list[str],
+    chunk_rows: int | None,
+) -> Iterator[pd.DataFrame]:
+    # Columnar counterpart of _stream_projected. Row positions run on across
+    # partition files in path order.
+    paths = source_paths(config)
+    if not paths:
+        raise FileNotFoundError(f"No source files found for {config.source_file}")
+    wanted = list(dict.fromkeys(columns))
+    dtypes = dict(config.dtypes)
+
+    def read_whole(path: Path) -> pd.DataFrame:
+        return next(_iter_table_frames(path, fmt, wanted, dtypes, None))
+
+    if chunk_rows is None:
+        with ThreadPoolExecutor(max_workers=min(SOURCE_READ_WORKERS, len(paths))) as pool:
+            frames = list(pool.map(read_whole, paths))
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        yield _project(df.reset_index(drop=True), wanted, config.filters, len(df))
+        return
+
+    offset = 0
+    for path in paths:
+        for frame in _iter_table_frames(path, fmt, wanted, dtypes, chunk_rows):
+            frame.index = pd.RangeIndex(offset, offset + len(frame))
+            offset += len(frame)
+            yield _project(frame, wanted, config.filters, offset)
+    if offset == 0:
+        yield _project(read_whole(paths[0]), wanted, config.filters, 0)
+
+
+def _stream_source(
+    config: DatasetConfig,
+    columns: tuple[str, ...] | list[str],
+    chunk_rows: int | None,
+) -> Iterator[pd.DataFrame]:
+    fmt = table_format(config.source_file)
+    if fmt is not None:
+        return _stream_table(config, fmt, columns, chunk_rows)
+    if _is_pattern(config.source_file):
+        raise ValueError(f"Glob sources must be Parquet, CSV or Arrow files: {config.source_file}")
+    return _stream_projected(config.source_file, config.sheet_name, columns, config.filters, chunk_rows)
+
+
+def iter_source_rows(config: DatasetConfig) -> Iterator[tuple[Any, ...]]:
+    """Raw row tuples (header row first) of the whole source, in any supported format."""
+    fmt = table_format(config.source_file)
+    if fmt is None:
+        yield from iter_sheet_rows(config.source_file, config.sheet_name)
+        return
+    header: list[Any] | None = None
+    for path in source_paths(config):
+        for frame in _iter_table_frames(path, fmt, None, dict(config.dtypes), SOURCE_BATCH_ROWS):
+            if header is None:
+                header = list(frame.columns)
+                yield tuple(header)
+            frame = frame.reindex(columns=header).astype(object)
+            yield from frame.where(frame.notna(), None).itertuples(index=False, name=None)
+
+
+def convert_source_to_parquet(config: DatasetConfig, target: Path) -> dict[str, Any]:
+    """
+    Write an Excel source sheet to `target` as Parquet, every column and one
+    row per sheet row, so row indices and output rows stay the same when
+    `source_file` points at the result.
+
+    Cells are read by the same streaming reader analysis uses, so text such
+    as "0042" stays text.
+    """
+    if table_format(config.source_file) is not None or _is_pattern(config.source_file):
+        raise ValueError(f"Source is not an Excel workbook: {config.source_file}")
+    df = next(_stream_projected(config.source_file, config.sheet_name, None, (), None))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        parquet_safe(df).to_parquet(temp_path, index=False, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        os.replace(temp_path, target)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return {"rows": int(len(df)), "columns": int(len(df.columns)), "output_file": str(target)}
+
+
+def read_projected_dataframe(
+    path: Path,
+    sheet_name: str | None,
+    columns: tuple[str, ...] | list[str],
+    *,
+    filters: tuple[DatasetFilter, ...] = (),
+) -> pd.DataFrame:
+    """
+    Stream a sheet keeping only `columns` and rows that pass `filters`.
+
+    Rows keep their position in the sheet as the index (0 = first data row),
+    the same index `read_excel_dataframe` would give them, so results still
+    map back to output rows. Columns missing from the sheet are left out, as
+    are filters on them. The number of data rows scanned is recorded in
+    `df.attrs["source_rows"]`.
+    """
+    return next(_stream_projected(path, sheet_name, columns, filters, None))
+
+
+def coerce_source_columns(df: pd.DataFrame, config: DatasetConfig) -> pd.DataFrame:
+    """
+    Type the mapped columns of a freshly loaded frame in place, once.
+
+    Amount columns (AMOUNT_FIELDS) become float64 with currency strings and
+    commas parsed and blanks as NaN; other mapped columns become stripped
+    `string` dtype with blanks as <NA>. Filter-only columns are left as read.
+    """
+    for field in fields(DatasetColumns):
+        column = getattr(config.columns, field.name)
+        if not column or column not in df.columns:
+            continue
+        df[column] = amount_series(df[column]) if field.name in AMOUNT_FIELDS else text_series(df[column])
+    return df
+
+
 def read_source_dataframe(config: DatasetConfig) -> pd.DataFrame:
-    return read_excel_dataframe(config.source_file, config.sheet_name)
+    """
+    Projected, pre-filtered and typed view of the source used for analysis.
+
+    Excel sheets are streamed; Parquet, CSV and Arrow sources (and globs of
+    partition files, read in parallel) are read column-projected.
+    """
+    df = next(_stream_source(config, projected_columns(config), None))
+    return coerce_source_columns(df, config)
+
+
+def iter_source_chunks(config: DatasetConfig, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    The typed source view of `read_source_dataframe`, streamed in chunks.
+
+    Each chunk holds up to `chunk_rows` rows that passed the dataset filters,
+    indexed by sheet position, so only one chunk is in memory at a time.
+    `attrs["source_rows"]` counts the data rows scanned so far. At least one
+    (possibly empty) chunk is yielded, carrying the columns the sheet has.
+    """
+    if chunk_rows <= 0:
+        raise ValueError("chunk_rows must be positive")
+    for chunk in _stream_source(config, projected_columns(config), chunk_rows):
+        yield coerce_source_columns(chunk, config)
+
+
+def iter_typed_rows(df: pd.DataFrame, config: DatasetConfig) -> Iterator[tuple[int, dict[str, Any]]]:
+    """
+    Yield (row index, {column field: value}) for each row of `df`.
+
+    Text fields are "" when blank and amount fields None. Frames from
+    `read_source_dataframe` are already typed; other frames are coerced
+    here, one vectorized pass per column.
+    """
+    values: dict[str, list[Any]] = {}
+    for field in fields(DatasetColumns):
+        column = getattr(config.columns, field.name)
+        if not column or column not in df.columns:
+            continue
+        series = df[column]
+        if field.name in AMOUNT_FIELDS:
+            amounts = amount_series(series).tolist()
+            values[field.name] = [None if amount != amount else amount for amount in amounts]
+        else:
+            text = series if is_text_series(series) else text_series(series)
+            values[field.name] = text.fillna("").tolist()
+    for pos, idx in enumerate(df.index):
+        yield int(idx), {name: column_values[pos] for name, column_values in values.items()}
 
 
 def is_blank(value: Any) -> bool:
@@ -126,27 +578,33 @@ def coerce_float(value: Any) -> float | None:
         return None
 
 
-def filter_unanalyzed_rows(df: pd.DataFrame, config: DatasetConfig) -> pd.DataFrame:
+def _filter_mask(df: pd.DataFrame, filters: tuple[DatasetFilter, ...]) -> pd.Series:
     mask = pd.Series(True, index=df.index)
-
-    for rule in config.filters:
+    for rule in filters:
         if rule.column not in df.columns:
             continue
         series = df[rule.column]
         if rule.op == "equals":
-            mask &= series == rule.value
+            mask &= (series == rule.value).fillna(False).astype(bool)
         elif rule.op == "not_empty":
             mask &= series.notna() & (series.astype(str).str.strip() != "")
         else:
             raise ValueError(f"Unsupported filter op '{rule.op}' for {rule.column}")
+    return mask
+
+
+def filter_rows(df: pd.DataFrame, filters: tuple[DatasetFilter, ...]) -> pd.DataFrame:
+    return df[_filter_mask(df, filters)]
+
+
+def filter_unanalyzed_rows(df: pd.DataFrame, config: DatasetConfig) -> pd.DataFrame:
+    mask = _filter_mask(df, config.filters)
 
     if config.columns.invoice_1 in df.columns:
-        invoice_series = df[config.columns.invoice_1]
-        mask &= invoice_series.notna() & (invoice_series.astype(str).str.strip() != "")
+        mask &= ~blank_mask(df[config.columns.invoice_1])
 
     if config.columns.analysis_col in df.columns:
-        analysis_series = df[config.columns.analysis_col]
-        mask &= analysis_series.isna() | (analysis_series.astype(str).str.strip() == "")
+        mask &= blank_mask(df[config.columns.analysis_col])
 
     return df[mask]
 
@@ -159,27 +617,31 @@ def select_rows(
     row_index: int | None = None,
     vendor: str | None = None,
     min_amount: float | None = None,
+    where: str | None = None,
 ) -> pd.DataFrame:
-    selected = df
-
+    """
+    Rows of `df` matching every given filter, in one vectorized pass.
+
+    `where` is a row selection expression (see `row_selection`) over the
+    dataset's column fields, e.g. `vendor~"ORACLE" and tax_amount>=5000`;
+    `vendor`, `min_amount` and `row_index` are shorthands for the same
+    predicates.
+    """
+    clauses: list[Selection] = []
+    parsed = parse_selection(where)
+    if parsed is not None:
+        clauses.append(parsed)
     if vendor:
-        vendor_col = config.columns.vendor
-        if vendor_col in selected.columns:
-            selected = selected[
-                selected[vendor_col].astype(str).str.contains(vendor, case=False, na=False)
-            ]
-
+        clauses.append(Predicate("vendor", "~", vendor))
     if min_amount is not None:
-        amount_col = config.columns.tax_amount
-        if amount_col in selected.columns:
-            values = selected[amount_col].apply(coerce_float)
-            selected = selected[values.fillna(0.0) >= float(min_amount)]
-
+        clauses.append(Predicate("tax_amount", ">=", float(min_amount)))
     if row_index is not None:
-        if row_index in selected.index:
-            selected = selected.loc[[row_index]]
-        else:
-            return selected.iloc[0:0]
+        clauses.append(RowRanges.of([(row_index, row_index)]))
+
+    selected = df
+    if clauses:
+        selection = clauses[0] if len(clauses) == 1 else And(tuple(clauses))
+        selected = df[selection_mask(selection, df, default_fields(asdict(config.columns)))]
 
     if limit is not None and limit >= 0:
         selected = selected.head(limit)
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any
+
+
+# Canned analysis payloads; every one passes validate_output_row.
+_PAYLOADS: tuple[dict[str, Any], ...] = (
+    {
+        "final_decision": "REFUND",
+        "product_type": "Services",
+        "refund_basis": "OOS services",
+        "citation": "WAC 458-20-19402",
+        "citation_source": "RAG legal context",
+        "tax_category": "Services",
+        "methodology": "User location",
+        "sales_use_tax": "Use",
+        "confidence": 0.86,
+        "estimated_refund_share": 0.6,
+    },
+    {
+        "final_decision": "NO REFUND",
+        "product_type": "Hardware",
+        "refund_basis": "",
+        "citation": "",
+        "citation_source": "",
+        "tax_category": "Hardware",
+        "methodology": "Equipment Location",
+        "sales_use_tax": "Sales",
+        "confidence": 0.91,
+        "estimated_refund_share": 0.0,
+    },
+    {
+        "final_decision": "REVIEW",
+        "product_type": "License",
+        "refund_basis": "MPU",
+        "citation": "",
+        "citation_source": "",
+        "tax_category": "License",
+        "methodology": "Headcount",
+        "sales_use_tax": "Use",
+        "confidence": 0.42,
+        "estimated_refund_share": 0.0,
+        "follow_up_questions": "Which locations used the licensed seats during 2024?",
+    },
+)
+
+_ROW_FIELD = re.compile(r"^- (vendor|description|tax_amount|invoice_number_from_row): (.*)$", re.MULTILINE)
+
+
+def _sleep_ms(latency_ms: float, jitter_ms: float, rng: random.Random, lock: threading.Lock):
+    if latency_ms <= 0 and jitter_ms <= 0:
+        return
+    with lock:
+        delay = latency_ms + (rng.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+    time.sleep(max(0.0, delay) / 1000.0)
+
+
+def row_fields_text(prompt: str) -> str:
+    """The row lines `fake_analysis_payload` reads, kept for continued responses."""
+    return "\n".join(f"- {key}: {value}" for key, value in _ROW_FIELD.findall(prompt))
+
+
+def fake_analysis_payload(prompt: str) -> dict[str, Any]:
+    """Deterministic analysis JSON for a prompt built by `_analysis_prompt`."""
+    fields = {key: value.strip() for key, value in _ROW_FIELD.findall(prompt)}
+    vendor = fields.get("vendor", "")
+    digest = int(hashlib.sha256(vendor.encode("utf-8")).hexdigest()[:8], 16)
+    template = dict(_PAYLOADS[digest % len(_PAYLOADS)])
+    try:
+        tax_amount = float(fields.get("tax_amount", "0").replace(",", ""))
+    except ValueError:
+        tax_amount = 0.0
+    share = template.pop("estimated_refund_share")
+    description = fields.get("description", "")
+    template.update(
+        {
+            "invoice_number": fields.get("invoice_number_from_row") or "UNKNOWN",
+            "invoice_date": "2024-03-01",
+            "ship_to_address": "1 Main St, Seattle, WA",
+            "matched_line_item": description or "UNKNOWN",
+            "vendor_research": f"{vendor} is a synthetic benchmark vendor.",
+            "product_description": description,
+            "service_classification": template["product_type"],
+            "taxability_reasoning": "Synthetic reasoning for benchmarking.",
+            "estimated_refund": round(tax_amount * share, 2),
+            "explanation": "Synthetic benchmark result.",
+        }
+    )
+    template.setdefault("follow_up_questions", "")
+    return template
+
+
+def fake_embedding(text: str, dims: int) -> list[float]:
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(seed[i % len(seed)] - 128) / 128.0 for i in range(dims)]
+
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class PromptCacheModel:
+    """
+    Approximates provider prompt caching: prompts of at least
+    `min_tokens` are cached in `block_tokens` increments, and a request
+    reports the longest previously seen prefix as cached tokens.
+    """
+
+    def __init__(self, *, min_tokens: int = 1024, block_tokens: int = 128, chars_per_token: int = 4):
+        self.min_chars = min_tokens * chars_per_token
+        self.block_chars = block_tokens * chars_per_token
+        self.chars_per_token = chars_per_token
+        self._seen: set[str] = set()
+        self._lock = threading.Lock()
+
+    def cached_tokens(self, prompt: str) -> int:
+        boundaries = range(self.min_chars, len(prompt) + 1, self.block_chars)
+        digests = [(end, hashlib.sha256(prompt[:end].encode("utf-8")).hexdigest()) for end in boundaries]
+        cached = 0
+        with self._lock:
+            for end, digest in digests:
+                if digest in self._seen:
+                    cached = end
+            self._seen.update(digest for _, digest in digests)
+        return cached // self.chars_per_token
+
+
+class _FakeResponses:
+    def __init__(self, owner: FakeOpenAIClient):
+        self._owner = owner
+
+    def create(self, *, model: str, input: Any, **kwargs: Any) -> SimpleNamespace:
+        owner = self._owner
+        _sleep_ms(owner.latency_ms, owner.jitter_ms, owner._rng, owner._lock)
+        prompt = input if isinstance(input, str) else json.dumps(input, default=str)
+        previous_id = kwargs.get("previous_response_id")
+        with owner._lock:
+            # A continued response answers for the original row.
+            row_prompt = owner._prompts.get(previous_id, prompt) if previous_id else prompt
+        output_text = json.dumps(fake_analysis_payload(row_prompt))
+        with owner._lock:
+            owner.calls["responses"] += 1
+            response_id = f"resp_fake_{owner.calls['responses']}"
+            owner._prompts[response_id] = row_fields_text(row_prompt)
+        return SimpleNamespace(
+            id=response_id,
+            model=model,
+            output_text=output_text,
+            usage=SimpleNamespace(
+                input_tokens=approx_tokens(prompt),
+                output_tokens=approx_tokens(output_text),
+                input_tokens_details=SimpleNamespace(cached_tokens=owner.prompt_cache.cached_tokens(prompt)),
+            ),
+        )
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner: FakeOpenAIClient):
+        self._owner = owner
+
+    def create(self, *, model: str, input: str, **kwargs: Any) -> SimpleNamespace:
+        owner = self._owner
+        _sleep_ms(owner.embedding_latency_ms, owner.jitter_ms, owner._rng, owner._lock)
+        with owner._lock:
+            owner.calls["embeddings"] += 1
+        vector = fake_embedding(str(input), owner.embedding_dims)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=vector)], model=model)
+
+
+class FakeOpenAIClient:
+    """
+    In-process stand-in for the OpenAI client surface the engine uses
+    (`responses.create`, `embeddings.create`), with configurable latency.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency_ms: float = 0.0,
+        embedding_latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        embedding_dims: int = 64,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.embedding_latency_ms = embedding_latency_ms
+        self.jitter_ms = jitter_ms
+        self.embedding_dims = embedding_dims
+        self.calls = {"responses": 0, "embeddings": 0}
+        self.prompt_cache = PromptCacheModel()
+        self._prompts: dict[str, str] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.responses = _FakeResponses(self)
+        self.embeddings = _FakeEmbeddings(self)
+
+
+def fake_rpc_rows(rpc_name: str, count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "chunk_text": f"Synthetic {rpc_name} chunk {i}: services performed outside Washington are not subject to use tax.",
+            "citation": "WAC 458-20-19402",
+            "document_name": f"{rpc_name}-doc-{i}",
+            "similarity": round(0.9 - i * 0.05, 3),
+        }
+        for i in range(count)
+    ]
+
+
+class _FakeRpcCall:
+    def __init__(self, owner: FakeSupabaseClient, rpc_name: str, payload: dict[str, Any]):
+        self._owner = owner
+        self._rpc_name = rpc_name
+        self._payload = payload
+
+    def execute(self) -> SimpleNamespace:
+        owner = self._owner
+        _sleep_ms(owner.latency_ms, owner.jitter_ms, owner._rng, owner._lock)
+        with owner._lock:
+            owner.calls += 1
+        count = int(self._payload.get("match_count") or self._payload.get("count") or 3)
+        return SimpleNamespace(data=fake_rpc_rows(self._rpc_name, count))
+
+
+class FakeSupabaseClient:
+    """In-process stand-in for `supabase.rpc(name, payload).execute()`."""
+
+    def __init__(self, *, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def rpc(self, rpc_name: str, payload: dict[str, Any]) -> _FakeRpcCall:
+        return _FakeRpcCall(self, rpc_name, payload)
@@ -4,8 +4,10 @@ from dataclasses import dataclass
 from pathlib import Path
 import shutil
 
+from refund_engine.timing import span
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class InvoiceTextResult:
     pdf_path: str
     text: str
@@ -79,9 +81,11 @@ def _extract_text_ocr(pdf_path: Path, max_pages: int, dpi: int) -> tuple[str, in
         for idx in range(pages_processed):
             try:
                 page = doc[idx]
-                bitmap = page.render(scale=render_scale)
-                image = bitmap.to_pil()
-                text = pytesseract.image_to_string(image) or ""
+                with span("invoice.ocr_render"):
+                    bitmap = page.render(scale=render_scale)
+                    image = bitmap.to_pil()
+                with span("invoice.ocr"):
+                    text = pytesseract.image_to_string(image) or ""
                 text = text.strip()
                 if text:
                     chunks.append(text)
@@ -124,7 +128,8 @@ def extract_invoice_text(
             warnings=("invoice file not found",),
         )
 
-    direct_text, direct_pages, direct_warnings = _extract_text_pdfplumber(path, max_pages)
+    with span("invoice.pdf_text"):
+        direct_text, direct_pages, direct_warnings = _extract_text_pdfplumber(path, max_pages)
     warnings = list(direct_warnings)
 
     if len(" ".join(direct_text.split())) >= min_direct_text_chars:
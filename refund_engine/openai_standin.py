@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+from array import array
+import base64
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Iterator
+import uuid
+
+from refund_engine.fake_services import (
+    PromptCacheModel,
+    approx_tokens,
+    fake_analysis_payload,
+    fake_embedding,
+    row_fields_text,
+)
+
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+@dataclass(frozen=True)
+class StandInSettings:
+    latency_ms: float = 0.0
+    # fixed: always latency_ms; uniform: latency_ms +/- jitter_ms;
+    # lognormal: median latency_ms with spread `sigma` (long tail).
+    distribution: str = "fixed"
+    jitter_ms: float = 0.0
+    sigma: float = 0.5
+    embedding_latency_ms: float = 0.0
+    embedding_dims: int = 1536
+    rate_429: float = 0.0
+    retry_after_s: float = 1.0
+    timeout_rate: float = 0.0
+    timeout_ms: float = 120_000.0
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)} (got {self.distribution!r})"
+            )
+
+
+def _prompt_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
+def _response_body(
+    response_id: str,
+    model: str,
+    prompt: str,
+    row_prompt: str,
+    cached_tokens: int,
+) -> dict[str, Any]:
+    output_text = json.dumps(fake_analysis_payload(row_prompt))
+    input_tokens = approx_tokens(prompt)
+    output_tokens = approx_tokens(output_text)
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [
+            {
+                "id": f"msg_{uuid.uuid4().hex}",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": output_text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": cached_tokens},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def _encode_embedding(vector: list[float], encoding_format: str | None) -> list[float] | str:
+    if encoding_format == "base64":
+        # The SDK requests little-endian float32 base64 by default.
+        return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+    return vector
+
+
+def _embeddings_body(model: str, value: Any, dims: int, encoding_format: str | None) -> dict[str, Any]:
+    inputs = value if isinstance(value, list) else [value]
+    texts = [_prompt_text(item) for item in inputs]
+    tokens = sum(approx_tokens(text) for text in texts)
+    return {
+        "object": "list",
+        "model": model,
+        "data": [
+            {
+                "object": "embedding",
+                "index": i,
+                "embedding": _encode_embedding(fake_embedding(text, dims), encoding_format),
+            }
+            for i, text in enumerate(texts)
+        ],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    OpenAI-compatible HTTP stand-in serving `POST /v1/responses` and
+    `POST /v1/embeddings`, with configurable latency, 429s and hung
+    requests. `GET /stats` returns request counters.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], settings: StandInSettings | None = None):
+        super().__init__(address, _StandInHandler)
+        self.settings = settings or StandInSettings()
+        self.stats = {"responses": 0, "embeddings": 0, "rate_limited": 0, "timeouts": 0}
+        self.prompt_cache = PromptCacheModel()
+        self._row_prompts: dict[str, str] = {}
+        self._rng = random.Random(self.settings.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def remember(self, response_id: str, prompt: str, previous_id: str | None) -> str:
+        """Row prompt a response answers for; continued responses inherit it."""
+        with self._lock:
+            row_prompt = self._row_prompts.get(previous_id, prompt) if previous_id else prompt
+            self._row_prompts[response_id] = row_fields_text(row_prompt)
+        return row_prompt
+
+    def draw(self) -> tuple[float, float]:
+        with self._lock:
+            return self._rng.random(), self._rng.random()
+
+    def latency_ms(self, base_ms: float) -> float:
+        settings = self.settings
+        with self._lock:
+            if settings.distribution == "uniform":
+                value = base_ms + self._rng.uniform(-settings.jitter_ms, settings.jitter_ms)
+            elif settings.distribution == "lognormal" and base_ms > 0:
+                value = self._rng.lognormvariate(math.log(base_ms), settings.sigma)
+            else:
+                value = base_ms
+        return max(0.0, value)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def _send_json(self, status: int, body: dict[str, Any], headers: dict[str, str] | None = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str, error_type: str, headers: dict[str, str] | None = None):
+        self._send_json(
+            status,
+            {"error": {"message": message, "type": error_type, "param": None, "code": None}},
+            headers,
+        )
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.server._lock:
+                stats = dict(self.server.stats)
+            self._send_json(200, stats)
+            return
+        self._send_error(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_error(400, "Request body is not valid JSON", "invalid_request_error")
+            return
+
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/responses"):
+            endpoint = "responses"
+        elif path.endswith("/embeddings"):
+            endpoint = "embeddings"
+        else:
+            self._send_error(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+
+        server = self.server
+        settings = server.settings
+        rate_roll, timeout_roll = server.draw()
+        if rate_roll < settings.rate_429:
+            server.count("rate_limited")
+            self._send_error(
+                429,
+                "Rate limit reached (stand-in)",
+                "rate_limit_exceeded",
+                {"Retry-After": f"{settings.retry_after_s:g}"},
+            )
+            return
+        if timeout_roll < settings.timeout_rate:
+            # Hold the connection past the client's timeout.
+            server.count("timeouts")
+            time.sleep(settings.timeout_ms / 1000.0)
+            self._send_error(504, "Upstream timeout (stand-in)", "timeout")
+            return
+
+        model = str(request.get("model") or "stand-in")
+        if endpoint == "responses":
+            time.sleep(server.latency_ms(settings.latency_ms) / 1000.0)
+            server.count("responses")
+            prompt = _prompt_text(request.get("input", ""))
+            response_id = f"resp_{uuid.uuid4().hex}"
+            row_prompt = server.remember(response_id, prompt, request.get("previous_response_id"))
+            self._send_json(
+                200,
+                _response_body(response_id, model, prompt, row_prompt, server.prompt_cache.cached_tokens(prompt)),
+            )
+        else:
+            time.sleep(server.latency_ms(settings.embedding_latency_ms) / 1000.0)
+            server.count("embeddings")
+            dims = int(request.get("dimensions") or settings.embedding_dims)
+            self._send_json(
+                200,
+                _embeddings_body(model, request.get("input", ""), dims, request.get("encoding_format")),
+            )
+
+
+@contextmanager
+def running_standin(
+    settings: StandInSettings | None = None,
+    *,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> Iterator[StandInServer]:
+    """Serve the stand-in on a background thread for the duration of the block."""
+    server = StandInServer((host, port), settings)
+    thread = threading.Thread(target=server.serve_forever, name="openai-standin", daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
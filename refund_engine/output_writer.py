@@ -1,13 +1,24 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
 import shutil
-from typing import Any
+from typing import Any, Callable
+import uuid
 
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 
 from refund_engine.constants import AI_OUTPUT_COLUMNS
-from refund_engine.datasets import DatasetConfig, read_source_dataframe
+from refund_engine.datasets import (
+    EXCEL_SUFFIXES,
+    DatasetConfig,
+    iter_source_rows,
+    read_excel_dataframe,
+    table_format,
+)
+from refund_engine.records import ResultBatch, deep_sizeof
+from refund_engine.timing import span
+from refund_engine.xlsx_patch import patch_sheet_cells, read_header_row
 
 
 def ensure_output_file(config: DatasetConfig):
@@ -20,54 +31,48 @@ def ensure_output_file(config: DatasetConfig):
         shutil.copy2(config.source_file, config.output_file)
         return
 
-    # Fallback: create a basic xlsx from source dataframe
-    source_df = read_source_dataframe(config)
-    wb = Workbook()
-    ws = wb.active
-    if config.sheet_name:
-        ws.title = config.sheet_name
-
-    headers = list(source_df.columns)
-    ws.append(headers)
-    for _, row in source_df.iterrows():
-        ws.append(list(row.values))
-
-    wb.save(config.output_file)
-
-
-def _header_map(worksheet) -> dict[str, int]:
-    mapping: dict[str, int] = {}
-    for col_idx in range(1, worksheet.max_column + 1):
-        value = worksheet.cell(row=1, column=col_idx).value
-        if value:
-            mapping[str(value)] = col_idx
-    return mapping
-
-
-def _ensure_headers(worksheet, headers: tuple[str, ...]) -> dict[str, int]:
-    mapping = _header_map(worksheet)
-    next_col = worksheet.max_column + 1
-    for header in headers:
-        if header in mapping:
-            continue
-        worksheet.cell(row=1, column=next_col, value=header)
-        mapping[header] = next_col
-        next_col += 1
-    return mapping
-
-
-def _safe_cell_value(value: Any):
-    if value is None:
-        return None
-    if isinstance(value, (int, float, str, bool)):
-        return value
-    return str(value)
+    # Fallback: build a plain xlsx from the source, streaming rows so wide/long
+    # xlsb and columnar sources never sit in memory as a whole.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=config.sheet_name or "Sheet1")
+    if config.source_file.suffix.lower() in EXCEL_SUFFIXES or table_format(config.source_file):
+        rows = iter_source_rows(config)
+        header = next(rows, ())
+        ws.append([col.strip() if isinstance(col, str) else col for col in header])
+        for values in rows:
+            ws.append(list(values))
+    else:
+        source_df = read_excel_dataframe(config.source_file, config.sheet_name)
+        ws.append(list(source_df.columns))
+        for values in source_df.itertuples(index=False, name=None):
+            ws.append(list(values))
+
+    temp_path = config.output_file.with_name(f".{config.output_file.name}.{uuid.uuid4().hex[:8]}.tmp")
+    wb.save(temp_path)
+    os.replace(temp_path, config.output_file)
+
+
+def _output_sheet(path: Path, sheet_name: str | None) -> tuple[str | None, dict[str, int]]:
+    if sheet_name:
+        try:
+            return sheet_name, read_header_row(path, sheet_name)
+        except KeyError:
+            pass
+    return None, read_header_row(path, None)
 
 
 def apply_updates_to_output(
     config: DatasetConfig,
     updates_by_row_index: dict[int, dict[str, Any]],
 ) -> dict[str, Any]:
+    """
+    Write AI columns for the given source rows into the output workbook.
+
+    The output sheet is streamed row by row and only the updated rows are
+    rewritten; memory use does not grow with the workbook. The file is
+    replaced atomically, so an interrupted write leaves the previous
+    output intact.
+    """
     ensure_output_file(config)
 
     if config.output_file.suffix.lower() != ".xlsx":
@@ -75,32 +80,97 @@ def apply_updates_to_output(
             f"Output writing currently supports .xlsx only (got {config.output_file})"
         )
 
-    wb = load_workbook(config.output_file)
-    ws = wb[config.sheet_name] if config.sheet_name and config.sheet_name in wb.sheetnames else wb.active
-
-    headers = _ensure_headers(ws, AI_OUTPUT_COLUMNS)
-    updated_rows = 0
-    skipped_rows: list[int] = []
-
-    for source_index, row_values in updates_by_row_index.items():
-        row_number = int(source_index) + 2
-        if row_number > ws.max_row:
-            skipped_rows.append(int(source_index))
-            continue
-
-        for column_name, value in row_values.items():
-            if column_name not in headers:
-                continue
-            ws.cell(
-                row=row_number,
-                column=headers[column_name],
-                value=_safe_cell_value(value),
-            )
-        updated_rows += 1
-
-    wb.save(config.output_file)
+    sheet_name, existing = _output_sheet(config.output_file, config.sheet_name)
+    writable = set(existing) | set(AI_OUTPUT_COLUMNS)
+    updates = {
+        int(idx): {col: value for col, value in values.items() if col in writable}
+        for idx, values in updates_by_row_index.items()
+    }
+
+    temp_path = config.output_file.with_name(f".{config.output_file.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        result = patch_sheet_cells(
+            config.output_file,
+            temp_path,
+            sheet_name,
+            updates,
+            ensure_headers=AI_OUTPUT_COLUMNS,
+        )
+        os.replace(temp_path, config.output_file)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
     return {
-        "updated_rows": updated_rows,
-        "skipped_rows": skipped_rows,
+        "updated_rows": result.updated_rows,
+        "skipped_rows": list(result.skipped_rows),
         "output_file": str(config.output_file),
     }
+
+
+class IncrementalOutputWriter:
+    """
+    Buffer row results during a run and write them to the output workbook
+    every `flush_every` rows (0 = only when closed), so a long run keeps
+    its progress on disk. `before_flush` runs ahead of each write, e.g. to
+    commit the same rows to the results ledger first. With `measure_memory`
+    the largest pending batch is sized at flush time (see `memory_report`).
+    """
+
+    def __init__(
+        self,
+        config: DatasetConfig,
+        *,
+        flush_every: int = 0,
+        before_flush: Callable[[], None] | None = None,
+        measure_memory: bool = False,
+    ):
+        self.config = config
+        self.flush_every = max(0, int(flush_every))
+        self.before_flush = before_flush
+        self.measure_memory = measure_memory
+        self._pending = ResultBatch()
+        self._peak_rows = 0
+        self._peak_bytes = 0
+        self._updated_rows = 0
+        self._skipped_rows: list[int] = []
+        self._flushes = 0
+
+    def add(self, row_index: int, values: dict[str, Any]):
+        self._pending.append(row_index, values)
+        if self.flush_every and len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self.measure_memory:
+            pending_bytes = deep_sizeof(self._pending)
+            if pending_bytes > self._peak_bytes:
+                self._peak_rows, self._peak_bytes = len(self._pending), pending_bytes
+        if self.before_flush is not None:
+            self.before_flush()
+        with span("output.write"):
+            result = apply_updates_to_output(self.config, dict(self._pending.items()))
+        self._updated_rows += result["updated_rows"]
+        self._skipped_rows.extend(result["skipped_rows"])
+        self._flushes += 1
+        self._pending.clear()
+
+    def close(self) -> dict[str, Any]:
+        self.flush()
+        return {
+            "updated_rows": self._updated_rows,
+            "skipped_rows": self._skipped_rows,
+            "output_file": str(self.config.output_file),
+            "flushes": self._flushes,
+        }
+
+    def memory_report(self) -> dict[str, Any] | None:
+        """Size of the largest batch held before a flush, when measured."""
+        if not self.measure_memory:
+            return None
+        return {
+            "result_rows": self._peak_rows,
+            "results_bytes": self._peak_bytes,
+            "bytes_per_row": round(self._peak_bytes / self._peak_rows, 1) if self._peak_rows else 0.0,
+        }
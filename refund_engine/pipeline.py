@@ -1,34 +1,48 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
+from itertools import chain
 import json
 from pathlib import Path
 import shutil
-from typing import Any
-
-import pandas as pd
+import sys
+import time
+from typing import Any, Iterator
 
+from refund_engine.analysis.cascade import CascadeAnalyzer, summarize_cascade
 from refund_engine.analysis.openai_analyzer import (
     InvoiceEvidence,
     OpenAIAnalyzer,
+    RowAnalyzer,
     RowEvidence,
 )
+from refund_engine.analysis.rule_engine import classify_row
+from refund_engine.config import get_cascade_settings, get_result_cache_settings
 from refund_engine.constants import RUNS_DIR
+from refund_engine.dataset_session import DatasetSession
 from refund_engine.datasets import (
     DatasetConfig,
-    coerce_float,
+    convert_source_to_parquet,
     filter_unanalyzed_rows,
     get_dataset_config,
     is_blank,
+    iter_typed_rows,
     load_datasets_config,
     read_excel_dataframe,
-    read_source_dataframe,
     select_rows,
+    source_paths,
 )
 from refund_engine.invoice_text import extract_invoice_text
-from refund_engine.output_writer import apply_updates_to_output
-from refund_engine.validation_rules import ensure_process_token, validate_output_row
+from refund_engine.output_writer import IncrementalOutputWriter, apply_updates_to_output
+from refund_engine.result_cache import ResultCache, knowledge_base_version, result_cache_key
+from refund_engine.results_ledger import ResultsLedger, new_run_id
+from refund_engine.timing import record_spans, rounded, span
+from refund_engine.validation_rules import (
+    auto_repair_output_row,
+    ensure_process_token,
+    validate_output_row,
+)
 
 
 @dataclass(frozen=True)
@@ -38,9 +52,20 @@ class AnalyzeOptions:
     row_index: int | None = None
     vendor: str | None = None
     min_amount: float | None = None
+    where: str | None = None
     max_invoice_pages: int = 4
     dry_run: bool = False
     write_output: bool = True
+    flush_every: int = 0
+    chunk_rows: int = 0
+    resume: bool = True
+    rules: bool = False
+    cascade: bool = False
+    use_cache: bool = True
+    ledger_path: str | Path | None = None
+    run_log_dir: str | Path | None = None
+    # Size the output writer's pending batches (benchmarks); costs a deep walk per flush.
+    measure_memory: bool = False
     model: str | None = None
     reasoning_effort: str | None = None
     verbosity: str | None = None
@@ -52,12 +77,6 @@ def list_datasets(config_path: str | Path | None = None) -> dict[str, str]:
     return {dataset_id: cfg.description for dataset_id, cfg in datasets.items()}
 
 
-def _safe_text(value: Any) -> str:
-    if is_blank(value):
-        return ""
-    return str(value).strip()
-
-
 def _resolve_invoice_path(invoice_dir: Path, filename: str | None) -> Path | None:
     if not filename:
         return None
@@ -83,7 +102,7 @@ def _build_invoice_evidence(
     return InvoiceEvidence(
         filename=filename,
         path=str(path),
-        extraction_method=result.method,
+        extraction_method=sys.intern(result.method),
         text_preview=result.preview(max_chars=2400),
         warnings=result.warnings,
     )
@@ -93,38 +112,32 @@ def _build_row_evidence(
     dataset_id: str,
     config: DatasetConfig,
     row_index: int,
-    row: pd.Series,
+    values: dict[str, Any],
     *,
     max_invoice_pages: int,
 ) -> RowEvidence:
-    cols = config.columns
-    invoice_1_name = _safe_text(row.get(cols.invoice_1))
-    invoice_2_name = _safe_text(row.get(cols.invoice_2)) if cols.invoice_2 else ""
-
-    tax_amount = coerce_float(row.get(cols.tax_amount))
-    tax_base = coerce_float(row.get(cols.tax_base)) if cols.tax_base else None
-
+    # `values` comes from iter_typed_rows: text is already stripped, amounts are floats or None.
     return RowEvidence(
         dataset_id=dataset_id,
         row_index=row_index,
-        vendor=_safe_text(row.get(cols.vendor)),
-        description=_safe_text(row.get(cols.description)) if cols.description else "",
-        tax_amount=tax_amount,
-        tax_base=tax_base,
-        invoice_number=_safe_text(row.get(cols.invoice_number)) if cols.invoice_number else "",
-        po_number=_safe_text(row.get(cols.po_number)) if cols.po_number else "",
+        vendor=values.get("vendor", ""),
+        description=values.get("description", ""),
+        tax_amount=values.get("tax_amount"),
+        tax_base=values.get("tax_base"),
+        invoice_number=values.get("invoice_number", ""),
+        po_number=values.get("po_number", ""),
         invoice_1=_build_invoice_evidence(
             config.invoice_path,
-            invoice_1_name,
+            values.get("invoice_1", ""),
             max_pages=max_invoice_pages,
         ),
         invoice_2=_build_invoice_evidence(
             config.invoice_path,
-            invoice_2_name,
+            values.get("invoice_2", ""),
             max_pages=max_invoice_pages,
         ),
-        rate=coerce_float(row.get(cols.rate)) if cols.rate else None,
-        jurisdiction=_safe_text(row.get(cols.jurisdiction)) if cols.jurisdiction else None,
+        rate=values.get("rate"),
+        jurisdiction=values.get("jurisdiction", "" if config.columns.jurisdiction else None),
     )
 
 
@@ -175,24 +188,103 @@ def _fallback_review_result(evidence: RowEvidence, reason: str) -> dict[str, Any
     }
 
 
-def _write_run_log(dataset_id: str, events: list[dict[str, Any]], summary: dict[str, Any]) -> str:
-    RUNS_DIR.mkdir(exist_ok=True)
-    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = RUNS_DIR / f"{stamp}_{dataset_id}.jsonl"
-    with open(path, "w") as f:
-        for event in events:
-            f.write(json.dumps(event, default=str) + "\n")
-        f.write(json.dumps({"type": "summary", **summary}, default=str) + "\n")
-    return str(path)
+class _RunLog:
+    """Run log (`<directory>/<stamp>_<dataset>.jsonl`, default `runs/`) written one row event at a time."""
+
+    def __init__(self, dataset_id: str, directory: str | Path | None = None):
+        directory = Path(directory) if directory is not None else RUNS_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = directory / f"{stamp}_{dataset_id}.jsonl"
+        self._file = open(self.path, "w")
+
+    def write(self, event: dict[str, Any]):
+        self._file.write(json.dumps(event, default=str) + "\n")
+
+    def close(self, summary: dict[str, Any]) -> str:
+        self.write({"type": "summary", **summary})
+        self._file.close()
+        return str(self.path)
+
+
+def _write_run_log(
+    dataset_id: str,
+    events: list[dict[str, Any]],
+    summary: dict[str, Any],
+    directory: str | Path | None = None,
+) -> str:
+    run_log = _RunLog(dataset_id, directory)
+    for event in events:
+        run_log.write(event)
+    return run_log.close(summary)
+
+
+class _ChunkedSelection:
+    """
+    Rows selected for analysis, read from the source one chunk at a time.
+
+    Filters, resume exclusion and selection run per chunk; `limit` counts
+    across chunks and stops the read once reached. Row indices are sheet
+    positions, as in the whole-frame path.
+    """
+
+    def __init__(self, session: DatasetSession, options: AnalyzeOptions, completed: set[int]):
+        self.session = session
+        self.options = options
+        self.completed = list(completed)
+        self.chunks = 0
+        self.scanned_rows = 0
+        self.unanalyzed_rows = 0
+
+    def __iter__(self) -> Iterator[tuple[int, dict[str, Any]]]:
+        config = self.session.config
+        remaining = self.options.limit if self.options.limit is not None and self.options.limit >= 0 else None
+        for chunk in self.session.source_chunks(self.options.chunk_rows):
+            self.chunks += 1
+            self.scanned_rows = int(chunk.attrs.get("source_rows", self.scanned_rows + len(chunk)))
+            filtered = filter_unanalyzed_rows(chunk, config)
+            self.unanalyzed_rows += len(filtered)
+            if self.completed:
+                filtered = filtered[~filtered.index.isin(self.completed)]
+            selected = select_rows(
+                filtered,
+                config,
+                limit=remaining,
+                row_index=self.options.row_index,
+                vendor=self.options.vendor,
+                min_amount=self.options.min_amount,
+                where=self.options.where,
+            )
+            yield from iter_typed_rows(selected, config)
+            if remaining is not None:
+                remaining -= len(selected)
+                if remaining <= 0:
+                    return
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "chunk_rows": self.options.chunk_rows,
+            "chunks": self.chunks,
+            "scanned_rows": self.scanned_rows,
+            "unanalyzed_rows": self.unanalyzed_rows,
+        }
 
 
 def preflight_dataset(
     dataset_id: str,
     *,
     sample_rows: int = 25,
+    chunk_rows: int = 0,
     config_path: str | Path | None = None,
+    session: DatasetSession | None = None,
 ) -> dict[str, Any]:
-    config = get_dataset_config(dataset_id, config_path=config_path)
+    """
+    Check a dataset before a run. With `chunk_rows`, only the first chunk of
+    the source is read, so the row counts are left to the run itself.
+    """
+    if session is None:
+        session = DatasetSession.open(dataset_id, config_path=config_path)
+    config = session.config
     report: dict[str, Any] = {
         "dataset_id": dataset_id,
         "description": config.description,
@@ -204,7 +296,7 @@ def preflight_dataset(
         "stats": {},
     }
 
-    if not config.source_file.exists():
+    if not source_paths(config):
         report["errors"].append(f"Source file missing: {config.source_file}")
     if not config.invoice_path.exists():
         report["errors"].append(f"Invoice directory missing: {config.invoice_path}")
@@ -217,7 +309,11 @@ def preflight_dataset(
     source_df = None
     if not report["errors"]:
         try:
-            source_df = read_source_dataframe(config)
+            with span("dataset.load"):
+                if chunk_rows > 0:
+                    source_df = next(session.source_chunks(chunk_rows))
+                else:
+                    source_df = session.source_frame()
         except Exception as exc:
             report["errors"].append(f"Failed to read source file: {exc}")
 
@@ -234,14 +330,18 @@ def preflight_dataset(
         if missing_columns:
             report["errors"].append(f"Missing required columns: {missing_columns}")
         else:
-            filtered = filter_unanalyzed_rows(source_df, config)
-            report["stats"]["source_rows"] = int(len(source_df))
-            report["stats"]["unanalyzed_rows"] = int(len(filtered))
+            if chunk_rows > 0:
+                filtered = filter_unanalyzed_rows(source_df, config)
+                report["stats"]["chunk_rows"] = chunk_rows
+            else:
+                filtered = session.unanalyzed_frame()
+                report["stats"]["source_rows"] = int(source_df.attrs.get("source_rows", len(source_df)))
+                report["stats"]["unanalyzed_rows"] = int(len(filtered))
 
             sample = filtered.head(sample_rows)
             missing_invoice_files = 0
-            for _, row in sample.iterrows():
-                invoice_name = _safe_text(row.get(config.columns.invoice_1))
+            for _, values in iter_typed_rows(sample, config):
+                invoice_name = values.get("invoice_1", "")
                 path = _resolve_invoice_path(config.invoice_path, invoice_name)
                 if not path or not path.exists():
                     missing_invoice_files += 1
@@ -252,13 +352,22 @@ def preflight_dataset(
     return report
 
 
-def analyze_dataset(options: AnalyzeOptions) -> dict[str, Any]:
-    config = get_dataset_config(options.dataset_id, config_path=options.config_path)
-    preflight = preflight_dataset(
-        options.dataset_id,
-        sample_rows=max(5, min(25, options.limit)),
-        config_path=options.config_path,
-    )
+def analyze_dataset(
+    options: AnalyzeOptions,
+    *,
+    session: DatasetSession | None = None,
+    analyzer: RowAnalyzer | None = None,
+) -> dict[str, Any]:
+    if session is None:
+        session = DatasetSession.open(options.dataset_id, config_path=options.config_path)
+    config = session.config
+    with record_spans() as load_spans:
+        preflight = preflight_dataset(
+            options.dataset_id,
+            sample_rows=max(5, min(25, options.limit)),
+            chunk_rows=options.chunk_rows,
+            session=session,
+        )
     if not preflight["ok"]:
         return {
             "ok": False,
@@ -267,18 +376,33 @@ def analyze_dataset(options: AnalyzeOptions) -> dict[str, Any]:
             "preflight": preflight,
         }
 
-    source_df = read_source_dataframe(config)
-    filtered = filter_unanalyzed_rows(source_df, config)
-    selected = select_rows(
-        filtered,
-        config,
-        limit=options.limit,
-        row_index=options.row_index,
-        vendor=options.vendor,
-        min_amount=options.min_amount,
-    )
+    ledger = ResultsLedger(options.ledger_path)
+    run_id = new_run_id()
+    completed: set[int] = set()
+    if options.resume and options.row_index is None:
+        completed = ledger.completed_rows(options.dataset_id)
+    stream = None
+    if options.chunk_rows > 0:
+        # Out-of-core mode: only one source chunk is in memory at a time.
+        stream = _ChunkedSelection(session, options, completed)
+        rows = iter(stream)
+    else:
+        filtered = session.unanalyzed_frame()
+        if completed:
+            filtered = filtered[~filtered.index.isin(list(completed))]
+        selected = select_rows(
+            filtered,
+            config,
+            limit=options.limit,
+            row_index=options.row_index,
+            vendor=options.vendor,
+            min_amount=options.min_amount,
+            where=options.where,
+        )
+        rows = iter_typed_rows(selected, config)
 
-    if len(selected) == 0:
+    first = next(rows, None)
+    if first is None:
         summary = {
             "ok": True,
             "aborted": False,
@@ -289,135 +413,344 @@ def analyze_dataset(options: AnalyzeOptions) -> dict[str, Any]:
             "message": "No rows selected for analysis.",
             "preflight": preflight,
         }
-        summary["run_log"] = _write_run_log(options.dataset_id, [], summary)
+        if stream is not None:
+            summary["chunked"] = stream.report()
+        summary["run_log"] = _write_run_log(options.dataset_id, [], summary, options.run_log_dir)
         return summary
 
-    analyzer = None
-    if not options.dry_run:
+    if analyzer is None and not options.dry_run:
         analyzer = OpenAIAnalyzer(
             model=options.model,
             reasoning_effort=options.reasoning_effort,
             verbosity=options.verbosity,
         )
-
-    updates: dict[int, dict[str, Any]] = {}
-    events: list[dict[str, Any]] = []
-    status_counts = {"ok": 0, "retry_ok": 0, "fallback_review": 0, "error_review": 0, "dry_run": 0}
-
-    for idx, row in selected.iterrows():
-        evidence = _build_row_evidence(
-            options.dataset_id,
+    cascade_settings = None
+    # Only a plain OpenAIAnalyzer can be cascaded; other analyzers (an
+    # existing CascadeAnalyzer, test doubles) are used as given.
+    if options.cascade and isinstance(analyzer, OpenAIAnalyzer):
+        cascade_settings = get_cascade_settings()
+        analyzer = CascadeAnalyzer(analyzer, cascade_settings)
+    cascade_metadata: list[dict[str, Any]] = []
+
+    result_cache = None
+    if options.use_cache and analyzer is not None:
+        cache_settings = get_result_cache_settings()
+        if cache_settings.enabled:
+            result_cache = ResultCache(options.ledger_path, ttl_s=cache_settings.ttl_s)
+            analyzer_signature = analyzer.cache_signature()
+            kb_version = knowledge_base_version(cache_settings.knowledge_base_tag)
+    cache_stats = {"enabled": result_cache is not None, "hits": 0, "stored": 0}
+
+    # One ledger connection per run, committed in batches and always ahead
+    # of the output workbook.
+    ledger_writer = ledger.writer() if not options.dry_run else None
+    writer = None
+    if options.write_output and not options.dry_run:
+        # A chunked run flushes at least once per chunk so pending output stays bounded.
+        flush_every = options.flush_every or max(options.chunk_rows, 0)
+        writer = IncrementalOutputWriter(
             config,
-            int(idx),
-            row,
-            max_invoice_pages=options.max_invoice_pages,
+            flush_every=flush_every,
+            before_flush=ledger_writer.flush if ledger_writer is not None else None,
+            measure_memory=options.measure_memory,
         )
-        result: dict[str, Any]
-        metadata: dict[str, Any] = {}
-        validation_errors: list[str] = []
-        status = "ok"
-
-        if options.dry_run:
-            result = _fallback_review_result(
-                evidence,
-                "dry-run mode: no API call executed",
-            )
-            status = "dry_run"
-        else:
-            try:
-                assert analyzer is not None
-                result, metadata = analyzer.analyze_row(evidence)
-                validation_errors = validate_output_row(result)
-
-                if validation_errors:
-                    guidance = (
-                        "Your previous output failed validation. "
-                        f"Fix these issues and return corrected JSON only: {validation_errors}"
+
+    # Row results live only in the writer's pending batch and row events go
+    # straight to the run log, so memory per row stays small on large batches.
+    selected_rows = 0
+    run_log = _RunLog(options.dataset_id, options.run_log_dir)
+    status_counts = {
+        "rules": 0,
+        "cached": 0,
+        "ok": 0,
+        "retry_ok": 0,
+        "fallback_review": 0,
+        "error_review": 0,
+        "dry_run": 0,
+    }
+    token_usage = {"input_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+    auto_repaired_rows = 0
+
+    try:
+        for idx, values in chain([first], rows):
+            selected_rows += 1
+            row_started = time.perf_counter()
+            with record_spans() as spans:
+                evidence = _build_row_evidence(
+                    options.dataset_id,
+                    config,
+                    idx,
+                    values,
+                    max_invoice_pages=options.max_invoice_pages,
+                )
+                result: dict[str, Any]
+                metadata: dict[str, Any] = {}
+                validation_errors: list[str] = []
+                auto_repairs: list[dict[str, Any]] = []
+                status = "ok"
+
+                rule_decision = None
+                if options.rules:
+                    with span("rules"):
+                        rule_decision = classify_row(evidence)
+
+                cache_key = None
+                cached = None
+                if result_cache is not None and not (rule_decision is not None and rule_decision.decided):
+                    with span("result_cache.get"):
+                        cache_key = result_cache_key(evidence, analyzer_signature, knowledge_base=kb_version)
+                        cached = result_cache.get(cache_key)
+                        # Validation rules may have tightened since the entry was stored.
+                        if cached is not None and validate_output_row(cached.result):
+                            cached = None
+
+                if rule_decision is not None and rule_decision.decided:
+                    assert rule_decision.result is not None
+                    result = rule_decision.result
+                    metadata = rule_decision.metadata
+                    status = "rules"
+                elif options.dry_run:
+                    result = _fallback_review_result(
+                        evidence,
+                        "dry-run mode: no API call executed",
                     )
-                    result, metadata = analyzer.analyze_row(evidence, guidance=guidance)
-                    validation_errors = validate_output_row(result)
-                    if validation_errors:
-                        status = "fallback_review"
-                        result = _fallback_review_result(
-                            evidence,
-                            f"Validation failed after retry: {validation_errors}",
-                        )
-                    else:
-                        status = "retry_ok"
-            except Exception as exc:
-                status = "error_review"
-                result = _fallback_review_result(evidence, f"Analysis error: {exc}")
-                validation_errors = [f"Analysis exception: {exc}"]
-
-        updates[int(idx)] = result
-        status_counts[status] = status_counts.get(status, 0) + 1
-        events.append(
-            {
-                "type": "row",
-                "dataset_id": options.dataset_id,
-                "row_index": int(idx),
-                "vendor": evidence.vendor,
-                "status": status,
-                "invoice_1_method": evidence.invoice_1.extraction_method if evidence.invoice_1 else "none",
-                "invoice_2_method": evidence.invoice_2.extraction_method if evidence.invoice_2 else "none",
-                "final_decision": result.get("Final_Decision"),
-                "confidence": result.get("Confidence"),
-                "estimated_refund": result.get("Estimated_Refund"),
-                "validation_errors": validation_errors,
-                "metadata": metadata,
-            }
-        )
+                    status = "dry_run"
+                elif cached is not None:
+                    result = cached.result
+                    metadata = {"result_cache": cached.hit_metadata()}
+                    status = "cached"
+                    cache_stats["hits"] += 1
+                else:
+                    try:
+                        assert analyzer is not None
+                        result, metadata = analyzer.analyze_row(evidence)
+                        with span("validation"):
+                            result, repairs = auto_repair_output_row(result)
+                            auto_repairs.extend(repairs)
+                            validation_errors = validate_output_row(result)
+
+                        if validation_errors:
+                            with record_spans() as retry_spans:
+                                result, metadata = analyzer.repair_row(evidence, metadata, validation_errors)
+                                with span("validation"):
+                                    result, repairs = auto_repair_output_row(result)
+                                    auto_repairs.extend(repairs)
+                                    validation_errors = validate_output_row(result)
+                            for stage, ms in retry_spans.items():
+                                spans[f"retry.{stage}"] = ms
+                            if validation_errors:
+                                status = "fallback_review"
+                                result = _fallback_review_result(
+                                    evidence,
+                                    f"Validation failed after retry: {validation_errors}",
+                                )
+                            else:
+                                status = "retry_ok"
+                    except Exception as exc:
+                        status = "error_review"
+                        result = _fallback_review_result(evidence, f"Analysis error: {exc}")
+                        validation_errors = [f"Analysis exception: {exc}"]
+                    if result_cache is not None and cache_key is not None and status in ("ok", "retry_ok"):
+                        with span("result_cache.put"):
+                            result_cache.put(
+                                cache_key,
+                                result,
+                                metadata,
+                                source={"dataset_id": options.dataset_id, "row_index": int(idx), "run_id": run_id},
+                            )
+                        metadata = {**metadata, "result_cache": {"hit": False, "key": cache_key}}
+                        cache_stats["stored"] += 1
+                if rule_decision is not None and not rule_decision.decided:
+                    metadata = {**metadata, "rules": rule_decision.metadata}
+
+                if ledger_writer is not None:
+                    with span("ledger.append"):
+                        ledger_writer.append(options.dataset_id, run_id, int(idx), status, result)
+                if writer is not None:
+                    writer.add(int(idx), result)
+            duration_ms = (time.perf_counter() - row_started) * 1000.0
+            status_counts[status] = status_counts.get(status, 0) + 1
+            auto_repaired_rows += 1 if auto_repairs else 0
+            calls = (metadata.get("cascade") or {}).get("tiers") or [metadata]
+            for key in token_usage:
+                token_usage[key] += sum(int(call.get(key) or 0) for call in calls)
+                token_usage[key] += int((metadata.get("repair") or {}).get(key) or 0)
+            if "cascade" in metadata:
+                cascade_metadata.append(metadata)
+            run_log.write(
+                {
+                    "type": "row",
+                    "dataset_id": options.dataset_id,
+                    "row_index": int(idx),
+                    "vendor": evidence.vendor,
+                    "status": status,
+                    "invoice_1_method": evidence.invoice_1.extraction_method if evidence.invoice_1 else "none",
+                    "invoice_2_method": evidence.invoice_2.extraction_method if evidence.invoice_2 else "none",
+                    "final_decision": result.get("Final_Decision"),
+                    "confidence": result.get("Confidence"),
+                    "estimated_refund": result.get("Estimated_Refund"),
+                    "validation_errors": validation_errors,
+                    "auto_repairs": auto_repairs,
+                    "metadata": metadata,
+                    "duration_ms": round(duration_ms, 3),
+                    "timings_ms": rounded(spans),
+                }
+            )
+    except BaseException as exc:
+        # Commit the rows that finished so resume skips them, and close the
+        # run log, before letting the error (or Ctrl-C) through.
+        try:
+            if ledger_writer is not None:
+                ledger_writer.close()
+        finally:
+            run_log.close(
+                {
+                    "ok": False,
+                    "aborted": True,
+                    "reason": f"{type(exc).__name__}: {exc}",
+                    "dataset_id": options.dataset_id,
+                    "run_id": run_id,
+                    "selected_rows": selected_rows,
+                    "status_counts": status_counts,
+                }
+            )
+        raise
 
-    write_result = None
-    if options.write_output and not options.dry_run:
-        write_result = apply_updates_to_output(config, updates)
+    with record_spans() as run_spans:
+        if ledger_writer is not None:
+            with span("ledger.commit"):
+                ledger_writer.close()
+        write_result = writer.close() if writer is not None else None
 
     summary = {
         "ok": True,
         "aborted": False,
         "dataset_id": options.dataset_id,
-        "selected_rows": int(len(selected)),
-        "updated_rows": int(len(updates)),
+        "run_id": run_id,
+        "selected_rows": selected_rows,
+        "updated_rows": selected_rows,
         "dry_run": options.dry_run,
         "write_output": options.write_output and not options.dry_run,
         "status_counts": status_counts,
+        "auto_repaired_rows": auto_repaired_rows,
+        "result_cache": cache_stats,
+        "token_usage": {
+            **token_usage,
+            "cached_share": round(token_usage["cached_tokens"] / token_usage["input_tokens"], 4)
+            if token_usage["input_tokens"]
+            else 0.0,
+        },
         "preflight": preflight,
         "write_result": write_result,
+        "timings_ms": rounded({**load_spans, **run_spans}),
+        "memory": writer.memory_report() if writer is not None else None,
     }
-    summary["run_log"] = _write_run_log(options.dataset_id, events, summary)
+    if stream is not None:
+        summary["chunked"] = stream.report()
+    if cascade_settings is not None:
+        summary["cascade"] = summarize_cascade(cascade_metadata, cascade_settings.pricing)
+    summary["run_log"] = run_log.close(summary)
     return summary
 
 
-def validate_dataset_output(
+def export_dataset_output(
     dataset_id: str,
     *,
-    max_rows: int | None = None,
+    output_path: str | Path | None = None,
     config_path: str | Path | None = None,
+    ledger_path: str | Path | None = None,
 ) -> dict[str, Any]:
+    """Materialize the output workbook from the latest ledger result of each row."""
     config = get_dataset_config(dataset_id, config_path=config_path)
-    if not config.output_file.exists():
+    if output_path is not None:
+        config = replace(config, output_file=Path(output_path).expanduser())
+
+    results = ResultsLedger(ledger_path).latest_results(dataset_id)
+    if not results:
         return {
             "ok": False,
             "dataset_id": dataset_id,
-            "error": f"Output file not found: {config.output_file}",
+            "error": "No results recorded in the ledger for this dataset.",
         }
 
-    df = read_excel_dataframe(config.output_file, config.sheet_name)
-    rows = df if max_rows is None else df.head(max_rows)
+    write_result = apply_updates_to_output(config, results)
+    return {
+        "ok": True,
+        "dataset_id": dataset_id,
+        "exported_rows": len(results),
+        **write_result,
+    }
+
+
+def convert_dataset_source(
+    dataset_id: str,
+    *,
+    output_path: str | Path | None = None,
+    config_path: str | Path | None = None,
+) -> dict[str, Any]:
+    """Write a dataset's Excel source to Parquet (next to it by default)."""
+    config = get_dataset_config(dataset_id, config_path=config_path)
+    target = Path(output_path).expanduser() if output_path else config.source_file.with_suffix(".parquet")
+    started = time.perf_counter()
+    try:
+        result = convert_source_to_parquet(config, target)
+    except (OSError, ValueError) as exc:
+        return {"ok": False, "dataset_id": dataset_id, "error": str(exc)}
+    return {
+        "ok": True,
+        "dataset_id": dataset_id,
+        "source_file": str(config.source_file),
+        **result,
+        "seconds": round(time.perf_counter() - started, 3),
+        "next_step": f"Set source_file for {dataset_id} in the datasets config to {target}",
+    }
+
+
+def validate_dataset_output(
+    dataset_id: str,
+    *,
+    max_rows: int | None = None,
+    config_path: str | Path | None = None,
+    ledger_path: str | Path | None = None,
+) -> dict[str, Any]:
+    config = get_dataset_config(dataset_id, config_path=config_path)
+    results = ResultsLedger(ledger_path).latest_results(dataset_id)
 
     errors_by_row: dict[int, list[str]] = {}
-    for idx, row in rows.iterrows():
-        reasoning = row.get("AI_Reasoning")
-        if is_blank(reasoning):
-            continue
-        row_errors = validate_output_row(row.to_dict())
-        if row_errors:
-            errors_by_row[int(idx)] = row_errors
+    if results:
+        source = "ledger"
+        items = list(results.items())
+        if max_rows is not None:
+            items = items[:max_rows]
+        checked_rows = len(items)
+        for idx, result in items:
+            row_errors = validate_output_row(result)
+            if row_errors:
+                errors_by_row[idx] = row_errors
+    else:
+        if not config.output_file.exists():
+            return {
+                "ok": False,
+                "dataset_id": dataset_id,
+                "error": f"Output file not found: {config.output_file}",
+            }
+        source = "output_file"
+        df = read_excel_dataframe(config.output_file, config.sheet_name)
+        rows = df if max_rows is None else df.head(max_rows)
+        checked_rows = len(rows)
+        for idx, row in rows.iterrows():
+            reasoning = row.get("AI_Reasoning")
+            if is_blank(reasoning):
+                continue
+            row_errors = validate_output_row(row.to_dict())
+            if row_errors:
+                errors_by_row[int(idx)] = row_errors
 
     return {
         "ok": len(errors_by_row) == 0,
         "dataset_id": dataset_id,
-        "checked_rows": int(len(rows)),
+        "source": source,
+        "checked_rows": int(checked_rows),
         "rows_with_errors": len(errors_by_row),
         "errors_by_row": errors_by_row,
     }
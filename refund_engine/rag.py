@@ -16,6 +16,7 @@ from refund_engine.config import (
     require_supabase_credentials,
 )
 from refund_engine.openai_client import create_openai_client
+from refund_engine.timing import span
 
 
 def _safe_text(value: Any) -> str:
@@ -42,7 +43,7 @@ def _clip(text: str, max_chars: int) -> str:
     return compact[: max_chars - 3] + "..."
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RAGChunk:
     text: str
     citation: str = ""
@@ -52,7 +53,7 @@ class RAGChunk:
     category: str = ""
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RAGContext:
     legal_chunks: tuple[RAGChunk, ...] = ()
     vendor_chunks: tuple[RAGChunk, ...] = ()
@@ -119,7 +120,7 @@ class SupabaseRAGRetriever:
         )
 
     @classmethod
-    def from_env(cls) -> tuple[SupabaseRAGRetriever | None, str | None]:
+    def from_env(cls, *, openai_client: Any | None = None) -> tuple[SupabaseRAGRetriever | None, str | None]:
         rag_settings = get_rag_settings()
         if not rag_settings.enabled:
             return None, None
@@ -128,16 +129,18 @@ class SupabaseRAGRetriever:
                 openai_settings=get_openai_settings(),
                 supabase_settings=get_supabase_settings(),
                 rag_settings=rag_settings,
+                openai_client=openai_client,
             )
             return retriever, None
         except Exception as exc:
             return None, f"RAG disabled due to setup error: {exc}"
 
     def _embed(self, text: str) -> list[float]:
-        response = self.openai_client.embeddings.create(
-            model=self.openai_settings.embedding_model,
-            input=text,
-        )
+        with span("rag.embedding"):
+            response = self.openai_client.embeddings.create(
+                model=self.openai_settings.embedding_model,
+                input=text,
+            )
         if not getattr(response, "data", None):
             raise ValueError("OpenAI embeddings returned no vectors")
         vector = response.data[0].embedding
@@ -176,7 +179,8 @@ class SupabaseRAGRetriever:
         last_error: Exception | None = None
         for payload in payloads:
             try:
-                response = self.supabase.rpc(rpc_name, payload).execute()
+                with span("rag.rpc"):
+                    response = self.supabase.rpc(rpc_name, payload).execute()
                 data = getattr(response, "data", None)
                 if data is None:
                     return [], None
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
+import threading
 
 from refund_engine.constants import PROJECT_ROOT
 
@@ -9,6 +10,7 @@ _RATE_TABLE_PATH = PROJECT_ROOT / "data" / "wa_rates" / "Q424_Excel_LSU-rates.xl
 
 # (combined_rate, location_name) tuples, loaded once
 _CACHE: list[tuple[float, str]] | None = None
+_LOAD_LOCK = threading.Lock()
 
 # Plausible WA combined rate range (state 6.5% + local 1%–4.1%)
 _MIN_WA_RATE = 0.070
@@ -31,6 +33,13 @@ class RateValidation:
 
 
 def _load_rate_table() -> list[tuple[float, str]]:
+    if _CACHE is not None:
+        return _CACHE
+    with _LOAD_LOCK:
+        return _read_rate_table()
+
+
+def _read_rate_table() -> list[tuple[float, str]]:
     global _CACHE
     if _CACHE is not None:
         return _CACHE
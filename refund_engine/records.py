@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from dataclasses import fields, is_dataclass
+import sys
+from typing import Any, Iterator
+
+
+# Result columns drawn from a small vocabulary. Their values are interned so
+# that thousands of rows share one string object per distinct value.
+VOCABULARY_COLUMNS = (
+    "Final_Decision",
+    "Product_Type",
+    "Service_Classification",
+    "Refund_Basis",
+    "Refund_Source",
+    "Citation_Source",
+    "Methodology",
+    "Tax_Category",
+    "Sales_Use_Tax",
+    "Needs_Review",
+)
+
+
+class _Missing:
+    # Marks a column a row does not have; pickles by reference to the singleton.
+    __slots__ = ()
+
+    def __reduce__(self) -> str:
+        return "_MISSING"
+
+
+_MISSING = _Missing()
+
+
+def intern_vocabulary(result: dict[str, Any]) -> dict[str, Any]:
+    """Intern the vocabulary columns of `result` in place and return it."""
+    for column in VOCABULARY_COLUMNS:
+        value = result.get(column)
+        if isinstance(value, str):
+            result[column] = sys.intern(value)
+    return result
+
+
+class ResultBatch:
+    """
+    Row results stored column by column.
+
+    One list per output column replaces one dict per row, vocabulary values
+    are interned, and appending a row index twice replaces the earlier row.
+    The state is a few flat lists, so a batch pickles cheaply for transfer
+    to another process.
+    """
+
+    __slots__ = ("row_indices", "columns", "_positions")
+
+    def __init__(self):
+        self.row_indices: list[int] = []
+        self.columns: dict[str, list[Any]] = {}
+        self._positions: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.row_indices)
+
+    def __contains__(self, row_index: object) -> bool:
+        return row_index in self._positions
+
+    def __setstate__(self, state: tuple[None, dict[str, Any]]):
+        _, slots = state
+        for name, value in slots.items():
+            setattr(self, name, value)
+        # Unpickled strings are fresh objects; share them again.
+        for column in VOCABULARY_COLUMNS:
+            values = self.columns.get(column)
+            if values is not None:
+                values[:] = [sys.intern(value) if isinstance(value, str) else value for value in values]
+
+    def append(self, row_index: int, result: dict[str, Any]):
+        row_index = int(row_index)
+        pos = self._positions.get(row_index)
+        if pos is None:
+            pos = len(self.row_indices)
+            self._positions[row_index] = pos
+            self.row_indices.append(row_index)
+            for values in self.columns.values():
+                values.append(_MISSING)
+        else:
+            for values in self.columns.values():
+                values[pos] = _MISSING
+        for name, value in intern_vocabulary(dict(result)).items():
+            values = self.columns.get(name)
+            if values is None:
+                values = self.columns[name] = [_MISSING] * len(self.row_indices)
+            values[pos] = value
+
+    def row(self, row_index: int) -> dict[str, Any]:
+        pos = self._positions[int(row_index)]
+        return {
+            name: values[pos]
+            for name, values in self.columns.items()
+            if values[pos] is not _MISSING
+        }
+
+    def items(self) -> Iterator[tuple[int, dict[str, Any]]]:
+        for row_index in self.row_indices:
+            yield row_index, self.row(row_index)
+
+    def clear(self):
+        self.row_indices = []
+        self.columns = {}
+        self._positions = {}
+
+
+def deep_sizeof(obj: Any) -> int:
+    """Bytes held by `obj` and everything it references, counting shared objects once."""
+    seen: set[int] = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or item is _MISSING:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif is_dataclass(item) and not isinstance(item, type):
+            stack.extend(getattr(item, field.name) for field in fields(item))
+        elif hasattr(item, "__slots__"):
+            stack.extend(getattr(item, name) for name in item.__slots__ if hasattr(item, name))
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            stack.append(vars(item))
+    return total
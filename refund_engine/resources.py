@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from datetime import datetime
+import threading
+import time
+from typing import Any, Callable
+
+from refund_engine import rate_validator, vendor_profiles
+from refund_engine.analysis import rule_engine
+from refund_engine.analysis.openai_analyzer import OpenAIAnalyzer
+from refund_engine.openai_client import create_openai_client
+from refund_engine.rag import SupabaseRAGRetriever
+from refund_engine.validation_rules import load_valid_rcws
+
+
+# Reference tables loaded once per process; each loader is thread-safe.
+REFERENCE_TABLES: dict[str, Callable[[], Any]] = {
+    "rate_table": rate_validator._load_rate_table,
+    "vendor_profiles": vendor_profiles._load,
+    "valid_rcws": load_valid_rcws,
+    "tax_rule_scenarios": rule_engine._scenarios,
+}
+# Seconds before a failed RAG setup is tried again.
+RAG_RETRY_INTERVAL_S = 300.0
+
+
+class SharedResources:
+    """
+    Process-wide OpenAI client, RAG retriever, analyzers and reference tables.
+
+    Everything is created lazily on first use and then shared by every
+    webapp session and background job, so connection pools and loaded
+    tables stay warm. The OpenAI and Supabase clients are thread-safe;
+    analyzers hold no per-row state.
+    """
+
+    def __init__(
+        self,
+        *,
+        openai_client_factory: Callable[[], Any] = create_openai_client,
+        rag_factory: Callable[..., tuple[SupabaseRAGRetriever | None, str | None]] = SupabaseRAGRetriever.from_env,
+        rag_retry_s: float = RAG_RETRY_INTERVAL_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._openai_client_factory = openai_client_factory
+        self._rag_factory = rag_factory
+        self.rag_retry_s = rag_retry_s
+        self.clock = clock
+        self._lock = threading.RLock()
+        # Serializes RAG setup, which makes network calls, without holding `_lock`.
+        self._rag_setup_lock = threading.Lock()
+        self._openai_client: Any | None = None
+        self._rag: tuple[SupabaseRAGRetriever | None, str | None] | None = None
+        self._rag_failed_at: float | None = None
+        self._analyzers: dict[tuple[str | None, str | None, str | None], OpenAIAnalyzer] = {}
+        self._tables: dict[str, int] = {}
+        self._errors: dict[str, str] = {}
+        self._warmed_at: str | None = None
+        self._warm_up_ms: dict[str, float] = {}
+        self._warm_thread: threading.Thread | None = None
+
+    def openai_client(self) -> Any:
+        with self._lock:
+            if self._openai_client is None:
+                self._openai_client = self._openai_client_factory()
+            return self._openai_client
+
+    def rag_retriever(self) -> tuple[SupabaseRAGRetriever | None, str | None]:
+        """
+        The shared retriever (None when RAG is off) and any setup warning.
+
+        A failed setup is retried by the first call `rag_retry_s` after it
+        failed; until a retry succeeds the warning is reported under `errors`.
+        """
+        with self._lock:
+            if not self._rag_setup_due():
+                return self._rag
+        with self._rag_setup_lock:
+            with self._lock:
+                if not self._rag_setup_due():  # another thread just set it up
+                    return self._rag
+            try:
+                client = self.openai_client()
+            except Exception:
+                client = None
+            rag = self._rag_factory(openai_client=client)
+            with self._lock:
+                self._rag = rag
+                if rag[1] is not None:
+                    self._rag_failed_at = self.clock()
+                    self._errors["rag_retriever"] = rag[1]
+                else:
+                    self._rag_failed_at = None
+                    self._errors.pop("rag_retriever", None)
+            return rag
+
+    def _rag_setup_due(self) -> bool:
+        if self._rag is None:
+            return True
+        return self._rag_failed_at is not None and self.clock() - self._rag_failed_at >= self.rag_retry_s
+
+    def analyzer(
+        self,
+        *,
+        model: str | None = None,
+        reasoning_effort: str | None = None,
+        verbosity: str | None = None,
+    ) -> OpenAIAnalyzer:
+        key = (model, reasoning_effort, verbosity)
+        retriever, warning = self.rag_retriever()
+        client = self.openai_client()
+        with self._lock:
+            analyzer = self._analyzers.get(key)
+            # Rebuilt once a retried RAG setup succeeds.
+            if analyzer is None or analyzer.rag_retriever is not retriever:
+                analyzer = OpenAIAnalyzer(
+                    model=model,
+                    reasoning_effort=reasoning_effort,
+                    verbosity=verbosity,
+                    rag_retriever=retriever,
+                    client=client,
+                    rag_from_env=False,
+                )
+                analyzer.rag_init_warning = warning
+                self._analyzers[key] = analyzer
+            return analyzer
+
+    def warm_up(self) -> dict[str, Any]:
+        """Create the clients and load every reference table; returns `health()` plus timings."""
+        steps: dict[str, Callable[[], Any]] = {
+            "openai_client": self.openai_client,
+            "rag_retriever": self.rag_retriever,
+            **REFERENCE_TABLES,
+        }
+        timings: dict[str, float] = {}
+        for name, load in steps.items():
+            started = time.perf_counter()
+            try:
+                loaded = load()
+            except Exception as exc:
+                with self._lock:
+                    self._errors[name] = f"{type(exc).__name__}: {exc}"
+            else:
+                with self._lock:
+                    if name != "rag_retriever":  # records its own setup warning
+                        self._errors.pop(name, None)
+                    if name in REFERENCE_TABLES:
+                        self._tables[name] = len(loaded)
+            timings[name] = round((time.perf_counter() - started) * 1000.0, 3)
+        with self._lock:
+            self._warmed_at = datetime.now().isoformat(timespec="seconds")
+            self._warm_up_ms = timings
+        return self.health()
+
+    def warm_up_in_background(self) -> threading.Thread:
+        """Start `warm_up` on a daemon thread once; later calls return the same thread."""
+        with self._lock:
+            if self._warm_thread is None:
+                self._warm_thread = threading.Thread(target=self.warm_up, name="resources-warm-up", daemon=True)
+                self._warm_thread.start()
+            return self._warm_thread
+
+    def health(self) -> dict[str, Any]:
+        with self._lock:
+            rag = None
+            if self._rag is not None:
+                retriever, warning = self._rag
+                rag = {"enabled": retriever is not None, "warning": warning}
+            return {
+                "ok": not self._errors,
+                "warmed_at": self._warmed_at,
+                "warm_up_ms": dict(self._warm_up_ms),
+                "openai_client": self._openai_client is not None,
+                "rag": rag,
+                "analyzers": len(self._analyzers),
+                "tables": dict(self._tables),
+                "errors": dict(self._errors),
+            }
+
+
+_SHARED: SharedResources | None = None
+_SHARED_LOCK = threading.Lock()
+
+
+def get_shared_resources() -> SharedResources:
+    global _SHARED
+    if _SHARED is None:
+        with _SHARED_LOCK:
+            if _SHARED is None:
+                _SHARED = SharedResources()
+    return _SHARED
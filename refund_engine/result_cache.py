@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+import hashlib
+import json
+from pathlib import Path
+import time
+from typing import Any, Callable
+
+from refund_engine.analysis.openai_analyzer import (
+    ANALYSIS_PROMPT_CACHE_KEY,
+    ANALYSIS_PROMPT_VERSION,
+    InvoiceEvidence,
+    RowEvidence,
+    dataset_tax_type,
+)
+from refund_engine.constants import PROJECT_ROOT
+from refund_engine.results_ledger import SQLiteStore
+
+
+# Bump when the key material or the stored entry format changes.
+RESULT_CACHE_FORMAT = 2
+
+# Local files whose contents feed the analysis or its validation.
+KNOWLEDGE_BASE_FILES = (
+    PROJECT_ROOT / "config" / "vendor_profiles.json",
+    PROJECT_ROOT / "knowledge_base" / "states" / "washington" / "tax_rules.json",
+    PROJECT_ROOT / "knowledge_base" / "target_rcws.txt",
+)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS result_cache (
+        cache_key TEXT PRIMARY KEY,
+        created_at REAL NOT NULL,
+        expires_at REAL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        source_json TEXT NOT NULL,
+        metadata_json TEXT NOT NULL,
+        result_json TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS result_cache_by_expiry ON result_cache(expires_at)",
+)
+
+_FILE_DIGESTS: dict[Path, tuple[tuple[int, int], str]] = {}
+
+
+def _text(value: Any) -> str:
+    return " ".join(str(value or "").split()).casefold()
+
+
+def _amount(value: float | None, places: int = 2) -> float | None:
+    return None if value is None else round(float(value), places)
+
+
+def _invoice_key(invoice: InvoiceEvidence | None) -> dict[str, Any] | None:
+    # The directory differs between datasets; the file name and text do not.
+    if invoice is None:
+        return None
+    return {
+        "filename": _text(Path(invoice.filename or "").name),
+        "method": invoice.extraction_method,
+        "text_sha256": hashlib.sha256(_text(invoice.text_preview).encode("utf-8")).hexdigest(),
+    }
+
+
+def normalized_evidence(evidence: RowEvidence) -> dict[str, Any]:
+    """
+    Row evidence without its dataset position, with text and amounts normalized.
+
+    The dataset id itself is left out, but its tax type is kept: it decides
+    `Sales_Use_Tax`, so a sales and a use-tax row never share an entry.
+    """
+    return {
+        "tax_type": dataset_tax_type(evidence.dataset_id),
+        "vendor": _text(evidence.vendor),
+        "description": _text(evidence.description),
+        "tax_amount": _amount(evidence.tax_amount),
+        "tax_base": _amount(evidence.tax_base),
+        "invoice_number": _text(evidence.invoice_number),
+        "po_number": _text(evidence.po_number),
+        "invoice_1": _invoice_key(evidence.invoice_1),
+        "invoice_2": _invoice_key(evidence.invoice_2),
+        "rate": _amount(evidence.rate, 6),
+        "jurisdiction": _text(evidence.jurisdiction),
+    }
+
+
+def _file_digest(path: Path) -> str:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return "missing"
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _FILE_DIGESTS.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    _FILE_DIGESTS[path] = (stamp, digest)
+    return digest
+
+
+def knowledge_base_version(tag: str = "", files: tuple[Path, ...] = KNOWLEDGE_BASE_FILES) -> str:
+    """
+    Digest of the local knowledge-base files plus `tag`.
+
+    The Supabase corpus is not versioned locally; `tag` (KNOWLEDGE_BASE_VERSION)
+    is bumped by hand after re-ingesting it.
+    """
+    digest = hashlib.sha256(tag.encode("utf-8"))
+    for path in files:
+        digest.update(f"{path.name}:{_file_digest(path)}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def result_cache_key(
+    evidence: RowEvidence,
+    analyzer_signature: dict[str, Any],
+    *,
+    knowledge_base: str,
+) -> str:
+    material = {
+        "format": RESULT_CACHE_FORMAT,
+        "prompt": [ANALYSIS_PROMPT_VERSION, ANALYSIS_PROMPT_CACHE_KEY],
+        "analyzer": analyzer_signature,
+        "knowledge_base": knowledge_base,
+        "evidence": normalized_evidence(evidence),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _iso(timestamp: float | None) -> str | None:
+    return None if timestamp is None else datetime.fromtimestamp(timestamp).isoformat(timespec="seconds")
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    key: str
+    result: dict[str, Any]
+    metadata: dict[str, Any]
+    source: dict[str, Any]
+    created_at: float
+    expires_at: float | None
+
+    def hit_metadata(self) -> dict[str, Any]:
+        """What reviewers see on a reused row: where and when it was analyzed."""
+        return {
+            "hit": True,
+            "key": self.key,
+            "cached_at": _iso(self.created_at),
+            "expires_at": _iso(self.expires_at),
+            "source": self.source,
+            "model": self.metadata.get("model"),
+            "reasoning_effort": self.metadata.get("reasoning_effort"),
+        }
+
+
+class ResultCache(SQLiteStore):
+    """
+    Validated analysis results keyed by `result_cache_key`, shared across
+    runs and datasets. Lives in the results ledger's SQLite file.
+
+    Each entry carries its own expiry; `ttl_s=None` means entries do not
+    expire unless `put` is given a TTL.
+    """
+
+    SCHEMA = _SCHEMA
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        *,
+        ttl_s: float | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        super().__init__(path)
+        self.ttl_s = ttl_s
+        self.clock = clock
+
+    def get(self, key: str) -> CachedResult | None:
+        now = self.clock()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM result_cache WHERE cache_key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            # Misses stay read-only; only a hit takes the write lock, for one statement.
+            conn.execute("UPDATE result_cache SET hits = hits + 1 WHERE cache_key = ?", (key,))
+        return CachedResult(
+            key=key,
+            result=json.loads(row["result_json"]),
+            metadata=json.loads(row["metadata_json"]),
+            source=json.loads(row["source_json"]),
+            created_at=float(row["created_at"]),
+            expires_at=row["expires_at"],
+        )
+
+    def put(
+        self,
+        key: str,
+        result: dict[str, Any],
+        metadata: dict[str, Any],
+        *,
+        source: dict[str, Any],
+        ttl_s: float | None = None,
+    ):
+        ttl_s = self.ttl_s if ttl_s is None else ttl_s
+        now = self.clock()
+        with self._connect(write=True) as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO result_cache (
+                    cache_key, created_at, expires_at, hits, source_json, metadata_json, result_json
+                ) VALUES (?, ?, ?, 0, ?, ?, ?)
+                """,
+                (
+                    key,
+                    now,
+                    None if ttl_s is None else now + ttl_s,
+                    json.dumps(source, default=str),
+                    json.dumps(metadata, default=str),
+                    json.dumps(result, default=str),
+                ),
+            )
+
+    def purge_expired(self) -> int:
+        with self._connect(write=True) as conn:
+            cursor = conn.execute(
+                "DELETE FROM result_cache WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (self.clock(),),
+            )
+        return int(cursor.rowcount)
+
+    def stats(self) -> dict[str, Any]:
+        now = self.clock()
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT COUNT(*) AS entries,
+                       COALESCE(SUM(hits), 0) AS hits,
+                       COALESCE(SUM(expires_at IS NOT NULL AND expires_at <= ?), 0) AS expired
+                  FROM result_cache
+                """,
+                (now,),
+            ).fetchone()
+        return {
+            "path": str(self.path),
+            "entries": int(row["entries"]),
+            "expired": int(row["expired"]),
+            "hits": int(row["hits"]),
+        }
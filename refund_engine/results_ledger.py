@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import datetime
+import json
+from pathlib import Path
+import sqlite3
+from typing import Any, Iterator
+import uuid
+
+from refund_engine.constants import RESULTS_LEDGER_PATH
+
+
+# Statuses whose result is a real analysis; resume skips rows that have one.
+COMPLETED_STATUSES = ("rules", "cached", "ok", "retry_ok")
+# Rows a run's LedgerWriter buffers per transaction.
+LEDGER_COMMIT_ROWS = 50
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dataset_id TEXT NOT NULL,
+        row_index INTEGER NOT NULL,
+        run_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        final_decision TEXT,
+        estimated_refund REAL,
+        recorded_at TEXT NOT NULL,
+        result_json TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS results_by_row ON results(dataset_id, row_index, id)",
+    "CREATE INDEX IF NOT EXISTS results_by_run ON results(run_id)",
+)
+
+_INSERT = """
+    INSERT INTO results (
+        dataset_id, row_index, run_id, status, final_decision,
+        estimated_refund, recorded_at, result_json
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def new_run_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def _float_or_none(value: Any) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_values(
+    dataset_id: str,
+    run_id: str,
+    row_index: int,
+    status: str,
+    result: dict[str, Any],
+) -> tuple[Any, ...]:
+    return (
+        dataset_id,
+        int(row_index),
+        run_id,
+        status,
+        result.get("Final_Decision"),
+        _float_or_none(result.get("Estimated_Refund")),
+        datetime.now().isoformat(),
+        json.dumps(result, default=str),
+    )
+
+
+class SQLiteStore:
+    """A SQLite file in WAL mode whose `SCHEMA` is created on first use."""
+
+    SCHEMA: tuple[str, ...] = ()
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path or RESULTS_LEDGER_PATH)
+        self._initialized = False
+
+    def _open(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA busy_timeout = 30000")
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+                self._initialized = True
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @contextmanager
+    def _connect(self, *, write: bool = False) -> Iterator[sqlite3.Connection]:
+        conn = self._open()
+        try:
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if write:
+                conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+class ResultsLedger(SQLiteStore):
+    """
+    Append-only store of row results keyed by dataset, row index and run.
+
+    Every analysis result is recorded here; the output workbook is a view
+    that `export` materializes from the latest result of each row.
+    """
+
+    SCHEMA = _SCHEMA
+
+    def append(
+        self,
+        dataset_id: str,
+        run_id: str,
+        row_index: int,
+        status: str,
+        result: dict[str, Any],
+    ):
+        with self._connect(write=True) as conn:
+            conn.execute(_INSERT, _row_values(dataset_id, run_id, row_index, status, result))
+
+    def writer(self, *, commit_every: int = LEDGER_COMMIT_ROWS) -> LedgerWriter:
+        """A writer for one run's results; close it when the run ends."""
+        return LedgerWriter(self, commit_every=commit_every)
+
+    def latest_results(self, dataset_id: str) -> dict[int, dict[str, Any]]:
+        """Most recent result per row, ordered by row index."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT row_index, result_json FROM results
+                 WHERE id IN (
+                    SELECT MAX(id) FROM results WHERE dataset_id = ? GROUP BY row_index
+                 )
+                 ORDER BY row_index
+                """,
+                (dataset_id,),
+            ).fetchall()
+        return {int(row["row_index"]): json.loads(row["result_json"]) for row in rows}
+
+    def completed_rows(self, dataset_id: str) -> set[int]:
+        placeholders = ", ".join("?" for _ in COMPLETED_STATUSES)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT DISTINCT row_index FROM results WHERE dataset_id = ? AND status IN ({placeholders})",
+                (dataset_id, *COMPLETED_STATUSES),
+            ).fetchall()
+        return {int(row[0]) for row in rows}
+
+    def summary(self, dataset_id: str) -> dict[str, Any]:
+        with self._connect() as conn:
+            latest = conn.execute(
+                """
+                SELECT status, final_decision, estimated_refund FROM results
+                 WHERE id IN (
+                    SELECT MAX(id) FROM results WHERE dataset_id = ? GROUP BY row_index
+                 )
+                """,
+                (dataset_id,),
+            ).fetchall()
+            runs = conn.execute(
+                "SELECT COUNT(DISTINCT run_id) FROM results WHERE dataset_id = ?",
+                (dataset_id,),
+            ).fetchone()[0]
+
+        status_counts: dict[str, int] = {}
+        decision_counts: dict[str, int] = {}
+        for row in latest:
+            status_counts[row["status"]] = status_counts.get(row["status"], 0) + 1
+            decision = row["final_decision"] or ""
+            decision_counts[decision] = decision_counts.get(decision, 0) + 1
+        return {
+            "dataset_id": dataset_id,
+            "rows": len(latest),
+            "runs": int(runs),
+            "status_counts": status_counts,
+            "decision_counts": decision_counts,
+            "estimated_refund_total": round(
+                sum(row["estimated_refund"] or 0.0 for row in latest), 2
+            ),
+        }
+
+
+class LedgerWriter:
+    """
+    Appends one run's results over a single connection, committing every
+    `commit_every` rows and on `flush`/`close` instead of once per row.
+    """
+
+    def __init__(self, ledger: ResultsLedger, *, commit_every: int = LEDGER_COMMIT_ROWS):
+        self.commit_every = max(1, int(commit_every))
+        self._conn = ledger._open()
+        self._pending: list[tuple[Any, ...]] = []
+
+    def append(
+        self,
+        dataset_id: str,
+        run_id: str,
+        row_index: int,
+        status: str,
+        result: dict[str, Any],
+    ):
+        self._pending.append(_row_values(dataset_id, run_id, row_index, status, result))
+        if len(self._pending) >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(_INSERT, self._pending)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._pending.clear()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import re
+from typing import Any, Union
+
+import numpy as np
+import pandas as pd
+
+from refund_engine.column_types import amount_series, is_text_series, text_series
+
+
+# Row selection language, e.g.
+#   12,15,20-25
+#   vendor~"ORACLE" and tax_amount>=5000 and unanalyzed
+#   (0-99999 or decision="REVIEW") and not vendor="Acme"
+#
+# Numbers and ranges select rows by index label and are kept as intervals.
+# Predicates name a mapped field (vendor, tax_amount, description, ...),
+# resolved to a sheet column by the caller. `~` is a case-insensitive
+# substring match, `=`/`!=` compare text case-insensitively (or numbers when
+# the value is a number), and `<`, `<=`, `>`, `>=` compare amounts.
+# `unanalyzed`/`analyzed` test whether the analysis column is blank.
+
+COMPARISONS = ("~", "=", "!=", "<", "<=", ">", ">=")
+FLAGS = ("unanalyzed", "analyzed")
+
+
+@dataclass(frozen=True)
+class RowRanges:
+    # Sorted, non-overlapping inclusive (start, end) intervals.
+    intervals: tuple[tuple[int, int], ...]
+
+    @classmethod
+    def of(cls, intervals: list[tuple[int, int]]) -> RowRanges:
+        merged: list[list[int]] = []
+        for start, end in sorted((min(a, b), max(a, b)) for a, b in intervals):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return cls(tuple((start, end) for start, end in merged))
+
+    def positions(self, max_rows: int) -> list[int]:
+        """Every selected row below `max_rows`, in order."""
+        rows: list[int] = []
+        for start, end in self.intervals:
+            rows.extend(range(max(start, 0), min(end, max_rows - 1) + 1))
+        return rows
+
+
+@dataclass(frozen=True)
+class Predicate:
+    field: str
+    op: str
+    value: str | float
+
+
+@dataclass(frozen=True)
+class Flag:
+    name: str
+
+
+@dataclass(frozen=True)
+class Not:
+    operand: Selection
+
+
+@dataclass(frozen=True)
+class And:
+    operands: tuple[Selection, ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    operands: tuple[Selection, ...]
+
+
+Selection = Union[RowRanges, Predicate, Flag, Not, And, Or]
+
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<number>\d+(?:\.\d+)?)
+      | (?P<op>>=|<=|!=|=|>|<|~)
+      | (?P<punct>[(),-])
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""",
+    re.VERBOSE,
+)
+
+
+def _tokenize(text: str) -> list[tuple[str, str]]:
+    tokens: list[tuple[str, str]] = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"Unexpected character at position {pos}: {text[pos:pos + 10]!r}")
+        kind = match.lastgroup or ""
+        value = match.group(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        elif kind == "name":
+            value = value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, kind: str, value: str | None = None) -> str:
+        token = self.peek()
+        if token is None or token[0] != kind or (value is not None and token[1] != value):
+            found = "end of input" if token is None else repr(token[1])
+            raise ValueError(f"Expected {value or kind}, found {found}")
+        self.pos += 1
+        return token[1]
+
+    def accept(self, kind: str, value: str | None = None) -> bool:
+        token = self.peek()
+        if token is not None and token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self) -> Selection:
+        node = self.or_expr()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def or_expr(self) -> Selection:
+        operands = [self.and_expr()]
+        while self.accept("name", "or"):
+            operands.append(self.and_expr())
+        return operands[0] if len(operands) == 1 else Or(tuple(operands))
+
+    def and_expr(self) -> Selection:
+        operands = [self.not_expr()]
+        while self.accept("name", "and"):
+            operands.append(self.not_expr())
+        return operands[0] if len(operands) == 1 else And(tuple(operands))
+
+    def not_expr(self) -> Selection:
+        if self.accept("name", "not"):
+            return Not(self.not_expr())
+        return self.atom()
+
+    def atom(self) -> Selection:
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of input")
+        kind, value = token
+        if kind == "punct" and value == "(":
+            self.pos += 1
+            node = self.or_expr()
+            self.take("punct", ")")
+            return node
+        if kind == "number":
+            return self.ranges()
+        if kind == "name":
+            self.pos += 1
+            if value in FLAGS:
+                return Flag(value)
+            op = self.take("op")
+            return Predicate(value, op, self.literal(op))
+        raise ValueError(f"Unexpected {value!r}")
+
+    def ranges(self) -> RowRanges:
+        intervals = []
+        while True:
+            start = self.row_number()
+            end = self.row_number() if self.accept("punct", "-") else start
+            intervals.append((start, end))
+            if not self.accept("punct", ","):
+                return RowRanges.of(intervals)
+
+    def row_number(self) -> int:
+        text = self.take("number")
+        if "." in text:
+            raise ValueError(f"Row numbers must be whole numbers: {text}")
+        return int(text)
+
+    def literal(self, op: str) -> str | float:
+        token = self.peek()
+        if token is not None and token[0] == "string":
+            self.pos += 1
+            if op in ("<", "<=", ">", ">="):
+                raise ValueError(f"'{op}' needs a number, got {token[1]!r}")
+            return token[1]
+        negative = self.accept("punct", "-")
+        number = float(self.take("number"))
+        return -number if negative else number
+
+
+def parse_selection(text: str | None) -> Selection | None:
+    """Parse a row selection expression; None when `text` is blank."""
+    if not (text or "").strip():
+        return None
+    return _Parser(text or "").parse()
+
+
+def selection_fields(selection: Selection | None) -> set[str]:
+    """Field names an expression reads (`analysis_col` for the unanalyzed flags)."""
+    if selection is None or isinstance(selection, RowRanges):
+        return set()
+    if isinstance(selection, Predicate):
+        return {selection.field}
+    if isinstance(selection, Flag):
+        return {"analysis_col"}
+    if isinstance(selection, Not):
+        return selection_fields(selection.operand)
+    return set().union(*(selection_fields(operand) for operand in selection.operands))
+
+
+def default_fields(columns: dict[str, Any]) -> dict[str, str | None]:
+    """Field -> column map from a column mapping, plus `decision` for Final_Decision."""
+    fields = {name: value for name, value in columns.items() if value is None or isinstance(value, str)}
+    fields.setdefault("decision", "Final_Decision")
+    return fields
+
+
+class _Columns:
+    # Converts each referenced column once per evaluation.
+    def __init__(self, df: pd.DataFrame, fields: dict[str, str | None]):
+        self.df = df
+        self.fields = fields
+        self._text: dict[str, pd.Series] = {}
+        self._numeric: dict[str, np.ndarray] = {}
+
+    def column(self, field: str) -> str | None:
+        if field not in self.fields:
+            known = ", ".join(sorted(self.fields))
+            raise ValueError(f"Unknown field '{field}'. Known fields: {known}")
+        column = self.fields[field]
+        return column if column is not None and column in self.df.columns else None
+
+    def text(self, column: str) -> pd.Series:
+        if column not in self._text:
+            series = self.df[column]
+            text = series if is_text_series(series) else text_series(series)
+            self._text[column] = text.fillna("").str.casefold()
+        return self._text[column]
+
+    def numeric(self, column: str) -> np.ndarray:
+        if column not in self._numeric:
+            self._numeric[column] = amount_series(self.df[column]).to_numpy()
+        return self._numeric[column]
+
+
+def _evaluate(selection: Selection, columns: _Columns) -> np.ndarray:
+    df = columns.df
+    if isinstance(selection, RowRanges):
+        labels = df.index.to_numpy()
+        if not selection.intervals or len(labels) == 0:
+            return np.zeros(len(df), dtype=bool)
+        starts = np.array([start for start, _ in selection.intervals])
+        ends = np.array([end for _, end in selection.intervals])
+        slot = np.searchsorted(starts, labels, side="right") - 1
+        return (slot >= 0) & (labels <= ends[np.clip(slot, 0, None)])
+    if isinstance(selection, Flag):
+        column = columns.column("analysis_col")
+        if column is None:
+            blank = np.ones(len(df), dtype=bool)
+        else:
+            blank = (columns.text(column) == "").to_numpy(dtype=bool)
+        return blank if selection.name == "unanalyzed" else ~blank
+    if isinstance(selection, Predicate):
+        column = columns.column(selection.field)
+        if column is None:
+            return np.zeros(len(df), dtype=bool)
+        op, value = selection.op, selection.value
+        if isinstance(value, float) and op != "~":
+            numbers = columns.numeric(column)
+            with np.errstate(invalid="ignore"):
+                result = {
+                    "=": numbers == value,
+                    "!=": ~(numbers == value),
+                    "<": numbers < value,
+                    "<=": numbers <= value,
+                    ">": numbers > value,
+                    ">=": numbers >= value,
+                }[op]
+            return result
+        needle = (f"{value:g}" if isinstance(value, float) else value).strip().casefold()
+        text = columns.text(column)
+        if op == "~":
+            return text.str.contains(needle, regex=False).to_numpy(dtype=bool)
+        matches = (text == needle).to_numpy(dtype=bool)
+        return matches if op == "=" else ~matches
+    if isinstance(selection, Not):
+        return ~_evaluate(selection.operand, columns)
+    masks = [_evaluate(operand, columns) for operand in selection.operands]
+    combine = np.logical_and if isinstance(selection, And) else np.logical_or
+    return combine.reduce(masks)
+
+
+def selection_mask(
+    selection: Selection | None,
+    df: pd.DataFrame,
+    fields: dict[str, str | None],
+) -> pd.Series:
+    """
+    Boolean mask of the rows of `df` matching `selection` (all rows when None).
+
+    `fields` maps expression field names to `df` columns. A predicate on a
+    field whose column is unmapped or missing matches no rows; the
+    unanalyzed flag treats a missing analysis column as blank.
+    """
+    if selection is None:
+        return pd.Series(True, index=df.index)
+    return pd.Series(_evaluate(selection, _Columns(df, fields)), index=df.index)
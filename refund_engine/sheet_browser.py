@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from dataclasses import dataclass
+import math
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from refund_engine.row_selection import (
+    And,
+    Flag,
+    Predicate,
+    Selection,
+    parse_selection,
+    selection_fields,
+    selection_mask,
+)
+from refund_engine.workbook_repository import sheet_table_path
+
+
+@dataclass(frozen=True)
+class SheetFilter:
+    vendor_col: str | None = None
+    vendor_contains: str = ""
+    amount_col: str | None = None
+    min_amount: float | None = None
+    max_amount: float | None = None
+    # Rows whose value in this column is blank (not analyzed yet).
+    unanalyzed_col: str | None = None
+    decision_col: str | None = None
+    decision: str | None = None
+
+
+@dataclass(frozen=True)
+class SheetPage:
+    rows: pd.DataFrame
+    matched_rows: list[int]
+    total_rows: int
+    page: int
+    page_count: int
+
+
+def filter_selection(flt: SheetFilter) -> tuple[Selection | None, dict[str, str | None]]:
+    """The row selection expression equivalent to `flt`, with its field map."""
+    fields = {
+        "vendor": flt.vendor_col,
+        "tax_amount": flt.amount_col,
+        "analysis_col": flt.unanalyzed_col,
+        "decision": flt.decision_col,
+    }
+    clauses: list[Selection] = []
+    needle = flt.vendor_contains.strip()
+    if flt.vendor_col and needle:
+        clauses.append(Predicate("vendor", "~", needle))
+    if flt.amount_col and flt.min_amount is not None:
+        clauses.append(Predicate("tax_amount", ">=", float(flt.min_amount)))
+    if flt.amount_col and flt.max_amount is not None:
+        clauses.append(Predicate("tax_amount", "<=", float(flt.max_amount)))
+    if flt.unanalyzed_col:
+        clauses.append(Flag("unanalyzed"))
+    if flt.decision_col and flt.decision:
+        clauses.append(Predicate("decision", "=", flt.decision))
+    if not clauses:
+        return None, fields
+    return (clauses[0] if len(clauses) == 1 else And(tuple(clauses))), fields
+
+
+def filter_mask(df: pd.DataFrame, flt: SheetFilter) -> pd.Series:
+    """Boolean mask of rows matching `flt`; a filter on a missing column matches no rows."""
+    selection, fields = filter_selection(flt)
+    return selection_mask(selection, df, fields)
+
+
+def sheet_shape(
+    workbook_id: str,
+    version_id: str,
+    sheet_name: str,
+    *,
+    root: str | Path | None = None,
+) -> tuple[list[str], int]:
+    """Column names and row count, read from the parquet footer."""
+    parquet = pq.ParquetFile(sheet_table_path(workbook_id, version_id, sheet_name, root=root))
+    return list(parquet.schema_arrow.names), int(parquet.metadata.num_rows)
+
+
+def _matching_rows(path: Path, selection: Selection | None, fields: dict[str, str | None]) -> list[int]:
+    parquet = pq.ParquetFile(path)
+    available = set(parquet.schema_arrow.names)
+    columns = sorted({fields.get(field) for field in selection_fields(selection)} & available)
+    if not columns:
+        df = pd.DataFrame(index=pd.RangeIndex(parquet.metadata.num_rows))
+    else:
+        df = parquet.read(columns=columns).to_pandas()
+    return df.index[selection_mask(selection, df, fields)].tolist()
+
+
+def filtered_row_indices(
+    workbook_id: str,
+    version_id: str,
+    sheet_name: str,
+    flt: SheetFilter,
+    *,
+    root: str | Path | None = None,
+) -> list[int]:
+    """Row positions matching `flt`; only the filtered columns are read."""
+    selection, fields = filter_selection(flt)
+    return _matching_rows(sheet_table_path(workbook_id, version_id, sheet_name, root=root), selection, fields)
+
+
+def selected_row_indices(
+    workbook_id: str,
+    version_id: str,
+    sheet_name: str,
+    expression: str,
+    fields: dict[str, str | None],
+    *,
+    root: str | Path | None = None,
+) -> list[int]:
+    """Row positions matching a row selection expression over the mapped `fields`."""
+    selection = parse_selection(expression)
+    if selection is None:
+        return []
+    return _matching_rows(sheet_table_path(workbook_id, version_id, sheet_name, root=root), selection, fields)
+
+
+def read_rows(path: str | Path, row_indices: list[int]) -> pd.DataFrame:
+    """Rows at `row_indices` of a parquet sheet, decoding only the row groups that hold them."""
+    parquet = pq.ParquetFile(path)
+    starts = [0]
+    for group in range(parquet.metadata.num_row_groups):
+        starts.append(starts[-1] + parquet.metadata.row_group(group).num_rows)
+    groups = sorted({bisect_right(starts, idx) - 1 for idx in row_indices})
+    if not groups:
+        return parquet.schema_arrow.empty_table().to_pandas().rename_axis("row")
+    table = parquet.read_row_groups(groups)
+    offsets, position = {}, 0
+    for group in groups:
+        offsets[group] = position
+        position += starts[group + 1] - starts[group]
+    take = []
+    for idx in row_indices:
+        group = bisect_right(starts, idx) - 1
+        take.append(offsets[group] + idx - starts[group])
+    rows = table.take(pa.array(take, type=pa.int64())).to_pandas()
+    rows.index = pd.Index(row_indices, name="row")
+    return rows
+
+
+def sheet_page(
+    workbook_id: str,
+    version_id: str,
+    sheet_name: str,
+    flt: SheetFilter | None = None,
+    *,
+    page: int = 0,
+    page_size: int = 100,
+    root: str | Path | None = None,
+) -> SheetPage:
+    """
+    One page of the rows matching `flt`, indexed by row position.
+
+    Filtering reads only the filtered columns from the version's parquet
+    cache, and the page itself reads only the row groups it spans, so the
+    full sheet is never loaded or sent to the browser.
+    """
+    path = sheet_table_path(workbook_id, version_id, sheet_name, root=root)
+    matched = filtered_row_indices(workbook_id, version_id, sheet_name, flt or SheetFilter(), root=root)
+    page_size = max(1, int(page_size))
+    page_count = max(1, math.ceil(len(matched) / page_size))
+    page = min(max(0, int(page)), page_count - 1)
+    window = matched[page * page_size : (page + 1) * page_size]
+    return SheetPage(
+        rows=read_rows(path, window),
+        matched_rows=matched,
+        total_rows=int(pq.ParquetFile(path).metadata.num_rows),
+        page=page,
+        page_count=page_count,
+    )
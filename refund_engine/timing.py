@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import math
+from pathlib import Path
+import time
+from typing import Any, Iterator
+
+
+_ACTIVE_SPANS: ContextVar[dict[str, float] | None] = ContextVar("timing_spans", default=None)
+
+
+@contextmanager
+def record_spans() -> Iterator[dict[str, float]]:
+    """
+    Collect the spans timed inside the block as {stage: milliseconds}.
+
+    Repeated stages accumulate. A nested `record_spans` collects its own
+    spans without adding them to the outer recorder.
+    """
+    spans: dict[str, float] = {}
+    token = _ACTIVE_SPANS.set(spans)
+    try:
+        yield spans
+    finally:
+        _ACTIVE_SPANS.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a stage; a no-op unless a `record_spans` block is active."""
+    spans = _ACTIVE_SPANS.get()
+    if spans is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + (time.perf_counter() - start) * 1000.0
+
+
+def rounded(spans: dict[str, float]) -> dict[str, float]:
+    return {name: round(ms, 3) for name, ms in spans.items()}
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def subsystem(stage: str) -> str:
+    # "retry.openai.responses" is still OpenAI time.
+    parts = stage.split(".")
+    if parts[0] == "retry" and len(parts) > 1:
+        parts = parts[1:]
+    return parts[0]
+
+
+def profile_run_log(path: str | Path, *, top: int = 10) -> dict[str, Any]:
+    """Per-stage latency percentiles, subsystem time share and slowest rows of a run log."""
+    per_stage: dict[str, list[float]] = {}
+    rows: list[dict[str, Any]] = []
+    run_spans: dict[str, float] = {}
+
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get("type") == "summary":
+                run_spans = event.get("timings_ms") or {}
+                continue
+            if event.get("type") != "row":
+                continue
+            timings = event.get("timings_ms") or {}
+            for stage, ms in timings.items():
+                per_stage.setdefault(stage, []).append(float(ms))
+            rows.append(
+                {
+                    "row_index": event.get("row_index"),
+                    "vendor": event.get("vendor"),
+                    "status": event.get("status"),
+                    "duration_ms": float(event.get("duration_ms") or sum(timings.values())),
+                    "slowest_stage": max(timings, key=timings.get) if timings else None,
+                }
+            )
+    for stage, ms in run_spans.items():
+        per_stage.setdefault(stage, []).append(float(ms))
+
+    stage_totals = {stage: sum(values) for stage, values in per_stage.items()}
+    grand_total = sum(stage_totals.values()) or 1.0
+    stages = {}
+    for stage in sorted(per_stage, key=lambda name: stage_totals[name], reverse=True):
+        values = sorted(per_stage[stage])
+        stages[stage] = {
+            "count": len(values),
+            "total_ms": round(stage_totals[stage], 3),
+            "p50_ms": round(_percentile(values, 50), 3),
+            "p95_ms": round(_percentile(values, 95), 3),
+            "p99_ms": round(_percentile(values, 99), 3),
+            "share": round(stage_totals[stage] / grand_total, 4),
+        }
+
+    subsystems: dict[str, float] = {}
+    for stage, total in stage_totals.items():
+        name = subsystem(stage)
+        subsystems[name] = subsystems.get(name, 0.0) + total
+
+    return {
+        "run_log": str(path),
+        "rows": len(rows),
+        "stages": stages,
+        "subsystem_share": {
+            name: round(total / grand_total, 4)
+            for name, total in sorted(subsystems.items(), key=lambda item: item[1], reverse=True)
+        },
+        "slowest_rows": sorted(rows, key=lambda row: row["duration_ms"], reverse=True)[:top],
+    }
@@ -3,8 +3,11 @@ from __future__ import annotations
 from datetime import datetime
 from pathlib import Path
 import re
+import threading
 from typing import Any
 
+from fuzzywuzzy import fuzz
+
 from refund_engine.constants import (
     PROJECT_ROOT,
     REQUIRED_REASONING_HEADERS,
@@ -17,6 +20,7 @@ from refund_engine.constants import (
 
 
 _VALID_RCWS: set[str] = set()
+_RCWS_LOCK = threading.Lock()
 _TARGET_RCWS_PATH = PROJECT_ROOT / "knowledge_base" / "target_rcws.txt"
 _VALID_DECISIONS = {"REFUND", "NO REFUND", "REVIEW", "PASS"}
 _WAC_PATTERN = re.compile(
@@ -71,13 +75,17 @@ def normalize_final_decision(value: Any) -> str:
 def load_valid_rcws() -> set[str]:
     if _VALID_RCWS:
         return _VALID_RCWS
-    if not _TARGET_RCWS_PATH.exists():
-        return _VALID_RCWS
-    with open(_TARGET_RCWS_PATH, "r") as f:
-        for line in f:
-            stripped = line.strip()
-            if stripped and not stripped.startswith("#"):
-                _VALID_RCWS.add(stripped)
+    with _RCWS_LOCK:
+        if _VALID_RCWS or not _TARGET_RCWS_PATH.exists():
+            return _VALID_RCWS
+        loaded: set[str] = set()
+        with open(_TARGET_RCWS_PATH, "r") as f:
+            for line in f:
+                stripped = line.strip()
+                if stripped and not stripped.startswith("#"):
+                    loaded.add(stripped)
+        # Publish in one step so concurrent readers never see a partial set.
+        _VALID_RCWS.update(loaded)
     return _VALID_RCWS
 
 
@@ -230,3 +238,158 @@ def validate_output_row(row: dict[str, Any]) -> list[str]:
         errors.append("Explanation is required for REFUND/NO REFUND decisions")
 
     return errors
+
+
+# --- Local auto-repair -------------------------------------------------------
+
+_FUZZY_MIN_SCORE = 88
+_FUZZY_MIN_MARGIN = 5
+
+_VOCABULARIES: dict[str, frozenset[str]] = {
+    "Product_Type": VALID_PRODUCT_TYPES,
+    "Refund_Basis": VALID_REFUND_BASES,
+    "Tax_Category": VALID_TAX_CATEGORIES,
+    "Methodology": VALID_METHODOLOGIES,
+    "Sales_Use_Tax": VALID_SALES_USE_TAX,
+}
+
+# AI_Reasoning lines that echo a repaired field.
+_REASONING_LABELS = {
+    "Product_Type": "- Product Type: ",
+    "Tax_Category": "- Tax Category: ",
+    "Refund_Basis": "- Exemption Basis: ",
+    "Methodology": "- Methodology: ",
+    "Sales_Use_Tax": "- Tax Type: ",
+    "Citation": "- Citation: ",
+}
+
+
+def _vocabulary_key(value: str, field: str) -> str:
+    text = value.lower()
+    text = re.sub(r"\bout[\s-]+of[\s-]+state\b", "oos", text)
+    text = re.sub(r"[\\/,._()-]+", " ", text)
+    if field == "Sales_Use_Tax":
+        text = re.sub(r"\btax\b", " ", text)
+    return " ".join(text.split())
+
+
+def _snap_to_vocabulary(value: str, field: str) -> tuple[str, str] | None:
+    """Closest controlled value for `value` and the rule used, or None when unsure."""
+    vocabulary = _VOCABULARIES[field]
+    key = _vocabulary_key(value, field)
+    if not key:
+        return None
+    keyed: dict[str, str] = {}
+    for candidate in sorted(vocabulary):
+        keyed.setdefault(_vocabulary_key(candidate, field), candidate)
+    if key in keyed:
+        return keyed[key], "normalized"
+
+    scored = sorted(
+        ((fuzz.token_sort_ratio(key, candidate_key), candidate) for candidate_key, candidate in keyed.items()),
+        reverse=True,
+    )
+    best_score, best = scored[0]
+    runner_up = scored[1][0] if len(scored) > 1 else 0
+    if best_score >= _FUZZY_MIN_SCORE and best_score - runner_up >= _FUZZY_MIN_MARGIN:
+        return best, "fuzzy"
+    return None
+
+
+def _canonical_citation_part(part: str) -> str:
+    text = part.strip()
+    match = re.match(r"^(RCW|WAC)\s*(.*)$", text, flags=re.IGNORECASE)
+    if match:
+        prefix, number = match.group(1).upper(), match.group(2)
+    elif re.match(r"^458\s*-", text):
+        prefix, number = "WAC", text
+    elif re.match(r"^\d+[A-Z]?\s*\.", text):
+        prefix, number = "RCW", text
+    else:
+        return text
+    number = re.sub(r"\s+", "", number)
+    number = re.sub(r"\(([a-z0-9]+)\)", lambda m: f"({m.group(1).lower()})", number, flags=re.IGNORECASE)
+    return f"{prefix} {number}"
+
+
+def canonicalize_citation(citation: str) -> str:
+    """Fix spacing, prefixes and separators of a citation list; unchanged when that does not make it valid."""
+    parts = [part for part in re.split(r"[/,;]", citation) if part.strip()]
+    canonical = ", ".join(_canonical_citation_part(part) for part in parts)
+    if canonical and canonical != citation and is_valid_citation(canonical):
+        return canonical
+    return citation
+
+
+def _clamp_confidence(value: Any) -> float | None:
+    """Return the repaired confidence, or None when it needs no repair."""
+    text = str(value).strip()
+    percent = text.endswith("%")
+    try:
+        number = float(text.rstrip("%").strip())
+    except ValueError:
+        return None
+    # "85" or "85%" is a percentage; 1.2 is just out of range.
+    if percent or 2.0 <= number <= 100.0:
+        return round(min(1.0, max(0.0, number / 100.0)), 4)
+    if 0.0 <= number <= 1.0:
+        return None
+    return min(1.0, max(0.0, number))
+
+
+def auto_repair_output_row(row: dict[str, Any]) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """
+    Deterministically fix vocabulary drift, citation formatting and
+    out-of-range confidence before validation.
+
+    Returns the repaired row and one {field, from, to, rule} entry per
+    change. Values that cannot be mapped confidently are left for
+    validation to reject.
+    """
+    repaired = dict(row)
+    repairs: list[dict[str, Any]] = []
+
+    def record(field: str, old: Any, new: Any, rule: str):
+        repaired[field] = new
+        repairs.append({"field": field, "from": old, "to": new, "rule": rule})
+
+    decision = normalize_final_decision(row.get("Final_Decision"))
+    if decision and decision != row.get("Final_Decision"):
+        record("Final_Decision", row.get("Final_Decision"), decision, "normalized")
+
+    for field, vocabulary in _VOCABULARIES.items():
+        value = str(row.get(field) or "").strip()
+        if not value or value in vocabulary:
+            continue
+        if field == "Methodology" and normalize_methodology(value) in vocabulary:
+            record(field, row.get(field), normalize_methodology(value), "alias")
+            continue
+        snapped = _snap_to_vocabulary(value, field)
+        if snapped:
+            record(field, row.get(field), snapped[0], snapped[1])
+
+    citation = str(row.get("Citation") or "").strip()
+    if citation and not is_valid_citation(citation):
+        canonical = canonicalize_citation(citation)
+        if canonical != citation:
+            record("Citation", row.get("Citation"), canonical, "citation")
+
+    confidence = row.get("Confidence")
+    if confidence not in (None, ""):
+        clamped = _clamp_confidence(confidence)
+        if clamped is not None:
+            record("Confidence", confidence, clamped, "clamped")
+
+    if repairs and repaired.get("AI_Reasoning"):
+        reasoning = str(repaired["AI_Reasoning"])
+        for repair in repairs:
+            label = _REASONING_LABELS.get(repair["field"])
+            if label:
+                reasoning = reasoning.replace(f"{label}{repair['from']}\n", f"{label}{repair['to']}\n", 1)
+        if decision:
+            reasoning = re.sub(r"^DECISION: .*$", f"DECISION: {decision}", reasoning, count=1, flags=re.MULTILINE)
+        repaired["AI_Reasoning"] = reasoning
+        if repaired.get("Final_Decision") == "REVIEW" or decision == "REVIEW":
+            repaired["Needs_Review"] = "Yes"
+
+    return repaired, repairs
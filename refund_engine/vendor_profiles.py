@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import threading
 from typing import Any
 
 from fuzzywuzzy import fuzz
@@ -10,19 +11,23 @@ from refund_engine.constants import PROJECT_ROOT
 _PROFILES_PATH = PROJECT_ROOT / "config" / "vendor_profiles.json"
 _CACHE: dict[str, Any] | None = None
 _VENDOR_NAMES: list[str] = []
+_LOAD_LOCK = threading.Lock()
 
 
 def _load() -> dict[str, Any]:
     global _CACHE, _VENDOR_NAMES
     if _CACHE is not None:
         return _CACHE
-    if not _PROFILES_PATH.exists():
-        _CACHE = {}
-        return _CACHE
-    with open(_PROFILES_PATH) as f:
-        data = json.load(f)
-    _CACHE = data.get("vendors", {})
-    _VENDOR_NAMES = list(_CACHE.keys())
+    with _LOAD_LOCK:
+        if _CACHE is not None:
+            return _CACHE
+        vendors: dict[str, Any] = {}
+        if _PROFILES_PATH.exists():
+            with open(_PROFILES_PATH) as f:
+                vendors = json.load(f).get("vendors", {})
+        # Names first: readers check _CACHE and then iterate _VENDOR_NAMES.
+        _VENDOR_NAMES = list(vendors.keys())
+        _CACHE = vendors
     return _CACHE
 
 
@@ -47,7 +52,7 @@ def _fmt(label: str, value: str, count: int | None = None) -> str:
     return f"  {label}: {value}"
 
 
-def _confidence_label(total_rows: int) -> str:
+def confidence_label(total_rows: int) -> str:
     if total_rows >= 30:
         return "HIGH"
     if total_rows >= 10:
@@ -55,6 +60,15 @@ def _confidence_label(total_rows: int) -> str:
     return "LOW"
 
 
+def match_vendor_profile(vendor_name: str) -> tuple[str, dict[str, Any]] | None:
+    """Return (profile vendor name, raw profile) for the given vendor, or None."""
+    vendors = _load()
+    matched = _match_vendor(vendor_name)
+    if matched is None:
+        return None
+    return matched, vendors[matched]
+
+
 def load_vendor_profile(vendor_name: str) -> str | None:
     """Return a formatted text block for the given vendor, or None."""
     vendors = _load()
@@ -62,7 +76,7 @@ def load_vendor_profile(vendor_name: str) -> str | None:
     if matched is None:
         return None
     p = vendors[matched]
-    confidence = _confidence_label(p["total_rows"])
+    confidence = confidence_label(p["total_rows"])
     lines = [
         f"VENDOR PROFILE ({p['total_rows']} historical rows, {confidence} confidence):",
         f"  Vendor: {matched}",
@@ -1,20 +1,28 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Callable, Iterable
 from pathlib import Path
 
 import pandas as pd
 
 from refund_engine.analysis.openai_analyzer import (
     InvoiceEvidence,
-    OpenAIAnalyzer,
+    RowAnalyzer,
     RowEvidence,
 )
+from refund_engine.config import get_result_cache_settings
 from refund_engine.constants import AI_OUTPUT_COLUMNS
 from refund_engine.datasets import coerce_float
 from refund_engine.invoice_text import extract_invoice_text
-from refund_engine.validation_rules import ensure_process_token, validate_output_row
+from refund_engine.resources import get_shared_resources
+from refund_engine.result_cache import ResultCache, knowledge_base_version, result_cache_key
+from refund_engine.row_selection import RowRanges, parse_selection
+from refund_engine.validation_rules import (
+    auto_repair_output_row,
+    ensure_process_token,
+    validate_output_row,
+)
 
 
 @dataclass(frozen=True)
@@ -39,28 +47,13 @@ def _safe_str(value: Any) -> str:
 
 
 def parse_row_selection(text: str, max_rows: int) -> list[int]:
-    text = (text or "").strip()
-    if not text:
+    """Row positions listed as `1,3-5,9`, below `max_rows`. Predicates need `row_selection.selection_mask`."""
+    selection = parse_selection(text)
+    if selection is None:
         return []
-
-    indices: set[int] = set()
-    parts = [part.strip() for part in text.split(",") if part.strip()]
-    for part in parts:
-        if "-" in part:
-            start_text, end_text = part.split("-", 1)
-            start = int(start_text.strip())
-            end = int(end_text.strip())
-            if start > end:
-                start, end = end, start
-            for idx in range(start, end + 1):
-                if 0 <= idx < max_rows:
-                    indices.add(idx)
-        else:
-            idx = int(part)
-            if 0 <= idx < max_rows:
-                indices.add(idx)
-
-    return sorted(indices)
+    if not isinstance(selection, RowRanges):
+        raise ValueError("Only row numbers and ranges are allowed here")
+    return selection.positions(max_rows)
 
 
 def suggest_column_mapping(columns: list[str]) -> dict[str, str | None]:
@@ -153,6 +146,17 @@ def _fallback_review_row(row: pd.Series, mapping: ColumnMapping, reason: str) ->
     }
 
 
+def row_delta(result: dict[str, Any], mapping: ColumnMapping, columns: Iterable[str]) -> dict[str, Any]:
+    """
+    Cells an analysis result writes into its row: the AI output columns, plus
+    the analysis column when the sheet (`columns`) already has one.
+    """
+    delta = {col: result.get(col) for col in AI_OUTPUT_COLUMNS}
+    if mapping.analysis_col in columns:
+        delta[mapping.analysis_col] = result.get("AI_Reasoning")
+    return delta
+
+
 def analyze_rows_dataframe(
     df: pd.DataFrame,
     *,
@@ -163,27 +167,51 @@ def analyze_rows_dataframe(
     reasoning_effort: str | None = None,
     verbosity: str | None = None,
     max_invoice_pages: int = 4,
-) -> tuple[pd.DataFrame, list[dict[str, Any]]]:
-    out_df = df.copy()
-    analyzer = OpenAIAnalyzer(
-        model=model,
-        reasoning_effort=reasoning_effort,
-        verbosity=verbosity,
-    )
+    use_cache: bool = True,
+    cache_path: str | Path | None = None,
+    analyzer: RowAnalyzer | None = None,
+    on_row: Callable[[dict[str, Any], dict[str, Any] | None], None] | None = None,
+    should_cancel: Callable[[], bool] | None = None,
+) -> tuple[dict[int, dict[str, Any]], list[dict[str, Any]]]:
+    """
+    Analyze `row_indices` of `df` and return per-row cell deltas plus one event per row.
+
+    `df` is only read; the deltas (`row_delta` of each result, keyed by row
+    index) are merged into the sheet when it is saved, see
+    `workbook_repository.write_sheet_updates_as_new_version`.
+
+    Without an explicit `analyzer`, the process-wide shared analyzer for the
+    model settings is used. `on_row(event, result)` is called as each row
+    finishes (`result` is None for skipped rows); `should_cancel()` is checked
+    before each row and stops the loop early, leaving the rows done so far in
+    the returned deltas.
+    """
+    if analyzer is None:
+        analyzer = get_shared_resources().analyzer(
+            model=model,
+            reasoning_effort=reasoning_effort,
+            verbosity=verbosity,
+        )
+    result_cache = None
+    cache_settings = get_result_cache_settings()
+    if use_cache and cache_settings.enabled:
+        result_cache = ResultCache(cache_path, ttl_s=cache_settings.ttl_s)
+        analyzer_signature = analyzer.cache_signature()
+        kb_version = knowledge_base_version(cache_settings.knowledge_base_tag)
+    deltas: dict[int, dict[str, Any]] = {}
     events: list[dict[str, Any]] = []
 
-    for col in AI_OUTPUT_COLUMNS:
-        if col not in out_df.columns:
-            out_df[col] = None
-
     for idx in row_indices:
-        if idx not in out_df.index:
-            events.append(
-                {"row_index": idx, "status": "skipped", "reason": "row not in dataframe"}
-            )
+        if should_cancel is not None and should_cancel():
+            break
+        if idx not in df.index:
+            event = {"row_index": idx, "status": "skipped", "reason": "row not in dataframe"}
+            events.append(event)
+            if on_row is not None:
+                on_row(event, None)
             continue
 
-        row = out_df.loc[idx]
+        row = df.loc[idx]
         vendor = _safe_str(row.get(mapping.vendor))
         description = _safe_str(row.get(mapping.description))
         invoice_1_name = _safe_str(row.get(mapping.invoice_1))
@@ -204,52 +232,71 @@ def analyze_rows_dataframe(
 
         status = "ok"
         validation_errors: list[str] = []
+        auto_repairs: list[dict[str, Any]] = []
         metadata: dict[str, Any] = {}
 
-        try:
-            result, metadata = analyzer.analyze_row(evidence)
-            validation_errors = validate_output_row(result)
-            if validation_errors:
-                guidance = (
-                    "Previous output failed validation. Return corrected JSON only. "
-                    f"Issues: {validation_errors}"
-                )
-                result, metadata = analyzer.analyze_row(evidence, guidance=guidance)
+        cache_key = None
+        cached = None
+        if result_cache is not None:
+            cache_key = result_cache_key(evidence, analyzer_signature, knowledge_base=kb_version)
+            cached = result_cache.get(cache_key)
+            if cached is not None and validate_output_row(cached.result):
+                cached = None
+
+        if cached is not None:
+            status = "cached"
+            result = cached.result
+            metadata = {"result_cache": cached.hit_metadata()}
+        else:
+            try:
+                result, metadata = analyzer.analyze_row(evidence)
+                result, auto_repairs = auto_repair_output_row(result)
                 validation_errors = validate_output_row(result)
                 if validation_errors:
-                    status = "fallback_review"
-                    result = _fallback_review_row(
-                        row,
-                        mapping,
-                        f"Validation failed after retry: {validation_errors}",
-                    )
-                else:
-                    status = "retry_ok"
-        except Exception as exc:
-            status = "error_review"
-            validation_errors = [str(exc)]
-            result = _fallback_review_row(row, mapping, f"Analysis error: {exc}")
-
-        for key, value in result.items():
-            if key in out_df.columns:
-                out_df.at[idx, key] = value
-
-        if mapping.analysis_col in out_df.columns:
-            out_df.at[idx, mapping.analysis_col] = result.get("AI_Reasoning")
-
-        events.append(
-            {
-                "row_index": int(idx),
-                "status": status,
-                "vendor": vendor,
-                "final_decision": result.get("Final_Decision"),
-                "confidence": result.get("Confidence"),
-                "citation": result.get("Citation"),
-                "invoice_1_method": evidence.invoice_1.extraction_method if evidence.invoice_1 else "none",
-                "invoice_2_method": evidence.invoice_2.extraction_method if evidence.invoice_2 else "none",
-                "validation_errors": validation_errors,
-                "metadata": metadata,
-            }
-        )
-
-    return out_df, events
+                    result, metadata = analyzer.repair_row(evidence, metadata, validation_errors)
+                    result, repairs = auto_repair_output_row(result)
+                    auto_repairs.extend(repairs)
+                    validation_errors = validate_output_row(result)
+                    if validation_errors:
+                        status = "fallback_review"
+                        result = _fallback_review_row(
+                            row,
+                            mapping,
+                            f"Validation failed after retry: {validation_errors}",
+                        )
+                    else:
+                        status = "retry_ok"
+            except Exception as exc:
+                status = "error_review"
+                validation_errors = [str(exc)]
+                result = _fallback_review_row(row, mapping, f"Analysis error: {exc}")
+
+            if result_cache is not None and cache_key is not None and status in ("ok", "retry_ok"):
+                result_cache.put(
+                    cache_key,
+                    result,
+                    metadata,
+                    source={"dataset_id": evidence.dataset_id, "row_index": int(idx)},
+                )
+                metadata = {**metadata, "result_cache": {"hit": False, "key": cache_key}}
+
+        deltas[int(idx)] = row_delta(result, mapping, df.columns)
+
+        event = {
+            "row_index": int(idx),
+            "status": status,
+            "vendor": vendor,
+            "final_decision": result.get("Final_Decision"),
+            "confidence": result.get("Confidence"),
+            "citation": result.get("Citation"),
+            "invoice_1_method": evidence.invoice_1.extraction_method if evidence.invoice_1 else "none",
+            "invoice_2_method": evidence.invoice_2.extraction_method if evidence.invoice_2 else "none",
+            "validation_errors": validation_errors,
+            "auto_repairs": auto_repairs,
+            "metadata": metadata,
+        }
+        events.append(event)
+        if on_row is not None:
+            on_row(event, result)
+
+    return deltas, events
@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Any, Iterator
+
+import yaml
+
+
+CATALOG_FILENAME = "catalog.sqlite3"
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workbooks (
+    workbook_id TEXT PRIMARY KEY,
+    display_name TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    workbook_id TEXT NOT NULL REFERENCES workbooks(workbook_id) ON DELETE CASCADE,
+    version_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    stored_path TEXT,
+    blob TEXT,
+    parent_version_id TEXT,
+    delta_blob TEXT,
+    created_at TEXT NOT NULL,
+    diff_summary_path TEXT,
+    diff_status TEXT NOT NULL DEFAULT 'none',
+    PRIMARY KEY (workbook_id, version_id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS versions_by_seq ON versions(workbook_id, seq);
+CREATE INDEX IF NOT EXISTS versions_by_blob ON versions(blob);
+CREATE INDEX IF NOT EXISTS versions_by_delta_blob ON versions(delta_blob);
+CREATE TABLE IF NOT EXISTS sheets (
+    workbook_id TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    sheet_name TEXT NOT NULL,
+    PRIMARY KEY (workbook_id, version_id, position),
+    FOREIGN KEY (workbook_id, version_id)
+        REFERENCES versions(workbook_id, version_id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS invoice_uploads (
+    filename TEXT PRIMARY KEY,
+    size_bytes INTEGER NOT NULL,
+    uploaded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS invoice_uploads_by_time ON invoice_uploads(uploaded_at);
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    job_id TEXT PRIMARY KEY,
+    workbook_id TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_rows INTEGER NOT NULL,
+    done_rows INTEGER NOT NULL DEFAULT 0,
+    params_json TEXT NOT NULL,
+    error TEXT,
+    worker_pid INTEGER,
+    runner_token TEXT,
+    heartbeat_at REAL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS analysis_jobs_by_sheet
+    ON analysis_jobs(workbook_id, version_id, sheet_name, created_at);
+CREATE TABLE IF NOT EXISTS analysis_job_events (
+    job_id TEXT NOT NULL REFERENCES analysis_jobs(job_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    row_index INTEGER,
+    event_json TEXT NOT NULL,
+    result_json TEXT,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+# Columns added after their table first shipped: (table, column, type).
+_ADDED_COLUMNS = (
+    ("analysis_jobs", "runner_token", "TEXT"),
+    ("analysis_jobs", "heartbeat_at", "REAL"),
+)
+
+_VERSION_FIELDS = (
+    "version_id",
+    "filename",
+    "stored_path",
+    "blob",
+    "parent_version_id",
+    "delta_blob",
+    "created_at",
+    "diff_summary_path",
+    "diff_status",
+)
+
+_INIT_LOCK = threading.Lock()
+_INITIALIZED: set[str] = set()
+
+
+def catalog_path(root: Path) -> Path:
+    return root / CATALOG_FILENAME
+
+
+def _open(root: Path) -> sqlite3.Connection:
+    root.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(catalog_path(root), timeout=30.0, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def _initialize(root: Path):
+    key = str(catalog_path(root).resolve())
+    with _INIT_LOCK:
+        if key in _INITIALIZED and catalog_path(root).exists():
+            return
+        conn = _open(root)
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for statement in _SCHEMA.strip().split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            for table, column, kind in _ADDED_COLUMNS:
+                existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+            fresh = current == 0
+            if fresh:
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        _INITIALIZED.add(key)
+    if fresh:
+        import_yaml_metadata(root)
+
+
+@contextmanager
+def connect(root: Path, *, write: bool = False) -> Iterator[sqlite3.Connection]:
+    """
+    Open the catalog. Writers take the database lock up front (BEGIN IMMEDIATE)
+    so concurrent webapp sessions and CLI jobs serialize cleanly.
+    """
+    _initialize(root)
+    conn = _open(root)
+    try:
+        if write:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        if write:
+            conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _version_dict(row: sqlite3.Row, sheet_names: list[str]) -> dict[str, Any]:
+    entry = {field: row[field] for field in _VERSION_FIELDS}
+    entry["sheet_names"] = sheet_names
+    return entry
+
+
+def load_workbook(conn: sqlite3.Connection, workbook_id: str) -> dict[str, Any] | None:
+    row = conn.execute(
+        "SELECT workbook_id, display_name, created_at FROM workbooks WHERE workbook_id = ?",
+        (workbook_id,),
+    ).fetchone()
+    if row is None:
+        return None
+
+    sheets: dict[str, list[str]] = {}
+    for sheet in conn.execute(
+        "SELECT version_id, sheet_name FROM sheets WHERE workbook_id = ? ORDER BY version_id, position",
+        (workbook_id,),
+    ):
+        sheets.setdefault(sheet["version_id"], []).append(sheet["sheet_name"])
+
+    versions = [
+        _version_dict(version, sheets.get(version["version_id"], []))
+        for version in conn.execute(
+            f"SELECT {', '.join(_VERSION_FIELDS)} FROM versions WHERE workbook_id = ? ORDER BY seq",
+            (workbook_id,),
+        )
+    ]
+    return {
+        "workbook_id": row["workbook_id"],
+        "display_name": row["display_name"],
+        "created_at": row["created_at"],
+        "versions": versions,
+    }
+
+
+def list_workbooks(conn: sqlite3.Connection) -> list[dict[str, Any]]:
+    rows = conn.execute(
+        """
+        SELECT w.workbook_id, w.display_name, w.created_at,
+               COUNT(v.version_id) AS version_count,
+               (SELECT version_id FROM versions
+                 WHERE workbook_id = w.workbook_id ORDER BY seq DESC LIMIT 1) AS latest_version_id
+          FROM workbooks w
+          LEFT JOIN versions v ON v.workbook_id = w.workbook_id
+         GROUP BY w.workbook_id
+         ORDER BY w.workbook_id
+        """
+    )
+    return [
+        {
+            "workbook_id": row["workbook_id"],
+            "display_name": row["display_name"],
+            "version_count": int(row["version_count"]),
+            "latest_version_id": row["latest_version_id"],
+            "created_at": row["created_at"],
+        }
+        for row in rows
+    ]
+
+
+def latest_version(conn: sqlite3.Connection, workbook_id: str) -> dict[str, Any] | None:
+    row = conn.execute(
+        f"SELECT {', '.join(_VERSION_FIELDS)} FROM versions WHERE workbook_id = ? ORDER BY seq DESC LIMIT 1",
+        (workbook_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    sheets = [
+        r["sheet_name"]
+        for r in conn.execute(
+            "SELECT sheet_name FROM sheets WHERE workbook_id = ? AND version_id = ? ORDER BY position",
+            (workbook_id, row["version_id"]),
+        )
+    ]
+    return _version_dict(row, sheets)
+
+
+def upsert_workbook(conn: sqlite3.Connection, workbook_id: str, display_name: str, created_at: str | None = None):
+    conn.execute(
+        """
+        INSERT INTO workbooks (workbook_id, display_name, created_at) VALUES (?, ?, ?)
+        ON CONFLICT(workbook_id) DO UPDATE SET display_name = excluded.display_name
+        """,
+        (workbook_id, display_name, created_at or datetime.now().isoformat()),
+    )
+
+
+def insert_version(conn: sqlite3.Connection, workbook_id: str, entry: dict[str, Any]):
+    seq = conn.execute(
+        "SELECT COALESCE(MAX(seq), 0) + 1 FROM versions WHERE workbook_id = ?",
+        (workbook_id,),
+    ).fetchone()[0]
+    values = {field: entry.get(field) for field in _VERSION_FIELDS}
+    values["diff_status"] = entry.get("diff_status") or (
+        "ready" if entry.get("diff_summary_path") else "none"
+    )
+    conn.execute(
+        f"""
+        INSERT INTO versions (workbook_id, seq, {', '.join(_VERSION_FIELDS)})
+        VALUES (?, ?, {', '.join('?' for _ in _VERSION_FIELDS)})
+        """,
+        (workbook_id, seq, *[values[field] for field in _VERSION_FIELDS]),
+    )
+    conn.executemany(
+        "INSERT INTO sheets (workbook_id, version_id, position, sheet_name) VALUES (?, ?, ?, ?)",
+        [
+            (workbook_id, entry["version_id"], position, name)
+            for position, name in enumerate(entry.get("sheet_names") or [])
+        ],
+    )
+
+
+def update_version(conn: sqlite3.Connection, workbook_id: str, entry: dict[str, Any]):
+    fields = [field for field in _VERSION_FIELDS if field != "version_id"]
+    conn.execute(
+        f"UPDATE versions SET {', '.join(f'{field} = ?' for field in fields)} "
+        "WHERE workbook_id = ? AND version_id = ?",
+        (*[entry.get(field) for field in fields], workbook_id, entry["version_id"]),
+    )
+
+
+def delete_versions(conn: sqlite3.Connection, workbook_id: str, version_ids: list[str]):
+    conn.executemany(
+        "DELETE FROM versions WHERE workbook_id = ? AND version_id = ?",
+        [(workbook_id, version_id) for version_id in version_ids],
+    )
+
+
+def referenced_blobs(conn: sqlite3.Connection) -> set[str]:
+    out: set[str] = set()
+    for row in conn.execute(
+        "SELECT blob FROM versions WHERE blob IS NOT NULL "
+        "UNION SELECT delta_blob FROM versions WHERE delta_blob IS NOT NULL"
+    ):
+        out.add(row[0])
+    return out
+
+
+def record_invoice_upload(conn: sqlite3.Connection, filename: str, size_bytes: int, uploaded_at: str | None = None):
+    conn.execute(
+        """
+        INSERT INTO invoice_uploads (filename, size_bytes, uploaded_at) VALUES (?, ?, ?)
+        ON CONFLICT(filename) DO UPDATE SET
+            size_bytes = excluded.size_bytes,
+            uploaded_at = excluded.uploaded_at
+        """,
+        (filename, int(size_bytes), uploaded_at or datetime.now().isoformat()),
+    )
+
+
+def invoice_upload_names(conn: sqlite3.Connection) -> set[str]:
+    return {row[0] for row in conn.execute("SELECT filename FROM invoice_uploads")}
+
+
+def sync_invoice_uploads(conn: sqlite3.Connection, invoices_dir: Path) -> tuple[int, int]:
+    """
+    Record files in `invoices_dir` the catalog does not know yet and forget
+    rows whose file is gone. Returns (added, removed).
+    """
+    present = {path.name: path for path in invoices_dir.iterdir() if path.is_file()} if invoices_dir.exists() else {}
+    known = invoice_upload_names(conn)
+    added = sorted(present.keys() - known)
+    for name in added:
+        stat = present[name].stat()
+        record_invoice_upload(conn, name, stat.st_size, datetime.fromtimestamp(stat.st_mtime).isoformat())
+    removed = sorted(known - present.keys())
+    conn.executemany("DELETE FROM invoice_uploads WHERE filename = ?", [(name,) for name in removed])
+    return len(added), len(removed)
+
+
+def list_invoice_uploads(conn: sqlite3.Connection, limit: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "filename": row["filename"],
+            "size_bytes": int(row["size_bytes"]),
+            "modified_at": row["uploaded_at"],
+        }
+        for row in conn.execute(
+            "SELECT filename, size_bytes, uploaded_at FROM invoice_uploads "
+            "ORDER BY uploaded_at DESC LIMIT ?",
+            (int(limit),),
+        )
+    ]
+
+
+def import_yaml_metadata(root: Path, *, invoices_dirname: str = "invoices") -> dict[str, int]:
+    """
+    Bring legacy per-workbook metadata.yaml files and existing invoice uploads
+    into the catalog. Safe to run repeatedly; known versions are skipped.
+    """
+    counts = {"workbooks": 0, "versions": 0, "invoice_uploads": 0}
+    workbooks_dir = root / "workbooks"
+    invoices_dir = root / invoices_dirname
+
+    with connect(root, write=True) as conn:
+        if workbooks_dir.exists():
+            for item in sorted(workbooks_dir.iterdir()):
+                metadata_path = item / "metadata.yaml"
+                if not item.is_dir() or not metadata_path.exists():
+                    continue
+                with open(metadata_path, "r") as f:
+                    metadata = yaml.safe_load(f) or {}
+                workbook_id = metadata.get("workbook_id", item.name)
+                upsert_workbook(
+                    conn,
+                    workbook_id,
+                    metadata.get("display_name", workbook_id),
+                    metadata.get("created_at"),
+                )
+                counts["workbooks"] += 1
+                known = {
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT version_id FROM versions WHERE workbook_id = ?", (workbook_id,)
+                    )
+                }
+                for entry in metadata.get("versions", []):
+                    if entry.get("version_id") in known:
+                        continue
+                    insert_version(conn, workbook_id, entry)
+                    counts["versions"] += 1
+
+        counts["invoice_uploads"], _ = sync_invoice_uploads(conn, invoices_dir)
+    return counts
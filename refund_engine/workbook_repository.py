@@ -1,27 +1,53 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
+import gzip
+import hashlib
 import json
+import os
 import re
+import uuid
 from pathlib import Path
 from typing import Any
 
 import pandas as pd
-import yaml
 
+from refund_engine import workbook_catalog as catalog
+from refund_engine.blob_store import iter_blobs, link_or_copy, put_bytes, put_file, read_bytes
+from refund_engine.column_types import parquet_safe
 from refund_engine.constants import PROJECT_ROOT
+from refund_engine.xlsx_patch import (
+    UnsupportedSheetXML,
+    cell_value,
+    header_row_number,
+    patch_sheet_cells,
+    read_header_row,
+)
 
 
 DEFAULT_REPOSITORY_ROOT = PROJECT_ROOT / "webapp_data"
 INVOICE_UPLOADS_DIRNAME = "invoices"
+DELTA_FORMAT = "cell-delta/1"
+SHEET_CACHE_ROW_GROUP_SIZE = 10_000
 
 
 @dataclass(frozen=True)
 class VersionRef:
     workbook_id: str
     version_id: str
-    file_path: Path
+    root: Path
+
+    @property
+    def file_path(self) -> Path:
+        """
+        The version as a normal workbook file.
+
+        Delta versions are materialized on first access rather than when
+        saved. Every access refreshes the file's mtime, and compaction keeps
+        recently touched files, so a path handed out here stays valid.
+        """
+        return _version_file(self.root, self.workbook_id, self.version_id)
 
 
 def _slugify(value: str) -> str:
@@ -50,32 +76,21 @@ def _workbook_dir(root: Path, workbook_id: str) -> Path:
     return _workbooks_dir(root) / workbook_id
 
 
-def _metadata_path(root: Path, workbook_id: str) -> Path:
-    return _workbook_dir(root, workbook_id) / "metadata.yaml"
-
-
 def _invoices_dir(root: Path) -> Path:
     return root / INVOICE_UPLOADS_DIRNAME
 
 
 def _load_metadata(root: Path, workbook_id: str) -> dict[str, Any]:
-    path = _metadata_path(root, workbook_id)
-    if not path.exists():
+    with catalog.connect(root) as conn:
+        metadata = catalog.load_workbook(conn, workbook_id)
+    if metadata is None:
         return {
             "workbook_id": workbook_id,
             "display_name": workbook_id,
             "created_at": datetime.now().isoformat(),
             "versions": [],
         }
-    with open(path, "r") as f:
-        return yaml.safe_load(f) or {}
-
-
-def _save_metadata(root: Path, workbook_id: str, metadata: dict[str, Any]):
-    path = _metadata_path(root, workbook_id)
-    _ensure_dir(path.parent)
-    with open(path, "w") as f:
-        yaml.safe_dump(metadata, f, sort_keys=False)
+    return metadata
 
 
 def _excel_engine(path: Path) -> str | None:
@@ -191,26 +206,8 @@ def _compute_diff_summary(
 
 def list_workbooks(root: str | Path | None = None) -> list[dict[str, Any]]:
     base = _repo_root(root)
-    wb_dir = _workbooks_dir(base)
-    if not wb_dir.exists():
-        return []
-
-    out: list[dict[str, Any]] = []
-    for item in sorted(wb_dir.iterdir()):
-        if not item.is_dir():
-            continue
-        metadata = _load_metadata(base, item.name)
-        versions = metadata.get("versions", [])
-        out.append(
-            {
-                "workbook_id": metadata.get("workbook_id", item.name),
-                "display_name": metadata.get("display_name", item.name),
-                "version_count": len(versions),
-                "latest_version_id": versions[-1]["version_id"] if versions else None,
-                "created_at": metadata.get("created_at"),
-            }
-        )
-    return out
+    with catalog.connect(base) as conn:
+        return catalog.list_workbooks(conn)
 
 
 def get_invoice_upload_dir(*, root: str | Path | None = None) -> Path:
@@ -237,6 +234,10 @@ def import_uploaded_invoice_files(
         with open(target, "wb") as f:
             f.write(data)
         out_paths.append(target)
+    if out_paths:
+        with catalog.connect(_repo_root(root), write=True) as conn:
+            for path in out_paths:
+                catalog.record_invoice_upload(conn, path.name, path.stat().st_size)
     return out_paths
 
 
@@ -245,20 +246,17 @@ def list_uploaded_invoice_files(
     root: str | Path | None = None,
     limit: int = 200,
 ) -> list[dict[str, Any]]:
-    upload_dir = get_invoice_upload_dir(root=root)
-    files = [p for p in upload_dir.iterdir() if p.is_file()]
-    files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-    out: list[dict[str, Any]] = []
-    for path in files[: max(0, int(limit))]:
-        stat = path.stat()
-        out.append(
-            {
-                "filename": path.name,
-                "size_bytes": int(stat.st_size),
-                "modified_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-            }
-        )
-    return out
+    """Newest uploads first, including files copied into or removed from the upload dir by hand."""
+    base = _repo_root(root)
+    upload_dir = get_invoice_upload_dir(root=base)
+    present = {path.name for path in upload_dir.iterdir() if path.is_file()}
+    with catalog.connect(base) as conn:
+        in_sync = catalog.invoice_upload_names(conn) == present
+    if not in_sync:
+        with catalog.connect(base, write=True) as conn:
+            catalog.sync_invoice_uploads(conn, upload_dir)
+    with catalog.connect(base) as conn:
+        return catalog.list_invoice_uploads(conn, max(0, int(limit)))
 
 
 def get_workbook_metadata(
@@ -270,62 +268,205 @@ def get_workbook_metadata(
     return _load_metadata(base, workbook_id)
 
 
-def import_uploaded_workbook(
-    file_bytes: bytes,
-    filename: str,
-    *,
-    workbook_name: str | None = None,
-    root: str | Path | None = None,
-) -> VersionRef:
-    base = _repo_root(root)
-    _ensure_dir(_workbooks_dir(base))
-
-    display_name = (workbook_name or Path(filename).stem).strip()
-    workbook_id = _slugify(display_name)
-
+def _prepare_workbook_dirs(base: Path, workbook_id: str) -> tuple[Path, Path]:
     wb_root = _workbook_dir(base, workbook_id)
     versions_dir = wb_root / "versions"
     changes_dir = wb_root / "changes"
     _ensure_dir(versions_dir)
     _ensure_dir(changes_dir)
+    return versions_dir, changes_dir
 
-    metadata = _load_metadata(base, workbook_id)
-    metadata["workbook_id"] = workbook_id
-    metadata["display_name"] = display_name
-    metadata.setdefault("created_at", datetime.now().isoformat())
-    metadata.setdefault("versions", [])
 
-    sanitized_name = _sanitize_filename(filename)
-    version_id = _now_stamp()
-    stored_name = f"{version_id}_{sanitized_name}"
-    file_path = versions_dir / stored_name
-    with open(file_path, "wb") as f:
-        f.write(file_bytes)
+def _materialized_path(base: Path, workbook_id: str, entry: dict[str, Any]) -> Path:
+    return _workbook_dir(base, workbook_id) / "versions" / f"{entry['version_id']}_{entry['filename']}"
 
-    sheet_names = _sheet_names(file_path)
 
-    version_entry: dict[str, Any] = {
-        "version_id": version_id,
-        "filename": sanitized_name,
-        "stored_path": str(file_path),
+def _find_entry(metadata: dict[str, Any], version_id: str) -> dict[str, Any] | None:
+    for entry in metadata.get("versions", []):
+        if entry.get("version_id") == version_id:
+            return entry
+    return None
+
+
+def _delta_value(value: Any) -> Any:
+    # JSON has no dates; tag them so materializing writes real date cells.
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"date": value.isoformat()}
+    return value
+
+
+def _from_delta_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "datetime" in value:
+            return datetime.fromisoformat(value["datetime"])
+        if "date" in value:
+            return date.fromisoformat(value["date"])
+    return value
+
+
+def _encode_delta(
+    sheet_name: str,
+    updates: dict[int, dict[str, Any]],
+    ensure_headers: tuple[str, ...],
+) -> bytes:
+    columns: dict[str, dict[str, list[Any]]] = {}
+    for row_pos in sorted(updates):
+        for col, value in updates[row_pos].items():
+            column = columns.setdefault(col, {"rows": [], "values": []})
+            column["rows"].append(int(row_pos))
+            column["values"].append(_delta_value(cell_value(value)))
+    payload = {
+        "format": DELTA_FORMAT,
+        "sheet_name": sheet_name,
+        "ensure_headers": list(ensure_headers),
+        "columns": columns,
+    }
+    return gzip.compress(json.dumps(payload, default=str).encode("utf-8"), mtime=0)
+
+
+def _decode_delta(data: bytes) -> tuple[str, dict[int, dict[str, Any]], tuple[str, ...]]:
+    payload = json.loads(gzip.decompress(data).decode("utf-8"))
+    if payload.get("format") != DELTA_FORMAT:
+        raise ValueError(f"Unsupported delta format: {payload.get('format')!r}")
+    updates: dict[int, dict[str, Any]] = {}
+    for col, column in payload["columns"].items():
+        for row_pos, value in zip(column["rows"], column["values"]):
+            updates.setdefault(int(row_pos), {})[col] = _from_delta_value(value)
+    return payload["sheet_name"], updates, tuple(payload.get("ensure_headers", []))
+
+
+def _delta_diff_summary(
+    parent_entry: dict[str, Any],
+    sheet_name: str,
+    updates: dict[int, dict[str, Any]],
+    ensure_headers: tuple[str, ...],
+    *,
+    max_examples: int = 200,
+) -> dict[str, Any]:
+    changed_rows = sorted(updates)
+    return {
+        "old_version_id": parent_entry["version_id"],
         "created_at": datetime.now().isoformat(),
-        "sheet_names": sheet_names,
-        "diff_summary_path": None,
+        "sheets_added": [],
+        "sheets_removed": [],
+        "sheets_compared": [sheet_name],
+        "per_sheet": [
+            {
+                "sheet_name": sheet_name,
+                "added_columns": list(ensure_headers),
+                "changed_cells_sampled": sum(len(values) for values in updates.values()),
+                "changed_rows_sampled": changed_rows[:max_examples],
+                "truncated": False,
+                "source": "delta",
+            }
+        ],
     }
 
-    previous_versions = metadata["versions"]
-    if previous_versions:
-        previous_path = Path(previous_versions[-1]["stored_path"])
-        diff_summary = _compute_diff_summary(previous_path, file_path)
-        diff_path = changes_dir / f"{version_id}.json"
+
+def _materialize(base: Path, workbook_id: str, metadata: dict[str, Any], entry: dict[str, Any]) -> Path:
+    if not entry.get("blob") and not entry.get("delta_blob"):
+        return Path(entry["stored_path"])
+
+    target = _materialized_path(base, workbook_id, entry)
+    if target.exists():
+        return target
+
+    if entry.get("blob"):
+        link_or_copy(base, entry["blob"], target)
+        return target
+
+    parent = _find_entry(metadata, entry["parent_version_id"])
+    if parent is None:
+        raise KeyError(
+            f"Parent version '{entry['parent_version_id']}' of '{entry['version_id']}' is missing"
+        )
+    parent_path = _materialize(base, workbook_id, metadata, parent)
+    sheet_name, updates, ensure_headers = _decode_delta(read_bytes(base, entry["delta_blob"]))
+    temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+    patch_sheet_cells(
+        parent_path,
+        temp_path,
+        sheet_name,
+        updates,
+        ensure_headers=ensure_headers,
+        allow_new_rows=True,
+    )
+    os.replace(temp_path, target)
+    return target
+
+
+def _append_version(
+    base: Path,
+    workbook_id: str,
+    display_name: str,
+    version_entry: dict[str, Any],
+    diff_summary: dict[str, Any] | None,
+) -> VersionRef:
+    _, changes_dir = _prepare_workbook_dirs(base, workbook_id)
+    if diff_summary is not None:
+        diff_path = changes_dir / f"{version_entry['version_id']}.json"
         with open(diff_path, "w") as f:
             json.dump(diff_summary, f, indent=2)
         version_entry["diff_summary_path"] = str(diff_path)
+        version_entry["diff_status"] = "ready"
 
-    metadata["versions"].append(version_entry)
-    _save_metadata(base, workbook_id, metadata)
+    with catalog.connect(base, write=True) as conn:
+        catalog.upsert_workbook(conn, workbook_id, display_name)
+        catalog.insert_version(conn, workbook_id, version_entry)
+    return VersionRef(workbook_id=workbook_id, version_id=version_entry["version_id"], root=base)
 
-    return VersionRef(workbook_id=workbook_id, version_id=version_id, file_path=file_path)
+
+def _add_root_version(
+    base: Path,
+    workbook_id: str,
+    display_name: str,
+    sanitized_name: str,
+    digest: str,
+) -> VersionRef:
+    versions_dir, _ = _prepare_workbook_dirs(base, workbook_id)
+    version_id = _now_stamp()
+    entry: dict[str, Any] = {
+        "version_id": version_id,
+        "filename": sanitized_name,
+        "blob": digest,
+        "created_at": datetime.now().isoformat(),
+        "sheet_names": [],
+        "diff_summary_path": None,
+    }
+    file_path = _materialized_path(base, workbook_id, entry)
+    link_or_copy(base, digest, file_path)
+    entry["stored_path"] = str(file_path)
+    entry["sheet_names"] = _sheet_names(file_path)
+
+    with catalog.connect(base) as conn:
+        previous = catalog.latest_version(conn, workbook_id)
+    diff_summary = None
+    if previous is not None:
+        metadata = _load_metadata(base, workbook_id)
+        previous_path = _materialize(base, workbook_id, metadata, previous)
+        diff_summary = _compute_diff_summary(previous_path, file_path)
+        diff_summary["old_version_id"] = previous["version_id"]
+    return _append_version(base, workbook_id, display_name, entry, diff_summary)
+
+
+def import_uploaded_workbook(
+    file_bytes: bytes,
+    filename: str,
+    *,
+    workbook_name: str | None = None,
+    root: str | Path | None = None,
+) -> VersionRef:
+    base = _repo_root(root)
+    _ensure_dir(_workbooks_dir(base))
+
+    display_name = (workbook_name or Path(filename).stem).strip()
+    workbook_id = _slugify(display_name)
+    digest = put_bytes(base, file_bytes)
+    return _add_root_version(
+        base, workbook_id, display_name, _sanitize_filename(filename), digest
+    )
 
 
 def read_diff_summary(
@@ -335,18 +476,30 @@ def read_diff_summary(
     root: str | Path | None = None,
 ) -> dict[str, Any] | None:
     metadata = get_workbook_metadata(workbook_id, root=root)
-    for entry in metadata.get("versions", []):
-        if entry.get("version_id") != version_id:
-            continue
-        path_str = entry.get("diff_summary_path")
-        if not path_str:
-            return None
-        path = Path(path_str)
-        if not path.exists():
-            return None
-        with open(path, "r") as f:
-            return json.load(f)
-    return None
+    entry = _find_entry(metadata, version_id)
+    if entry is None:
+        return None
+    path_str = entry.get("diff_summary_path")
+    if not path_str:
+        return None
+    path = Path(path_str)
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _version_file(base: Path, workbook_id: str, version_id: str) -> Path:
+    metadata = _load_metadata(base, workbook_id)
+    entry = _find_entry(metadata, version_id)
+    if entry is None:
+        raise KeyError(f"Version '{version_id}' not found for workbook '{workbook_id}'")
+    path = _materialize(base, workbook_id, metadata, entry)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass  # a legacy version whose file is gone
+    return path
 
 
 def get_version_ref(
@@ -355,15 +508,12 @@ def get_version_ref(
     *,
     root: str | Path | None = None,
 ) -> VersionRef:
-    metadata = get_workbook_metadata(workbook_id, root=root)
-    for entry in metadata.get("versions", []):
-        if entry.get("version_id") == version_id:
-            return VersionRef(
-                workbook_id=workbook_id,
-                version_id=version_id,
-                file_path=Path(entry["stored_path"]),
-            )
-    raise KeyError(f"Version '{version_id}' not found for workbook '{workbook_id}'")
+    """Resolve a version; its workbook file is materialized when `file_path` is read."""
+    base = _repo_root(root)
+    metadata = get_workbook_metadata(workbook_id, root=base)
+    if _find_entry(metadata, version_id) is None:
+        raise KeyError(f"Version '{version_id}' not found for workbook '{workbook_id}'")
+    return VersionRef(workbook_id=workbook_id, version_id=version_id, root=base)
 
 
 def read_sheet_dataframe(
@@ -373,12 +523,189 @@ def read_sheet_dataframe(
     *,
     root: str | Path | None = None,
 ) -> pd.DataFrame:
-    ref = get_version_ref(workbook_id, version_id, root=root)
-    return pd.read_excel(
-        ref.file_path,
-        sheet_name=sheet_name,
-        engine=_excel_engine(ref.file_path),
-    )
+    path = get_version_ref(workbook_id, version_id, root=root).file_path
+    return pd.read_excel(path, sheet_name=sheet_name, engine=_excel_engine(path))
+
+
+def _sheet_cache_path(base: Path, workbook_id: str, version_id: str, sheet_name: str) -> Path:
+    digest = hashlib.sha256(sheet_name.encode("utf-8")).hexdigest()[:8]
+    return _workbook_dir(base, workbook_id) / "sheet_cache" / f"{version_id}_{_slugify(sheet_name)}-{digest}.parquet"
+
+
+def sheet_table_path(
+    workbook_id: str,
+    version_id: str,
+    sheet_name: str,
+    *,
+    root: str | Path | None = None,
+) -> Path:
+    """
+    Parquet copy of one sheet of a version, built from the workbook on first use.
+
+    Versions never change once written, so the copy is keyed by version id
+    alone. Rows are written in row groups of SHEET_CACHE_ROW_GROUP_SIZE so a
+    page of rows can be read without decoding the whole sheet.
+    """
+    base = _repo_root(root)
+    path = _sheet_cache_path(base, workbook_id, version_id, sheet_name)
+    if path.exists():
+        return path
+    df = read_sheet_dataframe(workbook_id, version_id, sheet_name, root=base)
+    _ensure_dir(path.parent)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    parquet_safe(df).to_parquet(temp_path, index=False, row_group_size=SHEET_CACHE_ROW_GROUP_SIZE)
+    os.replace(temp_path, path)
+    return path
+
+
+def read_sheet_table(
+    workbook_id: str,
+    version_id: str,
+    sheet_name: str,
+    *,
+    columns: list[str] | None = None,
+    root: str | Path | None = None,
+) -> pd.DataFrame:
+    """Sheet rows from the parquet cache, optionally only `columns`."""
+    path = sheet_table_path(workbook_id, version_id, sheet_name, root=root)
+    return pd.read_parquet(path, columns=list(columns) if columns is not None else None)
+
+
+def _sheet_cell_updates(
+    base_df: pd.DataFrame,
+    updated_df: pd.DataFrame,
+) -> dict[int, dict[str, Any]] | None:
+    """
+    Cells of `updated_df` that differ from `base_df`, keyed by positional row.
+
+    Returns None when the change cannot be expressed as cell edits (rows or
+    columns were removed, or headers are not unique strings).
+    """
+    base_cols = list(base_df.columns)
+    new_cols = list(updated_df.columns)
+    if len(updated_df) < len(base_df) or any(col not in new_cols for col in base_cols):
+        return None
+    if len(set(new_cols)) != len(new_cols) or not all(isinstance(c, str) for c in new_cols):
+        return None
+
+    base_len = len(base_df)
+    updates: dict[int, dict[str, Any]] = {}
+    for col in new_cols:
+        new_values = updated_df[col].astype(object).to_numpy()
+        if col in base_cols:
+            old = base_df[col].astype(object).to_numpy()
+            head = pd.Series(new_values[:base_len])
+            old_series = pd.Series(old)
+            same = (head == old_series) | (head.isna() & old_series.isna())
+            changed = [int(i) for i in (~same).to_numpy().nonzero()[0]]
+        else:
+            changed = [int(i) for i in pd.Series(new_values[:base_len]).notna().to_numpy().nonzero()[0]]
+        changed.extend(range(base_len, len(updated_df)))
+        for row_pos in changed:
+            updates.setdefault(row_pos, {})[col] = new_values[row_pos]
+    return updates
+
+
+def _append_delta_version(
+    base: Path,
+    workbook_id: str,
+    metadata: dict[str, Any],
+    parent: dict[str, Any],
+    sheet_name: str,
+    updates: dict[int, dict[str, Any]],
+    ensure_headers: tuple[str, ...],
+    note: str,
+) -> VersionRef:
+    display_name = metadata.get("display_name", workbook_id)
+    delta_digest = put_bytes(base, _encode_delta(sheet_name, updates, ensure_headers))
+    entry: dict[str, Any] = {
+        "version_id": _now_stamp(),
+        "filename": _sanitize_filename(f"{display_name}_{note}.xlsx"),
+        "parent_version_id": parent["version_id"],
+        "delta_blob": delta_digest,
+        "created_at": datetime.now().isoformat(),
+        "sheet_names": list(parent.get("sheet_names", [])),
+        "diff_summary_path": None,
+    }
+    entry["stored_path"] = str(_materialized_path(base, workbook_id, entry))
+    diff_summary = _delta_diff_summary(parent, sheet_name, updates, ensure_headers)
+    return _append_version(base, workbook_id, display_name, entry, diff_summary)
+
+
+def merge_sheet_updates(df: pd.DataFrame, updates: dict[int, dict[str, Any]]) -> pd.DataFrame:
+    """Copy of `df` with `updates` (positional row -> {column: value}) applied; new columns are appended."""
+    merged = df.copy()
+    columns: dict[str, dict[int, Any]] = {}
+    for row_pos, cells in updates.items():
+        for col, value in cells.items():
+            columns.setdefault(col, {})[int(row_pos)] = value
+    for col, values in columns.items():
+        if col not in merged.columns:
+            merged[col] = None
+        position = merged.columns.get_loc(col)
+        if merged[col].dtype != object:
+            merged[col] = merged[col].astype(object)
+        merged.iloc[list(values), position] = list(values.values())
+    return merged
+
+
+def _delta_patchable(path: Path, sheet_name: str) -> bool:
+    # Deltas need an .xlsx the streaming patcher can split, with the header
+    # in row 1 (pandas counts rows from row 1, the patcher from the header).
+    if path.suffix.lower() != ".xlsx":
+        return False
+    try:
+        return header_row_number(path, sheet_name) == 1
+    except UnsupportedSheetXML:
+        return False
+
+
+def write_sheet_updates_as_new_version(
+    workbook_id: str,
+    base_version_id: str,
+    sheet_name: str,
+    updates: dict[int, dict[str, Any]],
+    *,
+    note: str = "analyzed",
+    root: str | Path | None = None,
+) -> VersionRef:
+    """
+    Save per-row cell updates to `sheet_name` as a new version.
+
+    `updates` maps a 0-based data row position (the index of
+    `read_sheet_dataframe`) to {column header: value}. For .xlsx bases the
+    updates become the version's delta directly, without reading the sheet
+    into a frame; unknown headers are appended as new columns. Other formats,
+    sheets whose header is not in row 1 (pandas counts rows from row 1, the
+    patcher from the header) and worksheet XML the patcher cannot split fall
+    back to merging into the sheet and `write_updated_sheet_as_new_version`.
+    """
+    base = _repo_root(root)
+    metadata = get_workbook_metadata(workbook_id, root=base)
+    parent = _find_entry(metadata, base_version_id)
+    if parent is None:
+        raise KeyError(f"Version '{base_version_id}' not found for workbook '{workbook_id}'")
+
+    base_file = _materialize(base, workbook_id, metadata, parent)
+    if not _delta_patchable(base_file, sheet_name):
+        df = pd.read_excel(base_file, sheet_name=sheet_name, engine=_excel_engine(base_file))
+        return write_updated_sheet_as_new_version(
+            workbook_id,
+            base_version_id,
+            sheet_name,
+            merge_sheet_updates(df, updates),
+            note=note,
+            root=base,
+        )
+
+    headers = read_header_row(base_file, sheet_name)
+    ensure_headers: list[str] = []
+    for cells in updates.values():
+        for col in cells:
+            if col not in headers and col not in ensure_headers:
+                ensure_headers.append(col)
+    clean = {int(row_pos): dict(cells) for row_pos, cells in updates.items() if cells}
+    return _append_delta_version(base, workbook_id, metadata, parent, sheet_name, clean, tuple(ensure_headers), note)
 
 
 def write_updated_sheet_as_new_version(
@@ -390,16 +717,38 @@ def write_updated_sheet_as_new_version(
     note: str = "analyzed",
     root: str | Path | None = None,
 ) -> VersionRef:
+    """
+    Save `updated_df` as the new content of `sheet_name` in a new version.
+
+    For .xlsx bases the version is stored as a column delta of the changed
+    cells against its parent; materializing it rewrites only those cells, so
+    untouched sheets keep their formatting and formulas. Other formats,
+    frames that drop rows/columns, sheets whose header is not in row 1 and
+    worksheet XML the patcher cannot split are stored as a full new
+    workbook blob.
+    """
     base = _repo_root(root)
-    base_ref = get_version_ref(workbook_id, base_version_id, root=base)
     metadata = get_workbook_metadata(workbook_id, root=base)
+    parent = _find_entry(metadata, base_version_id)
+    if parent is None:
+        raise KeyError(f"Version '{base_version_id}' not found for workbook '{workbook_id}'")
+    display_name = metadata.get("display_name", workbook_id)
+    sanitized_name = _sanitize_filename(f"{display_name}_{note}.xlsx")
 
-    out_name = f"{metadata.get('display_name', workbook_id)}_{note}.xlsx"
-    base_file = base_ref.file_path
+    base_file = _materialize(base, workbook_id, metadata, parent)
     engine = _excel_engine(base_file)
-    xls = pd.ExcelFile(base_file, engine=engine)
+    if _delta_patchable(base_file, sheet_name):
+        base_df = pd.read_excel(base_file, sheet_name=sheet_name, engine=engine)
+        updates = _sheet_cell_updates(base_df, updated_df)
+        if updates is not None:
+            ensure_headers = tuple(c for c in updated_df.columns if c not in base_df.columns)
+            return _append_delta_version(
+                base, workbook_id, metadata, parent, sheet_name, updates, ensure_headers, note
+            )
 
-    temp_path = base_file.parent / f"{_now_stamp()}_{_sanitize_filename(out_name)}"
+    versions_dir, _ = _prepare_workbook_dirs(base, workbook_id)
+    temp_path = versions_dir / f".{_now_stamp()}_{sanitized_name}.tmp"
+    xls = pd.ExcelFile(base_file, engine=engine)
     with pd.ExcelWriter(temp_path, engine="openpyxl") as writer:
         for sheet in xls.sheet_names:
             if sheet == sheet_name:
@@ -407,14 +756,186 @@ def write_updated_sheet_as_new_version(
             else:
                 df = pd.read_excel(base_file, sheet_name=sheet, engine=engine)
             df.to_excel(writer, sheet_name=sheet, index=False)
-
-    with open(temp_path, "rb") as f:
-        data = f.read()
+    digest = put_file(base, temp_path)
     temp_path.unlink(missing_ok=True)
+    return _add_root_version(base, workbook_id, display_name, sanitized_name, digest)
 
-    return import_uploaded_workbook(
-        data,
-        filename=out_name,
-        workbook_name=metadata.get("display_name", workbook_id),
-        root=base,
-    )
+
+def _delta_chain_length(metadata: dict[str, Any], entry: dict[str, Any]) -> int:
+    length = 0
+    while entry.get("delta_blob"):
+        length += 1
+        parent = _find_entry(metadata, entry.get("parent_version_id", ""))
+        if parent is None:
+            break
+        entry = parent
+    return length
+
+
+def _ancestors(metadata: dict[str, Any], entry: dict[str, Any]) -> list[str]:
+    out: list[str] = []
+    while entry.get("delta_blob"):
+        parent_id = entry.get("parent_version_id", "")
+        out.append(parent_id)
+        parent = _find_entry(metadata, parent_id)
+        if parent is None:
+            break
+        entry = parent
+    return out
+
+
+def _unlink_counting(path: Path) -> int:
+    stat = path.stat()
+    path.unlink()
+    # Hard-linked materializations share storage with their blob.
+    return int(stat.st_size) if stat.st_nlink <= 1 else 0
+
+
+def compact_repository(
+    *,
+    root: str | Path | None = None,
+    keep_versions: int | None = None,
+    max_delta_chain: int = 8,
+    keep_materialized: int = 1,
+    materialized_grace_s: float = 3600.0,
+) -> dict[str, Any]:
+    """
+    Apply retention and garbage-collect the blob store.
+
+    - legacy full-copy versions are moved into the content-addressed store;
+    - only the newest `keep_versions` versions of each workbook are kept;
+    - kept versions whose delta chain reaches a dropped version or exceeds
+      `max_delta_chain` are rebased onto a full blob;
+    - materialized files (including those of dropped versions) are removed
+      except for the newest `keep_materialized` versions, and so are parquet
+      sheet caches; files touched within `materialized_grace_s` are kept,
+      since `VersionRef.file_path` may have just handed them out. They are
+      rebuilt on demand;
+    - blobs no version references are deleted.
+
+    The versions to drop are re-checked against the catalog inside the
+    write transaction, so a version appended concurrently onto one of them
+    keeps it alive until the next run. The blob sweep runs under the catalog
+    write lock and skips blobs written or reused since compaction started.
+
+    Blobs hold whole workbooks, not single sheets: a workbook is stored
+    once per upload or full rewrite, and sheet-level edits are stored as
+    cell deltas on top of it. Splitting workbooks into per-sheet blobs
+    would need a workbook reassembly step and is out of scope here.
+    """
+    base = _repo_root(root)
+    report: dict[str, Any] = {
+        "workbooks": 0,
+        "versions_dropped": 0,
+        "versions_rebased": 0,
+        "legacy_versions_ingested": 0,
+        "materialized_files_removed": 0,
+        "sheet_caches_removed": 0,
+        "blobs_removed": 0,
+        "bytes_freed": 0,
+    }
+    # Blobs written after this point may belong to versions that are not in
+    # the catalog yet; the sweep leaves them alone.
+    started_at = datetime.now().timestamp()
+    grace_cutoff = started_at - materialized_grace_s
+
+    with catalog.connect(base) as conn:
+        workbook_ids = [row["workbook_id"] for row in catalog.list_workbooks(conn)]
+    for workbook_id in workbook_ids:
+        metadata = _load_metadata(base, workbook_id)
+        versions: list[dict[str, Any]] = metadata.get("versions", [])
+        report["workbooks"] += 1
+        changed: list[dict[str, Any]] = []
+
+        for entry in versions:
+            if entry.get("blob") or entry.get("delta_blob"):
+                continue
+            legacy_path = Path(entry["stored_path"])
+            if legacy_path.exists():
+                entry["blob"] = put_file(base, legacy_path)
+                changed.append(entry)
+                report["legacy_versions_ingested"] += 1
+
+        kept = versions
+        dropped: list[dict[str, Any]] = []
+        if keep_versions is not None and keep_versions > 0 and len(versions) > keep_versions:
+            dropped = versions[:-keep_versions]
+            kept = versions[-keep_versions:]
+        dropped_ids = {entry["version_id"] for entry in dropped}
+
+        rebased: set[str] = set()
+        for entry in kept:
+            if not entry.get("delta_blob"):
+                continue
+            if dropped_ids.intersection(_ancestors(metadata, entry)) or (
+                _delta_chain_length(metadata, entry) > max_delta_chain
+            ):
+                path = _materialize(base, workbook_id, metadata, entry)
+                entry["blob"] = put_file(base, path)
+                entry["delta_blob"] = None
+                entry["parent_version_id"] = None
+                changed.append(entry)
+                rebased.add(entry["version_id"])
+                report["versions_rebased"] += 1
+
+        with catalog.connect(base, write=True) as conn:
+            # Versions appended since the snapshot above may be deltas on a
+            # version picked for dropping; keep their chains intact.
+            current = catalog.load_workbook(conn, workbook_id) or {"versions": []}
+            for entry in current["versions"]:
+                if entry["version_id"] in dropped_ids or entry["version_id"] in rebased:
+                    continue
+                if entry.get("delta_blob"):
+                    dropped_ids.difference_update(_ancestors(current, entry))
+            for entry in changed:
+                if entry["version_id"] not in dropped_ids:
+                    catalog.update_version(conn, workbook_id, entry)
+            catalog.delete_versions(conn, workbook_id, sorted(dropped_ids))
+        dropped = [entry for entry in dropped if entry["version_id"] in dropped_ids]
+
+        for entry in dropped:
+            path_str = entry.get("diff_summary_path")
+            if path_str and Path(path_str).exists():
+                report["bytes_freed"] += _unlink_counting(Path(path_str))
+            report["versions_dropped"] += 1
+
+        cache_keep = {entry["version_id"] for entry in kept[-keep_materialized:]} if keep_materialized > 0 else set()
+        keep_files = {
+            _materialized_path(base, workbook_id, entry).name for entry in kept if entry["version_id"] in cache_keep
+        }
+        versions_dir = _workbook_dir(base, workbook_id) / "versions"
+        if versions_dir.exists():
+            for path in versions_dir.iterdir():
+                # Dot-files are writes in progress.
+                if path.name.startswith(".") or path.name in keep_files or not path.is_file():
+                    continue
+                if path.stat().st_mtime >= grace_cutoff:
+                    continue
+                report["bytes_freed"] += _unlink_counting(path)
+                report["materialized_files_removed"] += 1
+        sheet_cache_dir = _workbook_dir(base, workbook_id) / "sheet_cache"
+        if sheet_cache_dir.exists():
+            for path in sheet_cache_dir.glob("*.parquet"):
+                if any(path.name.startswith(f"{version_id}_") for version_id in cache_keep):
+                    continue
+                if path.stat().st_mtime >= grace_cutoff:
+                    continue
+                report["bytes_freed"] += _unlink_counting(path)
+                report["sheet_caches_removed"] += 1
+
+    # Holding the write lock keeps versions from being recorded mid-sweep; a
+    # blob reused before that has a fresh mtime (see blob_store.put_bytes).
+    with catalog.connect(base, write=True) as conn:
+        referenced = catalog.referenced_blobs(conn)
+        for digest, path in list(iter_blobs(base)):
+            if digest in referenced:
+                continue
+            try:
+                if path.stat().st_mtime >= started_at:
+                    continue
+                report["bytes_freed"] += _unlink_counting(path)
+            except FileNotFoundError:
+                continue
+            report["blobs_removed"] += 1
+
+    return report
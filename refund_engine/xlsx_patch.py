@@ -0,0 +1,593 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime
+import io
+import math
+from pathlib import Path
+import posixpath
+import re
+from typing import Any, Iterator, Mapping
+import xml.etree.ElementTree as ET
+import zipfile
+
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_READ_CHUNK_CHARS = 1 << 20
+_SHEET_DATA = re.compile(r"<(\w+:)?sheetData\s*(/?)>")
+_ROW_OPEN = re.compile(r"<row\b")
+_ROW_NUMBER = re.compile(r'\br="(\d+)"')
+_ROW_SPANS = re.compile(r'\sspans="[^"]*"')
+_CELL = re.compile(r"<c\b[^>]*?/>|<c\b[^>]*?>.*?</c>", re.DOTALL)
+_CELL_REF = re.compile(r'\br="([A-Z]+)(\d+)"')
+_CELL_TYPE = re.compile(r'\bt="([^"]*)"')
+_CELL_STYLE = re.compile(r'\bs="(\d+)"')
+_CELL_VALUE = re.compile(r"<v>(.*?)</v>", re.DOTALL)
+_INLINE_TEXT = re.compile(r"<t\b[^>]*>(.*?)</t>", re.DOTALL)
+_DIMENSION = re.compile(r'<dimension\s+ref="([A-Z]*)(\d*):?([A-Z]*)(\d*)"\s*/>')
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_CELL_XFS = re.compile(r"<cellXfs\b([^>]*?)(?:/>|>(.*?)</cellXfs>)", re.DOTALL)
+_XF = re.compile(r"<xf\b")
+_DATE_1904 = re.compile(r'\bdate1904="(1|true)"')
+
+_STYLES_PART = "xl/styles.xml"
+# Built-in number formats: 14 = short date, 22 = date and time.
+_DATE_FORMATS = {"date": 14, "datetime": 22}
+
+
+class UnsupportedSheetXML(ValueError):
+    """Worksheet XML the streaming patcher cannot split, e.g. namespace-prefixed elements."""
+
+
+@dataclass(frozen=True)
+class PatchResult:
+    updated_rows: int
+    skipped_rows: tuple[int, ...]
+    added_headers: tuple[str, ...]
+    headers: dict[str, int] = field(default_factory=dict)
+
+
+def column_letter(index: int) -> str:
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def column_index(letters: str) -> int:
+    value = 0
+    for char in letters:
+        value = value * 26 + (ord(char) - 64)
+    return value
+
+
+def _unescape(text: str) -> str:
+    return (
+        text.replace("&lt;", "<")
+        .replace("&gt;", ">")
+        .replace("&quot;", '"')
+        .replace("&apos;", "'")
+        .replace("&amp;", "&")
+    )
+
+
+def _escape(text: str) -> str:
+    text = _ILLEGAL_XML_CHARS.sub("", text)
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _resolve_sheet_part(archive: zipfile.ZipFile, sheet_name: str | None) -> tuple[str, str]:
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    sheets = workbook.findall(f"{{{_MAIN_NS}}}sheets/{{{_MAIN_NS}}}sheet")
+    if not sheets:
+        raise ValueError("Workbook does not contain any sheets")
+
+    chosen = sheets[0]
+    if sheet_name is not None:
+        matches = [s for s in sheets if s.get("name") == sheet_name]
+        if not matches:
+            raise KeyError(f"Sheet '{sheet_name}' not found in workbook")
+        chosen = matches[0]
+
+    rel_id = chosen.get(f"{{{_REL_NS}}}id")
+    rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.findall(f"{{{_PKG_REL_NS}}}Relationship"):
+        if rel.get("Id") != rel_id:
+            continue
+        target = rel.get("Target") or ""
+        if target.startswith("/"):
+            part = target.lstrip("/")
+        else:
+            part = posixpath.normpath(posixpath.join("xl", target))
+        return str(chosen.get("name")), part
+    raise ValueError(f"Sheet relationship '{rel_id}' not found in workbook")
+
+
+def _shared_strings(archive: zipfile.ZipFile, wanted: set[int]) -> dict[int, str]:
+    if not wanted or "xl/sharedStrings.xml" not in archive.namelist():
+        return {}
+    found: dict[int, str] = {}
+    idx = 0
+    with archive.open("xl/sharedStrings.xml") as handle:
+        for _, elem in ET.iterparse(handle, events=("end",)):
+            if elem.tag != f"{{{_MAIN_NS}}}si":
+                continue
+            if idx in wanted:
+                found[idx] = "".join(t.text or "" for t in elem.iter(f"{{{_MAIN_NS}}}t"))
+                if len(found) == len(wanted):
+                    break
+            idx += 1
+            elem.clear()
+    return found
+
+
+def _iter_sheet_parts(handle) -> Iterator[tuple[str, str]]:
+    """Yield ("head"|"row"|"tail", xml) pieces of a worksheet part in order."""
+    text = io.TextIOWrapper(handle, encoding="utf-8")
+    buffer = ""
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, eof
+        if eof:
+            return False
+        chunk = text.read(_READ_CHUNK_CHARS)
+        if not chunk:
+            eof = True
+            return False
+        buffer += chunk
+        return True
+
+    while True:
+        match = _SHEET_DATA.search(buffer)
+        if match is not None:
+            if match.group(1):
+                raise UnsupportedSheetXML(
+                    f"Namespace-prefixed worksheet XML ({match.group(1)}sheetData) is not supported"
+                )
+            if match.group(2):
+                yield "head", buffer[: match.start()] + "<sheetData>"
+                buffer = "</sheetData>" + buffer[match.end():]
+            else:
+                yield "head", buffer[: match.end()]
+                buffer = buffer[match.end():]
+            break
+        if not fill():
+            raise UnsupportedSheetXML("Worksheet XML has no sheetData element")
+
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if len(buffer) - pos < len("</sheetData>"):
+            buffer = buffer[pos:]
+            pos = 0
+            if fill():
+                continue
+            if pos >= len(buffer):
+                raise UnsupportedSheetXML("Worksheet XML ended inside sheetData")
+        if buffer.startswith("</sheetData>", pos):
+            tail = [buffer[pos:]]
+            while True:
+                chunk = text.read(_READ_CHUNK_CHARS)
+                if not chunk:
+                    break
+                tail.append(chunk)
+            yield "tail", "".join(tail)
+            return
+        if not _ROW_OPEN.match(buffer, pos):
+            raise UnsupportedSheetXML("Unexpected content inside sheetData")
+        open_end = buffer.find(">", pos)
+        close = -1
+        if open_end >= 0 and buffer[open_end - 1] != "/":
+            close = buffer.find("</row>", open_end)
+        if open_end < 0 or (buffer[open_end - 1] != "/" and close < 0):
+            buffer = buffer[pos:]
+            pos = 0
+            if not fill():
+                raise UnsupportedSheetXML("Truncated row element")
+            continue
+        if buffer[open_end - 1] == "/":
+            yield "row", buffer[pos: open_end + 1]
+            pos = open_end + 1
+        else:
+            yield "row", buffer[pos: close + len("</row>")]
+            pos = close + len("</row>")
+
+
+def _split_row(row_xml: str) -> tuple[str, list[tuple[int, str]]]:
+    open_end = row_xml.find(">")
+    open_tag = row_xml[: open_end + 1]
+    if open_tag.endswith("/>"):
+        return open_tag[:-2].rstrip() + ">", []
+    inner = row_xml[open_end + 1: -len("</row>")]
+    cells: list[tuple[int, str]] = []
+    next_col = 1
+    for match in _CELL.finditer(inner):
+        cell_xml = match.group(0)
+        ref = _CELL_REF.search(cell_xml[: cell_xml.find(">")])
+        col = column_index(ref.group(1)) if ref else next_col
+        cells.append((col, cell_xml))
+        next_col = col + 1
+    return open_tag, cells
+
+
+def _cell_text(cell_xml: str, shared: Mapping[int, str]) -> str | None:
+    head = cell_xml[: cell_xml.find(">")]
+    kind = _CELL_TYPE.search(head)
+    cell_type = kind.group(1) if kind else "n"
+    if cell_type == "inlineStr":
+        return _unescape("".join(_INLINE_TEXT.findall(cell_xml)))
+    value = _CELL_VALUE.search(cell_xml)
+    if value is None:
+        return None
+    raw = _unescape(value.group(1))
+    if cell_type == "s":
+        return shared.get(int(raw))
+    return raw
+
+
+def _is_date(value: Any) -> bool:
+    return isinstance(value, (date, datetime))
+
+
+def _date_kind(value: date) -> str:
+    if isinstance(value, datetime) and (value.hour, value.minute, value.second, value.microsecond) != (0, 0, 0, 0):
+        return "datetime"
+    return "date"
+
+
+def _excel_serial(value: date, epoch: datetime) -> float | int:
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    serial = (value.replace(tzinfo=None) - epoch).total_seconds() / 86400.0
+    return int(serial) if serial.is_integer() else serial
+
+
+def _cell_xml(
+    ref: str,
+    value: Any,
+    style: str | None,
+    dates: _DateStyles | None = None,
+) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if _is_date(value):
+        if dates is None:
+            value = value.isoformat()
+        else:
+            # Dates are numeric serials; a date number format makes Excel show them as dates.
+            style = dates.styles[_date_kind(value)]
+            value = _excel_serial(value, dates.epoch)
+    style_attr = f' s="{style}"' if style else ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{style_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)) and math.isfinite(float(value)):
+        return f'<c r="{ref}"{style_attr}><v>{value!r}</v></c>'
+    text = _escape(str(value))
+    return (
+        f'<c r="{ref}"{style_attr} t="inlineStr">'
+        f'<is><t xml:space="preserve">{text}</t></is></c>'
+    )
+
+
+def _render_row(
+    open_tag: str,
+    row_number: int,
+    cells: list[tuple[int, str]],
+    values: Mapping[int, Any],
+    dates: _DateStyles | None = None,
+) -> str:
+    by_col = dict(cells)
+    for col, value in values.items():
+        style = None
+        existing = by_col.get(col)
+        if existing is not None:
+            style_match = _CELL_STYLE.search(existing[: existing.find(">")])
+            style = style_match.group(1) if style_match else None
+        rendered = _cell_xml(f"{column_letter(col)}{row_number}", value, style, dates)
+        if rendered is None:
+            by_col.pop(col, None)
+        else:
+            by_col[col] = rendered
+    open_tag = _ROW_SPANS.sub("", open_tag)
+    return open_tag + "".join(by_col[col] for col in sorted(by_col)) + "</row>"
+
+
+@dataclass(frozen=True)
+class _DateStyles:
+    # cellXfs indexes for date cells, and the workbook's date epoch.
+    styles: dict[str, str]
+    epoch: datetime
+
+
+def _add_date_styles(styles_xml: str) -> tuple[str, dict[str, str]] | None:
+    """Append date cell formats to the cellXfs table; None when it cannot be found."""
+    match = _CELL_XFS.search(styles_xml)
+    if match is None:
+        return None
+    inner = match.group(2) or ""
+    first = len(_XF.findall(inner))
+    styles: dict[str, str] = {}
+    added = ""
+    for offset, (kind, fmt_id) in enumerate(_DATE_FORMATS.items()):
+        styles[kind] = str(first + offset)
+        added += f'<xf numFmtId="{fmt_id}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    count = first + len(_DATE_FORMATS)
+    attrs = re.sub(r'\s*count="\d+"', "", match.group(1)).rstrip()
+    block = f'<cellXfs{attrs} count="{count}">{inner}{added}</cellXfs>'
+    return styles_xml[: match.start()] + block + styles_xml[match.end():], styles
+
+
+def _copy_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    copied = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    copied.compress_type = info.compress_type
+    copied.external_attr = info.external_attr
+    copied.file_size = info.file_size
+    return copied
+
+
+def _resize_dimension(head: str, max_col: int, max_row: int) -> str:
+    match = _DIMENSION.search(head)
+    if match is None:
+        return head
+    end_col = match.group(3) or match.group(1)
+    end_row = match.group(4) or match.group(2)
+    cols = max(column_index(end_col) if end_col else 1, max_col)
+    rows = max(int(end_row) if end_row else 1, max_row)
+    ref = f'<dimension ref="A1:{column_letter(cols)}{rows}"/>'
+    return head[: match.start()] + ref + head[match.end():]
+
+
+def cell_value(value: Any) -> Any:
+    # numpy/pandas scalars expose item(); keep plain python values as-is.
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        try:
+            value = value.item()
+        except (TypeError, ValueError):
+            pass
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    try:
+        import pandas as pd
+
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, datetime):
+        # pandas Timestamps become plain datetimes.
+        return value.to_pydatetime() if hasattr(value, "to_pydatetime") else value
+    if isinstance(value, date):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _row_has_values(row_xml: str) -> bool:
+    _, cells = _split_row(row_xml)
+    return any(_CELL_VALUE.search(cell) or _INLINE_TEXT.search(cell) for _, cell in cells)
+
+
+def _row_number(row_xml: str, previous: int) -> int:
+    match = _ROW_NUMBER.search(row_xml[: row_xml.find(">")])
+    return int(match.group(1)) if match else previous + 1
+
+
+def _find_header(archive: zipfile.ZipFile, sheet_name: str | None) -> tuple[int, str] | None:
+    # The header is the first row holding a value, as the streaming readers see it.
+    _, part = _resolve_sheet_part(archive, sheet_name)
+    last_row = 0
+    with archive.open(part) as handle:
+        for kind, xml in _iter_sheet_parts(handle):
+            if kind == "tail":
+                break
+            if kind != "row":
+                continue
+            last_row = _row_number(xml, last_row)
+            if _row_has_values(xml):
+                return last_row, xml
+    return None
+
+
+def read_header_row(path: str | Path, sheet_name: str | None = None) -> dict[str, int]:
+    """Return {header text: 1-based column index} for the header row of a sheet."""
+    with zipfile.ZipFile(path) as archive:
+        found = _find_header(archive, sheet_name)
+        return _header_map(archive, found[1]) if found else {}
+
+
+def header_row_number(path: str | Path, sheet_name: str | None = None) -> int:
+    """Sheet row number of the header row (1 for an empty sheet)."""
+    with zipfile.ZipFile(path) as archive:
+        found = _find_header(archive, sheet_name)
+        return found[0] if found else 1
+
+
+def _header_map(archive: zipfile.ZipFile, row_xml: str) -> dict[str, int]:
+    _, cells = _split_row(row_xml)
+    wanted: set[int] = set()
+    for _, cell_xml in cells:
+        kind = _CELL_TYPE.search(cell_xml[: cell_xml.find(">")])
+        value = _CELL_VALUE.search(cell_xml)
+        if kind and kind.group(1) == "s" and value:
+            wanted.add(int(value.group(1)))
+    shared = _shared_strings(archive, wanted)
+    mapping: dict[str, int] = {}
+    for col, cell_xml in cells:
+        text = _cell_text(cell_xml, shared)
+        if text is not None and text != "" and text not in mapping:
+            mapping[text] = col
+    return mapping
+
+
+def patch_sheet_cells(
+    source: str | Path,
+    destination: str | Path,
+    sheet_name: str | None,
+    updates_by_row_index: Mapping[int, Mapping[str, Any]],
+    *,
+    ensure_headers: tuple[str, ...] = (),
+    allow_new_rows: bool = False,
+) -> PatchResult:
+    """
+    Stream `source` to `destination`, rewriting only the touched cells of one sheet.
+
+    The header is the first row holding a value (row 1 for an empty sheet),
+    and row indexes are 0-based data rows below it, matching the streaming
+    sheet readers. Every other zip member is copied through untouched, so
+    other sheets keep their formatting and formulas. Patched cells keep their
+    existing style and text is written as inline strings, which leaves the
+    shared string table alone. Dates are written as date serials with a date
+    number format appended to the styles. A value of None removes the cell.
+    Rows missing from the sheet XML (past its end or blank gaps) are only
+    written with `allow_new_rows`; otherwise they are reported as skipped.
+    Raises UnsupportedSheetXML for worksheet XML it cannot split.
+    """
+    source = Path(source)
+    destination = Path(destination)
+    if source.resolve() == destination.resolve():
+        raise ValueError("patch_sheet_cells needs distinct source and destination paths")
+
+    by_index: dict[int, dict[str, Any]] = {
+        int(idx): {key: cell_value(value) for key, value in values.items()}
+        for idx, values in updates_by_row_index.items()
+    }
+    negative = sorted(idx for idx in by_index if idx < 0)
+    if negative:
+        raise ValueError(f"Row indexes must be 0 or greater (got {negative[:5]})")
+    wanted_headers: list[str] = list(ensure_headers)
+    for values in by_index.values():
+        for key in values:
+            if key not in wanted_headers:
+                wanted_headers.append(key)
+    has_dates = any(_is_date(value) for values in by_index.values() for value in values.values())
+
+    # Keyed by sheet row once the header row is known.
+    pending: dict[int, Mapping[str, Any]] = {}
+    data_start = 2
+    updated_rows = 0
+    skipped_rows: list[int] = []
+    added: list[str] = []
+    headers: dict[str, int] = {}
+
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(
+        destination, "w", compression=zipfile.ZIP_DEFLATED
+    ) as dst:
+        _, part = _resolve_sheet_part(src, sheet_name)
+        dates: _DateStyles | None = None
+        patched_styles: str | None = None
+        if has_dates and _STYLES_PART in src.namelist():
+            styled = _add_date_styles(src.read(_STYLES_PART).decode("utf-8"))
+            if styled is not None:
+                patched_styles, date_styles = styled
+                date1904 = _DATE_1904.search(src.read("xl/workbook.xml").decode("utf-8"))
+                epoch = datetime(1904, 1, 1) if date1904 else datetime(1899, 12, 30)
+                dates = _DateStyles(date_styles, epoch)
+
+        for info in src.infolist():
+            if info.filename == _STYLES_PART and patched_styles is not None:
+                dst.writestr(_copy_info(info), patched_styles.encode("utf-8"))
+                continue
+            if info.filename != part:
+                with src.open(info) as fin, dst.open(_copy_info(info), "w") as fout:
+                    while True:
+                        block = fin.read(_READ_CHUNK_CHARS)
+                        if not block:
+                            break
+                        fout.write(block)
+                continue
+
+            out_info = _copy_info(info)
+            out_info.compress_type = zipfile.ZIP_DEFLATED
+            with src.open(info) as fin, dst.open(out_info, "w") as raw_out:
+                out = io.TextIOWrapper(raw_out, encoding="utf-8", newline="")
+                head = ""
+                header_done = False
+                last_row = 0
+                # Blank rows above the header, written after the sheet head.
+                leading: list[str] = []
+
+                def emit_header(row_xml: str | None, header_row: int) -> None:
+                    nonlocal header_done, data_start
+                    data_start = header_row + 1
+                    pending.update({data_start + idx: values for idx, values in by_index.items()})
+                    if row_xml is not None:
+                        headers.update(_header_map(src, row_xml))
+                        open_tag, cells = _split_row(row_xml)
+                    else:
+                        open_tag, cells = f'<row r="{header_row}">', []
+                    next_col = max([col for col, _ in cells] + list(headers.values()) + [0]) + 1
+                    new_cols: dict[int, Any] = {}
+                    for name in wanted_headers:
+                        if name in headers:
+                            continue
+                        headers[name] = next_col
+                        new_cols[next_col] = name
+                        added.append(name)
+                        next_col += 1
+                    max_row = max(pending) if allow_new_rows and pending else header_row
+                    out.write(_resize_dimension(head, next_col - 1, max_row))
+                    out.write("".join(leading))
+                    if new_cols or row_xml is None:
+                        out.write(_render_row(open_tag, header_row, cells, new_cols))
+                    else:
+                        out.write(row_xml)
+                    header_done = True
+
+                def emit_new_rows(limit: int | None) -> None:
+                    nonlocal updated_rows
+                    for number in sorted(n for n in pending if limit is None or n < limit):
+                        values = pending.pop(number)
+                        cols = {headers[k]: v for k, v in values.items() if k in headers}
+                        out.write(_render_row(f'<row r="{number}">', number, [], cols, dates))
+                        updated_rows += 1
+
+                for kind, xml in _iter_sheet_parts(fin):
+                    if kind == "head":
+                        head = xml
+                        continue
+                    if kind == "tail":
+                        if not header_done:
+                            emit_header(None, last_row + 1)
+                        if allow_new_rows:
+                            emit_new_rows(None)
+                        out.write(xml)
+                        continue
+
+                    row_number = _row_number(xml, last_row)
+                    last_row = row_number
+                    if not header_done:
+                        if _row_has_values(xml):
+                            emit_header(xml, row_number)
+                        else:
+                            leading.append(xml)
+                        continue
+
+                    if allow_new_rows:
+                        emit_new_rows(row_number)
+                    values = pending.pop(row_number, None)
+                    if values is None:
+                        out.write(xml)
+                        continue
+                    open_tag, cells = _split_row(xml)
+                    cols = {headers[k]: v for k, v in values.items() if k in headers}
+                    out.write(_render_row(open_tag, row_number, cells, cols, dates))
+                    updated_rows += 1
+                out.flush()
+                out.detach()
+
+    skipped_rows.extend(number - data_start for number in sorted(pending))
+    return PatchResult(
+        updated_rows=updated_rows,
+        skipped_rows=tuple(skipped_rows),
+        added_headers=tuple(added),
+        headers=dict(headers),
+    )
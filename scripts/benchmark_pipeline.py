@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""End-to-end throughput benchmark against in-process OpenAI/Supabase fakes.
+
+Usage:
+    python scripts/benchmark_pipeline.py --rows 200 --openai-latency-ms 800 --scenario baseline
+
+Generates a synthetic workload (source workbook, text and scanned invoice
+PDFs, skewed vendor mix) shaped like a datasets.yaml entry, runs the full
+analysis pipeline against the fakes, and appends a result record to
+runs/benchmarks/results.jsonl. The previous record of the same scenario is
+used as the comparison baseline.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from refund_engine.benchmarking import (
+    DEFAULT_RESULTS_PATH,
+    BenchmarkSettings,
+    WorkloadSpec,
+    append_result,
+    compare_results,
+    generate_workload,
+    previous_result,
+    run_benchmark,
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", default="use_tax_2024", help="datasets.yaml layout to imitate")
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--vendors", type=int, default=25)
+    parser.add_argument("--invoice-pool", type=int, default=40)
+    parser.add_argument("--scanned-share", type=float, default=0.2)
+    parser.add_argument("--openai-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--rag-latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--no-rag", action="store_true", help="Skip the RAG retriever fake")
+    parser.add_argument("--cascade", action="store_true", help="Run the fast/analysis/pro model cascade")
+    parser.add_argument("--scenario", default="default", help="Name results are grouped by")
+    parser.add_argument("--work-dir", type=Path, default=None, help="Keep the workload here")
+    parser.add_argument("--results", type=Path, default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    spec = WorkloadSpec(
+        dataset_id=args.dataset,
+        rows=args.rows,
+        vendors=args.vendors,
+        invoice_pool=args.invoice_pool,
+        scanned_invoice_share=args.scanned_share,
+        text_invoice_share=max(0.0, 0.9 - args.scanned_share),
+        seed=args.seed,
+    )
+    settings = BenchmarkSettings(
+        openai_latency_ms=args.openai_latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        rag_latency_ms=args.rag_latency_ms,
+        jitter_ms=args.jitter_ms,
+        rag_enabled=not args.no_rag,
+        cascade=args.cascade,
+    )
+
+    with tempfile.TemporaryDirectory(prefix="refund_bench_") as tmp:
+        work_dir = args.work_dir or Path(tmp)
+        config_path = generate_workload(work_dir, spec)
+        baseline = previous_result(args.scenario, args.results)
+        result = run_benchmark(
+            config_path,
+            spec.dataset_id,
+            work_dir=work_dir,
+            settings=settings,
+            scenario=args.scenario,
+        )
+    result["workload"] = spec.__dict__
+    append_result(result, args.results)
+
+    print(json.dumps(result, indent=2, default=str))
+    if baseline:
+        print(json.dumps({"comparison": compare_results(baseline, result)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
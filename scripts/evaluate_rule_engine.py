@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Measure rule-engine coverage and precision against Phase 2 human decisions.
+
+Usage:
+    python scripts/evaluate_rule_engine.py [path_to_master_file]
+
+Replays every row of the Phase 2 Master Refunds "Refund Summary" sheet through
+the rule engine and compares the rows it decides with the analysts' claim
+decision, tax category, refund basis and methodology. The vendor profiles are
+built from the same file, so this is an in-sample check of the fast path.
+"""
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import openpyxl
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from refund_engine.analysis.rule_engine import LabelledRow, evaluate_rules
+
+
+def _text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _labelled_rows(master_path: str):
+    wb = openpyxl.load_workbook(master_path, read_only=True, data_only=True)
+    try:
+        ws = wb["Refund Summary"]
+        # Columns (1-based): A=1 Vendor, C=3 Claim, V=22 Tax Paid, Y=25 Methodology,
+        # AG=33 Description, AI=35 Tax Category, AK=37 Refund Basis
+        for values in ws.iter_rows(min_row=2, max_col=37, values_only=True):
+            vendor = _text(values[0])
+            if not vendor:
+                continue
+            try:
+                tax_paid = float(values[21]) if values[21] is not None else None
+            except (TypeError, ValueError):
+                tax_paid = None
+            yield LabelledRow(
+                vendor=vendor.upper(),
+                description=_text(values[32]),
+                tax_amount=tax_paid,
+                claimed="Y" in _text(values[2]),
+                tax_category=_text(values[34]),
+                refund_basis=_text(values[36]),
+                methodology=_text(values[24]),
+            )
+    finally:
+        wb.close()
+
+
+if __name__ == "__main__":
+    default_master = str(
+        Path.home() / "Downloads" / "Phase 2 Master Refunds Jun 15 2025.xlsx"
+    )
+    master = sys.argv[1] if len(sys.argv) > 1 else default_master
+    print(f"Reading {master}...")
+    print(json.dumps(evaluate_rules(_labelled_rows(master)), indent=2))
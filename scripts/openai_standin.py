@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Local OpenAI-compatible stand-in for load testing.
+
+Usage:
+    python scripts/openai_standin.py --port 8765 --latency-ms 800 --distribution lognormal --rate-429 0.05
+    export OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+
+Serves /v1/responses (schema-valid analysis JSON) and /v1/embeddings
+(deterministic vectors) with realistic usage counts. The engine's OpenAI
+client picks it up through OPENAI_BASE_URL; any OPENAI_API_KEY works.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from refund_engine.openai_standin import LATENCY_DISTRIBUTIONS, StandInServer, StandInSettings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Spread for --distribution uniform")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Spread for --distribution lognormal")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embedding-dims", type=int, default=1536)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429s")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests that hang")
+    parser.add_argument("--timeout-ms", type=float, default=120_000.0, help="How long hung requests hang")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = StandInSettings(
+        latency_ms=args.latency_ms,
+        distribution=args.distribution,
+        jitter_ms=args.jitter_ms,
+        sigma=args.sigma,
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_dims=args.embedding_dims,
+        rate_429=args.rate_429,
+        retry_after_s=args.retry_after,
+        timeout_rate=args.timeout_rate,
+        timeout_ms=args.timeout_ms,
+        seed=args.seed,
+    )
+    server = StandInServer((args.host, args.port), settings)
+    print(f"OpenAI stand-in listening; export OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stats: {server.stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import refund_engine.analysis_jobs as analysis_jobs
+from refund_engine import workbook_catalog as catalog
+from refund_engine.analysis_jobs import AnalysisJobRunner, get_job, job_events, job_row_deltas
+from refund_engine.benchmarking import BenchmarkSettings, build_fake_analyzer
+from refund_engine.web_analysis import ColumnMapping
+
+
+MAPPING = ColumnMapping(
+    vendor="Vendor",
+    tax_amount="Tax",
+    description="Description",
+    invoice_1="Invoice",
+    analysis_col="Notes",
+)
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Vendor": ["Acme Cloud", "Globex", "Initech"],
+            "Tax": [120.0, 45.5, 980.0],
+            "Description": ["Hosting services", "Consulting", "Server hardware"],
+            "Invoice": ["a.pdf", "b.pdf", "c.pdf"],
+            "Notes": [None, None, None],
+        }
+    )
+
+
+def _wait_until_finished(job_id: str, root: Path, timeout_s: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        job = get_job(job_id, root=root)
+        if job["status"] in analysis_jobs.FINISHED_STATUSES:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def _submit(runner: AnalysisJobRunner, tmp_path: Path) -> str:
+    return runner.submit(
+        _frame(),
+        workbook_id="wb",
+        version_id="v1",
+        sheet_name="Data",
+        mapping=MAPPING,
+        row_indices=[0, 1, 2],
+        invoice_dir=str(tmp_path),
+        use_cache=False,
+    )
+
+
+def test_job_results_persist_and_stale_jobs_are_interrupted(tmp_path: Path):
+    analyzer, _, _ = build_fake_analyzer(BenchmarkSettings())
+    runner = AnalysisJobRunner(tmp_path, analyzer_factory=lambda **_: analyzer)
+    job_id = _submit(runner, tmp_path)
+
+    job = _wait_until_finished(job_id, tmp_path)
+    runner.shutdown()
+    assert job["status"] == "completed"
+    assert job["done_rows"] == 3
+    events = job_events(job_id, root=tmp_path)
+    assert [item["event"]["row_index"] for item in events] == [0, 1, 2]
+    assert job_events(job_id, root=tmp_path, after_seq=2)[0]["seq"] == 3
+
+    # A fresh runner (e.g. after an app restart) still sees the results.
+    deltas = job_row_deltas(job_id, root=tmp_path)
+    assert sorted(deltas) == [0, 1, 2]
+    assert all(delta["Final_Decision"] for delta in deltas.values())
+    assert all("INVOICE VERIFIED" in delta["Notes"] for delta in deltas.values())
+
+    with catalog.connect(tmp_path, write=True) as conn:
+        for job, heartbeat_at in (("stale", time.time() - 3600), ("live", time.time())):
+            conn.execute(
+                """
+                INSERT INTO analysis_jobs (
+                    job_id, workbook_id, version_id, sheet_name, status, total_rows,
+                    params_json, worker_pid, runner_token, heartbeat_at, created_at
+                ) VALUES (?, 'wb', 'v1', 'Data', 'running', 3, '{}', ?, ?, ?, '2026-01-01T00:00:00')
+                """,
+                (job, os.getpid(), f"other-{job}", heartbeat_at),
+            )
+    AnalysisJobRunner(tmp_path).shutdown()
+    assert get_job("stale", root=tmp_path)["status"] == "interrupted"
+    # Another process's runner is still heartbeating its job.
+    assert get_job("live", root=tmp_path)["status"] == "running"
+    assert get_job(job_id, root=tmp_path)["status"] == "completed"
+
+    # A runner finishing late does not reopen a job that was closed out.
+    runner._finish("stale", "completed")
+    assert get_job("stale", root=tmp_path)["status"] == "interrupted"
+
+
+class _GatedAnalyzer:
+    def __init__(self, inner):
+        self.inner = inner
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def analyze_row(self, evidence, **kwargs):
+        self.started.set()
+        self.gate.wait(5)
+        return self.inner.analyze_row(evidence, **kwargs)
+
+    def repair_row(self, evidence, metadata, validation_errors):
+        return self.inner.repair_row(evidence, metadata, validation_errors)
+
+
+def test_cancel_stops_job_after_current_row(tmp_path: Path):
+    analyzer = _GatedAnalyzer(build_fake_analyzer(BenchmarkSettings())[0])
+    runner = AnalysisJobRunner(tmp_path, analyzer_factory=lambda **_: analyzer)
+    job_id = _submit(runner, tmp_path)
+
+    assert analyzer.started.wait(5)
+    assert runner.cancel(job_id)
+    analyzer.gate.set()
+
+    job = _wait_until_finished(job_id, tmp_path)
+    runner.shutdown()
+    assert job["status"] == "cancelled"
+    assert job["done_rows"] == 1
+    assert not runner.cancel(job_id)
+
+
+def test_job_deltas_skip_an_analysis_column_the_sheet_lacks(tmp_path: Path):
+    analyzer, _, _ = build_fake_analyzer(BenchmarkSettings())
+    runner = AnalysisJobRunner(tmp_path, analyzer_factory=lambda **_: analyzer)
+    job_id = runner.submit(
+        _frame().drop(columns=["Notes"]),
+        workbook_id="wb",
+        version_id="v1",
+        sheet_name="Data",
+        mapping=MAPPING,
+        row_indices=[0],
+        invoice_dir=str(tmp_path),
+        use_cache=False,
+    )
+
+    assert _wait_until_finished(job_id, tmp_path)["status"] == "completed"
+    runner.shutdown()
+    delta = job_row_deltas(job_id, root=tmp_path)[0]
+    assert delta["Final_Decision"]
+    assert "Notes" not in delta
+
+
+def test_runner_heartbeats_its_active_jobs(tmp_path: Path):
+    analyzer, _, _ = build_fake_analyzer(BenchmarkSettings())
+    gated = _GatedAnalyzer(analyzer)
+    runner = AnalysisJobRunner(tmp_path, analyzer_factory=lambda **_: gated, heartbeat_interval_s=0.05)
+    job_id = _submit(runner, tmp_path)
+    assert gated.started.wait(5)
+    first = get_job(job_id, root=tmp_path)["heartbeat_at"]
+
+    deadline = time.monotonic() + 5
+    while get_job(job_id, root=tmp_path)["heartbeat_at"] == first and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert get_job(job_id, root=tmp_path)["heartbeat_at"] > first
+    assert analysis_jobs.mark_interrupted_jobs(root=tmp_path, stale_after_s=5.0) == 0
+
+    gated.gate.set()
+    assert _wait_until_finished(job_id, tmp_path)["status"] == "completed"
+    runner.shutdown()
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import refund_engine.pipeline as pipeline
+from refund_engine.benchmarking import (
+    BenchmarkSettings,
+    WorkloadSpec,
+    append_result,
+    compare_results,
+    generate_workload,
+    previous_result,
+    run_benchmark,
+    text_pdf_bytes,
+)
+from refund_engine.fake_services import PromptCacheModel
+from refund_engine.invoice_text import extract_invoice_text
+
+
+def test_text_pdf_has_extractable_text(tmp_path: Path):
+    path = tmp_path / "invoice.pdf"
+    path.write_bytes(text_pdf_bytes([f"Line {i}: cloud hosting subscription services" for i in range(8)]))
+
+    result = extract_invoice_text(path, max_pages=1)
+
+    assert result.method == "pdf_text"
+    assert "cloud hosting" in result.text
+
+
+def test_run_benchmark_against_fakes(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(pipeline, "RUNS_DIR", tmp_path / "runs")
+    spec = WorkloadSpec(rows=8, vendors=3, invoice_pool=4, extra_columns=3)
+    config_path = generate_workload(tmp_path / "workload", spec)
+
+    result = run_benchmark(
+        config_path,
+        spec.dataset_id,
+        work_dir=tmp_path / "work",
+        settings=BenchmarkSettings(openai_latency_ms=1.0),
+        scenario="smoke",
+    )
+
+    assert result["rows"] == 8
+    assert result["status_counts"]["ok"] == 8
+    assert result["fake_calls"]["responses"] == 8
+    assert result["rows_per_sec"] > 0
+    assert result["memory"]["result_rows"] == 8
+    assert result["stages"]["openai.responses"]["p50_ms"] >= 1.0
+    # Run logs stay in the work directory.
+    assert not (tmp_path / "runs").exists()
+    assert len(list((tmp_path / "work" / "runs").glob("*.jsonl"))) == 1
+
+    results_path = tmp_path / "results.jsonl"
+    append_result(result, results_path)
+    faster = {**result, "rows_per_sec": result["rows_per_sec"] * 2}
+    comparison = compare_results(previous_result("smoke", results_path), faster)
+    assert comparison["rows_per_sec_pct"] == 100.0
+
+
+def test_prompt_cache_model_reports_shared_prefix():
+    cache = PromptCacheModel(min_tokens=8, block_tokens=4, chars_per_token=1)
+    prefix = "static instructions " * 2
+
+    assert cache.cached_tokens(prefix + "row one") == 0
+    assert cache.cached_tokens(prefix + "row two") == 44
+    assert cache.cached_tokens("short") == 0
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import pytest
+
+from refund_engine.analysis.cascade import CascadeAnalyzer, summarize_cascade
+from refund_engine.analysis.openai_analyzer import RowEvidence, build_output_row
+from refund_engine.config import CascadeSettings, ModelPricing
+from refund_engine.fake_services import fake_analysis_payload
+
+
+class ScriptedAnalyzer:
+    """Answers with a fixed decision/confidence per model."""
+
+    model = "analysis-model"
+    reasoning_effort = "medium"
+
+    def __init__(self, answers: dict[str, tuple[str, float]]):
+        self.answers = answers
+        self.calls: list[tuple[str, str]] = []
+        self.contexts = 0
+
+    def prepare_context(self, evidence):
+        self.contexts += 1
+        return object()
+
+    def analyze_row(self, evidence, *, context, model, reasoning_effort):
+        self.calls.append((model, reasoning_effort))
+        decision, confidence = self.answers[model]
+        payload = fake_analysis_payload(
+            f"- vendor: {evidence.vendor}\n- description: {evidence.description}\n- tax_amount: {evidence.tax_amount}\n"
+        )
+        payload.update(
+            final_decision=decision,
+            confidence=confidence,
+            citation="WAC 458-20-19402",
+            refund_basis="OOS services",
+            methodology="User location",
+            follow_up_questions="Which sites used the service during 2024?",
+        )
+        metadata = {"model": model, "input_tokens": 1000, "cached_tokens": 200, "output_tokens": 100}
+        return build_output_row(payload, evidence), metadata
+
+
+SETTINGS = CascadeSettings(
+    accept_confidence=0.85,
+    fast_max_tax_amount=500.0,
+    pro_min_tax_amount=25000.0,
+    fast_reasoning_effort="low",
+    pro_reasoning_effort="high",
+    pricing={"fast": ModelPricing(1.0, 0.1, 4.0)},
+)
+
+
+def _evidence(tax_amount: float) -> RowEvidence:
+    return RowEvidence(
+        dataset_id="use_tax_2024",
+        row_index=1,
+        vendor="ACME",
+        description="Cloud hosting",
+        tax_amount=tax_amount,
+        tax_base=None,
+        invoice_number="INV-1",
+        po_number=None,
+        invoice_1=None,
+        invoice_2=None,
+    )
+
+
+def _cascade(answers, monkeypatch) -> tuple[CascadeAnalyzer, ScriptedAnalyzer]:
+    monkeypatch.setenv("OPENAI_MODEL_FAST", "fast-model")
+    monkeypatch.setenv("OPENAI_MODEL_PRO", "pro-model")
+    analyzer = ScriptedAnalyzer(answers)
+    return CascadeAnalyzer(analyzer, SETTINGS), analyzer
+
+
+def test_cascade_accepts_confident_fast_answer(monkeypatch):
+    cascade, analyzer = _cascade({"fast-model": ("REFUND", 0.92)}, monkeypatch)
+
+    result, metadata = cascade.analyze_row(_evidence(120.0))
+
+    assert result["Final_Decision"] == "REFUND"
+    assert analyzer.calls == [("fast-model", "low")]
+    assert metadata["cascade"]["final_tier"] == "fast"
+
+
+def test_cascade_escalates_conflicts_and_high_dollar_rows(monkeypatch):
+    answers = {
+        "fast-model": ("REFUND", 0.6),
+        "analysis-model": ("NO REFUND", 0.9),
+        "pro-model": ("NO REFUND", 0.95),
+    }
+    cascade, analyzer = _cascade(answers, monkeypatch)
+
+    _, conflicted = cascade.analyze_row(_evidence(120.0))
+    _, mid = cascade.analyze_row(_evidence(5000.0))
+    _, high = cascade.analyze_row(_evidence(40000.0))
+
+    assert [record["tier"] for record in conflicted["cascade"]["tiers"]] == ["fast", "analysis", "pro"]
+    assert conflicted["cascade"]["tiers"][1]["reason"] == "conflict"
+    assert [record["tier"] for record in mid["cascade"]["tiers"]] == ["analysis"]
+    assert high["cascade"]["tiers"][0]["reason"] == "high_dollar"
+    assert high["cascade"]["final_tier"] == "pro"
+    assert analyzer.contexts == 3
+
+    summary = summarize_cascade([conflicted, mid, high], SETTINGS.pricing)
+    assert summary["rows"] == 3
+    assert summary["tiers"]["pro"]["accepted_rows"] == 2
+    assert summary["tiers"]["analysis"]["calls"] == 3
+    assert summary["tiers"]["fast"]["cost_usd"] == round((800 * 1.0 + 200 * 0.1 + 100 * 4.0) / 1e6, 6)
+    assert summary["tiers"]["analysis"]["cost_usd"] is None
+
+
+def test_cascade_escalates_when_a_tier_fails(monkeypatch):
+    cascade, analyzer = _cascade(
+        {"analysis-model": ("REFUND", 0.9), "pro-model": ("NO REFUND", 0.95)},
+        monkeypatch,
+    )
+    scripted = analyzer.analyze_row
+
+    def analyze_row(evidence, *, context, model, reasoning_effort):
+        if model == "fast-model":
+            analyzer.calls.append((model, reasoning_effort))
+            raise ValueError("Model output did not contain a JSON object")
+        return scripted(evidence, context=context, model=model, reasoning_effort=reasoning_effort)
+
+    analyzer.analyze_row = analyze_row
+
+    result, metadata = cascade.analyze_row(_evidence(120.0))
+
+    assert result["Final_Decision"] == "REFUND"
+    assert metadata["cascade"]["final_tier"] == "analysis"
+    fast = metadata["cascade"]["tiers"][0]
+    assert (fast["outcome"], fast["reason"]) == ("escalated", "error")
+    assert "JSON" in fast["error"]
+
+    del analyzer.answers["pro-model"]
+    with pytest.raises(KeyError):
+        cascade.analyze_row(_evidence(40000.0))
+    assert summarize_cascade([metadata])["tiers"]["fast"]["calls"] == 1
+
+
+def test_cascade_charges_repair_usage_to_the_final_tier(monkeypatch):
+    cascade, analyzer = _cascade({"fast-model": ("REFUND", 0.92)}, monkeypatch)
+    analyzer.repair_row = lambda evidence, metadata, errors: (
+        {},
+        {**metadata, "repair": {"input_tokens": 300, "cached_tokens": 0, "output_tokens": 50}},
+    )
+
+    _, metadata = cascade.analyze_row(_evidence(120.0))
+    _, repaired = cascade.repair_row(_evidence(120.0), metadata, ["Confidence missing"])
+
+    assert metadata["cascade"]["tiers"][0]["input_tokens"] == 1000
+    fast = repaired["cascade"]["tiers"][0]
+    assert (fast["input_tokens"], fast["output_tokens"], fast["repaired"]) == (1300, 150, True)
+    summary = summarize_cascade([repaired], SETTINGS.pricing)
+    assert summary["tiers"]["fast"]["calls"] == 1
+    assert summary["tiers"]["fast"]["cost_usd"] == round((1100 * 1.0 + 200 * 0.1 + 150 * 4.0) / 1e6, 6)
+
+
+def test_fast_review_does_not_count_as_a_conflict(monkeypatch):
+    cascade, analyzer = _cascade(
+        {"fast-model": ("REVIEW", 0.9), "analysis-model": ("REFUND", 0.9)},
+        monkeypatch,
+    )
+
+    result, metadata = cascade.analyze_row(_evidence(120.0))
+
+    assert result["Final_Decision"] == "REFUND"
+    assert metadata["cascade"]["final_tier"] == "analysis"
+    assert [model for model, _ in analyzer.calls] == ["fast-model", "analysis-model"]
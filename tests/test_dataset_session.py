@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from dataclasses import replace
+import os
+from pathlib import Path
+
+from openpyxl import Workbook
+import pandas as pd
+
+from refund_engine.benchmarking import WorkloadSpec, generate_workload
+import refund_engine.dataset_session as dataset_session
+from refund_engine.dataset_session import DatasetSession
+from refund_engine.datasets import get_dataset_config, iter_source_chunks, read_source_dataframe
+import refund_engine.pipeline as pipeline
+from refund_engine.pipeline import AnalyzeOptions, analyze_dataset
+
+
+def _write_source(path: Path, rows: list[list]):
+    config = get_dataset_config("use_tax_2024")
+    cols = config.columns
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "2024"
+    ws.append([cols.vendor, cols.tax_amount, cols.invoice_1, cols.analysis_col, "INDICATOR"])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return replace(config, source_file=path)
+
+
+def _count_reads(monkeypatch) -> list[int]:
+    calls: list[int] = []
+    original = dataset_session.read_source_dataframe
+
+    def counting(config):
+        calls.append(1)
+        return original(config)
+
+    monkeypatch.setattr(dataset_session, "read_source_dataframe", counting)
+    return calls
+
+
+def test_session_reads_source_once_and_reuses_snapshot(tmp_path: Path, monkeypatch):
+    calls = _count_reads(monkeypatch)
+    config = _write_source(
+        tmp_path / "source.xlsx",
+        [["A", 10, "a.pdf", None, "Remit"], ["B", 20, "b.pdf", "done", "Remit"]],
+    )
+
+    session = DatasetSession(config, snapshot_dir=tmp_path / "cache")
+    assert len(session.source_frame()) == 2
+    assert list(session.unanalyzed_frame().index) == [0]
+    assert session.source_frame() is session.source_frame()
+    assert len(calls) == 1
+
+    # A second invocation against the unchanged file loads the snapshot.
+    again = DatasetSession(config, snapshot_dir=tmp_path / "cache")
+    assert again.source_frame()[config.columns.vendor].tolist() == ["A", "B"]
+    assert len(calls) == 1
+
+
+def test_session_reloads_when_source_changes(tmp_path: Path, monkeypatch):
+    calls = _count_reads(monkeypatch)
+    path = tmp_path / "source.xlsx"
+    config = _write_source(path, [["A", 10, "a.pdf", None, "Remit"]])
+    session = DatasetSession(config, snapshot_dir=tmp_path / "cache")
+    session.source_frame()
+
+    _write_source(path, [["A", 10, "a.pdf", None, "Remit"], ["B", 20, "b.pdf", None, "Remit"]])
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert list(session.unanalyzed_frame().index) == [0, 1]
+    assert len(calls) == 2
+    assert len(list((tmp_path / "cache").glob("*.pkl"))) == 1
+
+
+def test_source_chunks_match_the_whole_frame(tmp_path: Path):
+    config = _write_source(
+        tmp_path / "source.xlsx",
+        [
+            ["A", 10, "a.pdf", None, "Remit"],
+            ["B", 20, "b.pdf", None, "Other"],
+            [None, None, None, None, "Remit"],
+            ["C", "$1,200", "c.pdf", "done", "Remit"],
+            ["D", 40, "d.pdf", None, "Remit"],
+            [None, None, None, None, None],
+        ],
+    )
+    whole = read_source_dataframe(config)
+    chunks = list(iter_source_chunks(config, 2))
+
+    assert [list(chunk.index) for chunk in chunks] == [[0, 2], [3, 4]]
+    pd.testing.assert_frame_equal(pd.concat(chunks), whole)
+    assert chunks[-1].attrs["source_rows"] == whole.attrs["source_rows"] == 5
+
+    # A session with the frame loaded slices it instead of re-reading.
+    session = DatasetSession(config, snapshot_dir=None)
+    session.source_frame()
+    assert [list(chunk.index) for chunk in session.source_chunks(3)] == [[0, 2, 3], [4]]
+
+
+def test_chunked_analysis_selects_across_chunks(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(pipeline, "RUNS_DIR", tmp_path / "runs")
+    spec = WorkloadSpec(rows=7, vendors=2, invoice_pool=4)
+    config_path = generate_workload(tmp_path / "workload", spec)
+    options = AnalyzeOptions(
+        dataset_id=spec.dataset_id,
+        limit=5,
+        dry_run=True,
+        chunk_rows=2,
+        ledger_path=tmp_path / "ledger.sqlite3",
+        config_path=config_path,
+    )
+    session = DatasetSession.open(spec.dataset_id, config_path=config_path, snapshot_dir=None)
+    summary = analyze_dataset(options, session=session)
+
+    assert summary["selected_rows"] == 5
+    assert summary["chunked"]["chunks"] == 3
+    assert "source_rows" not in summary["preflight"]["stats"]
+    # Nothing was loaded whole.
+    assert session._source is None
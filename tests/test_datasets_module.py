@@ -1,12 +1,23 @@
 from __future__ import annotations
 
+from dataclasses import replace
+from pathlib import Path
+
+from openpyxl import Workbook
 import pandas as pd
 
 from refund_engine.datasets import (
     coerce_float,
+    convert_source_to_parquet,
     filter_unanalyzed_rows,
     get_dataset_config,
+    iter_source_chunks,
+    iter_source_rows,
+    iter_typed_rows,
     load_datasets_config,
+    projected_columns,
+    read_excel_dataframe,
+    read_source_dataframe,
     select_rows,
 )
 
@@ -64,3 +75,121 @@ def test_select_rows_vendor_and_amount_filters():
 def test_coerce_float_handles_currency_strings():
     assert coerce_float("$1,234.56") == 1234.56
     assert coerce_float("") is None
+
+
+def test_read_source_dataframe_projects_columns_and_keeps_row_positions(tmp_path: Path):
+    config = get_dataset_config("use_tax_2024")
+    cols = config.columns
+    headers = [cols.vendor, "Unused 1", cols.tax_amount, cols.invoice_1, cols.analysis_col, "INDICATOR", "Unused 2"]
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "2024"
+    ws.append([f" {headers[0]} "] + headers[1:])
+    ws.append(["A", "x", 10, "a.pdf", None, "Remit", "y"])
+    ws.append(["B", "x", 20, "b.pdf", None, "Skip", "y"])
+    ws.append([None] * len(headers))
+    ws.append(["C", "x", 30.5, "c.pdf", None, "Remit", "y"])
+    ws.append([None] * len(headers))
+    path = tmp_path / "source.xlsx"
+    wb.save(path)
+    config = replace(config, source_file=path)
+
+    df = read_source_dataframe(config)
+
+    assert "Unused 1" not in df.columns and "Unused 2" not in df.columns
+    assert set(df.columns) <= set(projected_columns(config))
+    assert list(df.index) == [0, 3]
+    assert df[cols.vendor].tolist() == ["A", "C"]
+    assert df[cols.tax_amount].tolist() == [10, 30.5]
+    assert df.attrs["source_rows"] == len(read_excel_dataframe(path, "2024"))
+    assert list(filter_unanalyzed_rows(df, config).index) == [0, 3]
+
+
+def test_source_columns_are_typed_once_at_load(tmp_path: Path):
+    config = get_dataset_config("use_tax_2024")
+    cols = config.columns
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "2024"
+    ws.append([cols.vendor, cols.tax_amount, cols.invoice_1, cols.analysis_col, "INDICATOR"])
+    ws.append(["  Acme  ", "$1,250.50", "a.pdf ", "   ", "Remit"])
+    ws.append(["Globex", 75, "b.pdf", "done", "Remit"])
+    ws.append(["Initech", "n/a", "  ", None, "Remit"])
+    path = tmp_path / "source.xlsx"
+    wb.save(path)
+    config = replace(config, source_file=path)
+
+    df = read_source_dataframe(config)
+
+    assert df[cols.tax_amount].dtype == "float64"
+    assert df[cols.vendor].dtype == "string"
+    assert df[cols.tax_amount].tolist()[:2] == [1250.5, 75.0]
+    assert df[cols.analysis_col].isna().tolist() == [True, False, True]
+    assert list(filter_unanalyzed_rows(df, config).index) == [0]
+
+    rows = dict(iter_typed_rows(df, config))
+    assert rows[0]["vendor"] == "Acme"
+    assert rows[0]["invoice_1"] == "a.pdf"
+    assert rows[2]["tax_amount"] is None
+    assert rows[2]["invoice_1"] == ""
+
+
+def _excel_source(tmp_path: Path):
+    config = get_dataset_config("use_tax_2024")
+    cols = config.columns
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "2024"
+    ws.append([cols.vendor, "Unused", cols.tax_amount, cols.invoice_1, cols.po_number, "INDICATOR"])
+    ws.append(["A", "x", 10, "a.pdf", "0042", "Remit"])
+    ws.append(["B", 1, "$20", "b.pdf", "0043", "Skip"])
+    ws.append([None] * 6)
+    ws.append(["C", "x", 30.5, "c.pdf", "0044", "Remit"])
+    ws.append(["D", "x", 40, "d.pdf", "0045", "Remit"])
+    path = tmp_path / "source.xlsx"
+    wb.save(path)
+    return replace(config, source_file=path)
+
+
+def test_columnar_sources_match_the_excel_source(tmp_path: Path):
+    config = _excel_source(tmp_path)
+    cols = config.columns
+    expected = read_source_dataframe(config)
+
+    parquet = tmp_path / "source.parquet"
+    assert convert_source_to_parquet(config, parquet)["rows"] == 5
+    table = pd.read_parquet(parquet)
+    table.to_csv(tmp_path / "source.csv", index=False)
+    table.to_feather(tmp_path / "source.arrow")
+
+    for name in ("source.parquet", "source.csv", "source.arrow"):
+        source = replace(config, source_file=tmp_path / name, dtypes=((cols.po_number, "string"),))
+        df = read_source_dataframe(source)
+        pd.testing.assert_frame_equal(df, expected, check_index_type=False)
+        assert df.attrs["source_rows"] == 5
+
+    # Without the dtype hint the CSV reader parses "0042" as a number.
+    unhinted = read_source_dataframe(replace(config, source_file=tmp_path / "source.csv"))
+    assert unhinted[cols.po_number].tolist()[0] != "0042"
+
+    rows = list(iter_source_rows(replace(config, source_file=parquet)))
+    assert rows[0][:2] == (cols.vendor, "Unused")
+    assert rows[3] == (None,) * 6
+
+
+def test_partitioned_source_keeps_row_positions_across_files(tmp_path: Path):
+    config = _excel_source(tmp_path)
+    expected = read_source_dataframe(config)
+    table = read_excel_dataframe(config.source_file, "2024")
+    (tmp_path / "parts").mkdir()
+    table.iloc[:2].astype(str).to_parquet(tmp_path / "parts" / "part-0.parquet", index=False)
+    table.iloc[2:].astype(str).to_parquet(tmp_path / "parts" / "part-1.parquet", index=False)
+    source = replace(config, source_file=tmp_path / "parts" / "part-*.parquet")
+
+    df = read_source_dataframe(source)
+    assert list(df.index) == list(expected.index) == [0, 3, 4]
+    assert df[config.columns.vendor].tolist() == ["A", "C", "D"]
+
+    chunks = list(iter_source_chunks(source, 2))
+    assert [list(chunk.index) for chunk in chunks] == [[0], [3], [4]]
+    assert chunks[-1].attrs["source_rows"] == 5
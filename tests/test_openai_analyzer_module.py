@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 from refund_engine.analysis.openai_analyzer import (
+    ANALYSIS_PROMPT_PREFIX,
     InvoiceEvidence,
+    OpenAIAnalyzer,
     RowEvidence,
     _analysis_prompt,
     _parse_json_object,
-    _to_output_row,
+    build_output_row,
 )
+from refund_engine.fake_services import FakeOpenAIClient
 from refund_engine.rag import RAGChunk, RAGContext
 
 
@@ -16,7 +19,7 @@ def test_parse_json_object_handles_embedded_json():
     assert parsed["final_decision"] == "REVIEW"
 
 
-def test_to_output_row_builds_reasoning_with_token():
+def test_build_output_row_builds_reasoning_with_token():
     payload = {
         "invoice_number": "INV-1",
         "invoice_date": "2026-01-01",
@@ -56,7 +59,7 @@ def test_to_output_row_builds_reasoning_with_token():
         ),
         invoice_2=None,
     )
-    output = _to_output_row(payload, evidence)
+    output = build_output_row(payload, evidence)
     assert output["Final_Decision"] == "NO REFUND"
     assert output["Tax_Category"] == "Services"
     assert output["Methodology"] == "Non-taxable"
@@ -209,3 +212,67 @@ def test_analysis_prompt_includes_line_item_matching():
     prompt = _analysis_prompt(evidence)
     assert "Line item matching guidance:" in prompt
     assert "$10,000.00" in prompt
+
+
+def test_analysis_prompt_starts_with_static_prefix():
+    def evidence(row_index: int, vendor: str) -> RowEvidence:
+        return RowEvidence(
+            dataset_id="sales_tax_2024",
+            row_index=row_index,
+            vendor=vendor,
+            description="Cloud service",
+            tax_amount=1000.0,
+            tax_base=None,
+            invoice_number="INV-1",
+            po_number="PO-1",
+            invoice_1=None,
+            invoice_2=None,
+        )
+
+    first = _analysis_prompt(evidence(1, "ACME"), guidance="fix citation")
+    second = _analysis_prompt(evidence(2, "Globex"), vendor_profile="Globex profile")
+
+    assert first.startswith(ANALYSIS_PROMPT_PREFIX)
+    assert second.startswith(ANALYSIS_PROMPT_PREFIX)
+    assert "Required JSON fields and types:" in ANALYSIS_PROMPT_PREFIX
+    assert "- vendor:" not in ANALYSIS_PROMPT_PREFIX
+    assert first.index("Row context:") > len(ANALYSIS_PROMPT_PREFIX)
+    assert second.index("Historical vendor profile:") < second.index("Row context:")
+
+
+def test_repair_row_continues_previous_response(monkeypatch):
+    monkeypatch.setenv("RAG_ENABLED", "false")
+    client = FakeOpenAIClient()
+    requests: list[dict] = []
+    create = client.responses.create
+
+    def recording_create(**kwargs):
+        requests.append(kwargs)
+        return create(**kwargs)
+
+    monkeypatch.setattr(client.responses, "create", recording_create)
+    analyzer = OpenAIAnalyzer(client=client, rag_retriever=None)
+    evidence = RowEvidence(
+        dataset_id="sales_tax_2024",
+        row_index=3,
+        vendor="ACME",
+        description="Cloud service",
+        tax_amount=1000.0,
+        tax_base=None,
+        invoice_number="INV-1",
+        po_number="PO-1",
+        invoice_1=None,
+        invoice_2=None,
+    )
+
+    _, metadata = analyzer.analyze_row(evidence)
+    result, repaired = analyzer.repair_row(evidence, metadata, ["Citation is required"])
+
+    repair_request = requests[-1]
+    assert repair_request["previous_response_id"] == metadata["response_id"]
+    assert "Citation is required" in repair_request["input"]
+    assert "Row context:" not in repair_request["input"]
+    assert repaired["response_id"] == metadata["response_id"]
+    assert repaired["repair"]["response_id"] != metadata["response_id"]
+    assert repaired["repair"]["input_tokens"] < metadata["input_tokens"]
+    assert result["Final_Decision"]
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import openai
+import pytest
+
+from refund_engine.config import OpenAISettings
+from refund_engine.openai_client import create_openai_client
+from refund_engine.openai_standin import StandInSettings, running_standin
+
+
+def _settings(base_url: str) -> OpenAISettings:
+    return OpenAISettings(
+        api_key="test-key",
+        base_url=base_url,
+        model_analysis="gpt-5.2",
+        model_fast="gpt-5.2-mini",
+        model_pro="gpt-5.2-pro",
+        embedding_model="text-embedding-3-small",
+        reasoning_effort="medium",
+        text_verbosity="medium",
+    )
+
+
+def test_client_talks_to_standin_through_base_url():
+    with running_standin(StandInSettings(embedding_dims=8)) as server:
+        client = create_openai_client(settings=_settings(server.base_url))
+
+        response = client.responses.create(
+            model="gpt-5.2",
+            input="Row:\n- vendor: Acme Cloud\n- tax_amount: 120.00\n",
+            reasoning={"effort": "medium"},
+        )
+        first = client.embeddings.create(model="text-embedding-3-small", input="hosting")
+        second = client.embeddings.create(model="text-embedding-3-small", input="hosting")
+
+        assert '"final_decision"' in response.output_text
+        assert response.usage.input_tokens > 0
+        assert response.usage.input_tokens_details.cached_tokens == 0
+        assert len(first.data[0].embedding) == 8
+        assert first.data[0].embedding == second.data[0].embedding
+        assert server.stats["responses"] == 1
+        assert server.stats["embeddings"] == 2
+
+
+def test_standin_rate_limits():
+    with running_standin(StandInSettings(rate_429=1.0, retry_after_s=0)) as server:
+        client = create_openai_client(settings=_settings(server.base_url)).with_options(max_retries=0)
+
+        with pytest.raises(openai.RateLimitError):
+            client.responses.create(model="gpt-5.2", input="hello")
+
+        assert server.stats["rate_limited"] == 1
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+from refund_engine.datasets import get_dataset_config
+from refund_engine.output_writer import IncrementalOutputWriter, apply_updates_to_output
+
+
+def _config(tmp_path: Path):
+    config = get_dataset_config("use_tax_2024")
+    source = tmp_path / "source.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "2024"
+    ws.append(["Vendor Name", "Tax Remit"])
+    ws.append(["A", 10])
+    ws.append(["B", 20])
+    ws["A2"].font = Font(bold=True)
+    notes = wb.create_sheet("Notes")
+    notes["A1"] = "keep"
+    notes["B1"] = "=1+1"
+    wb.save(source)
+    return replace(config, source_file=source, output_file=tmp_path / "out" / "output.xlsx")
+
+
+def test_apply_updates_to_output_patches_only_ai_columns(tmp_path: Path):
+    config = _config(tmp_path)
+
+    result = apply_updates_to_output(
+        config,
+        {1: {"Final_Decision": "REFUND", "Confidence": 0.9, "Not_A_Column": "x"}, 7: {"Final_Decision": "NO"}},
+    )
+
+    assert result["updated_rows"] == 1
+    assert result["skipped_rows"] == [7]
+    wb = load_workbook(config.output_file)
+    ws = wb["2024"]
+    headers = [cell.value for cell in ws[1]]
+    assert "Not_A_Column" not in headers
+    decision_col = headers.index("Final_Decision") + 1
+    assert ws.cell(row=3, column=decision_col).value == "REFUND"
+    assert ws.cell(row=2, column=decision_col).value is None
+    assert ws["A2"].font.bold
+    assert wb["Notes"]["B1"].value == "=1+1"
+
+
+def test_incremental_writer_flushes_in_batches(tmp_path: Path):
+    config = _config(tmp_path)
+    writer = IncrementalOutputWriter(config, flush_every=1, measure_memory=True)
+
+    writer.add(0, {"Final_Decision": "REFUND"})
+    assert config.output_file.exists()
+    writer.add(1, {"Final_Decision": "NO REFUND"})
+    summary = writer.close()
+
+    assert summary["updated_rows"] == 2
+    assert summary["flushes"] == 2
+    memory = writer.memory_report()
+    assert memory["result_rows"] == 1
+    assert memory["bytes_per_row"] > 0
+    ws = load_workbook(config.output_file)["2024"]
+    headers = [cell.value for cell in ws[1]]
+    col = headers.index("Final_Decision") + 1
+    assert [ws.cell(row=r, column=col).value for r in (2, 3)] == ["REFUND", "NO REFUND"]
+    assert not list(config.output_file.parent.glob(".*.tmp"))
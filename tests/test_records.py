@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import pickle
+
+from refund_engine.analysis.openai_analyzer import InvoiceEvidence, RowEvidence
+from refund_engine.constants import AI_OUTPUT_COLUMNS
+from refund_engine.records import ResultBatch, deep_sizeof
+
+
+def _result(i: int, decision: str) -> dict:
+    result = {column: f"{column} {i}" for column in AI_OUTPUT_COLUMNS}
+    # Build the string at runtime so it is a distinct object per row.
+    result["Final_Decision"] = "".join(list(decision))
+    return result
+
+
+def test_result_batch_round_trips_rows_and_pickles():
+    batch = ResultBatch()
+    batch.append(7, {"Final_Decision": "REFUND", "Notes": None})
+    batch.append(2, {"Final_Decision": "NO REFUND", "Citation": "WAC 458-20-15502"})
+    batch.append(7, {"Final_Decision": "REVIEW"})
+
+    assert len(batch) == 2 and 7 in batch and 3 not in batch
+    # Columns a row never had stay absent instead of becoming None.
+    assert dict(batch.items()) == {
+        7: {"Final_Decision": "REVIEW"},
+        2: {"Final_Decision": "NO REFUND", "Citation": "WAC 458-20-15502"},
+    }
+
+    copy = pickle.loads(pickle.dumps(batch))
+    assert dict(copy.items()) == dict(batch.items())
+    assert copy.row(2)["Final_Decision"] is batch.row(2)["Final_Decision"]
+
+
+def test_result_batch_interns_vocabulary_and_is_smaller_than_dicts():
+    rows = {i: _result(i, "NO REFUND") for i in range(500)}
+    batch = ResultBatch()
+    for i, result in rows.items():
+        batch.append(i, result)
+
+    decisions = batch.columns["Final_Decision"]
+    assert all(value is decisions[0] for value in decisions)
+    assert deep_sizeof(batch) < deep_sizeof(rows)
+
+
+def test_evidence_records_are_slotted_and_picklable():
+    evidence = RowEvidence(
+        dataset_id="ds",
+        row_index=4,
+        vendor="Acme",
+        description="Hosting",
+        tax_amount=12.5,
+        tax_base=None,
+        invoice_number="INV-1",
+        po_number="",
+        invoice_1=InvoiceEvidence("a.pdf", "/inv/a.pdf", "pdf_text", "text"),
+        invoice_2=None,
+    )
+    assert not hasattr(evidence, "__dict__")
+    assert pickle.loads(pickle.dumps(evidence)) == evidence
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from refund_engine.fake_services import FakeOpenAIClient
+from refund_engine.resources import SharedResources
+
+
+def test_analyzers_and_clients_are_shared_across_threads():
+    created = []
+
+    def client_factory():
+        created.append(FakeOpenAIClient())
+        return created[-1]
+
+    resources = SharedResources(
+        openai_client_factory=client_factory,
+        rag_factory=lambda **_: (None, "RAG disabled for test"),
+    )
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        analyzers = list(pool.map(lambda _: resources.analyzer(model="m", reasoning_effort="low"), range(16)))
+
+    assert len(created) == 1
+    assert all(analyzer is analyzers[0] for analyzer in analyzers)
+    other = resources.analyzer(model="other")
+    assert other is not analyzers[0]
+    assert other.client is analyzers[0].client
+    assert other.rag_retriever is None
+    assert other.rag_init_warning == "RAG disabled for test"
+    assert resources.health()["analyzers"] == 2
+
+
+def test_warm_up_loads_tables_and_reports_client_errors():
+    def failing_client():
+        raise ValueError("OPENAI_API_KEY is not set")
+
+    resources = SharedResources(openai_client_factory=failing_client, rag_factory=lambda **_: (None, None))
+    report = resources.warm_up()
+
+    assert not report["ok"]
+    assert "OPENAI_API_KEY" in report["errors"]["openai_client"]
+    assert report["rag"] == {"enabled": False, "warning": None}
+    assert report["tables"]["vendor_profiles"] > 0
+    assert report["tables"]["valid_rcws"] > 0
+    assert set(report["warm_up_ms"]) >= {"openai_client", "rate_table", "tax_rule_scenarios"}
+
+
+def test_failed_rag_setup_is_retried_after_a_backoff():
+    retriever = SimpleNamespace(rag_settings=SimpleNamespace(max_chunk_chars=300))
+    failure = (None, "RAG disabled due to setup error: timeout")
+    outcomes = [failure, (retriever, None)]
+    now = [0.0]
+    resources = SharedResources(
+        openai_client_factory=FakeOpenAIClient,
+        rag_factory=lambda **_: outcomes.pop(0),
+        rag_retry_s=60.0,
+        clock=lambda: now[0],
+    )
+
+    report = resources.warm_up()
+    assert not report["ok"]
+    assert "timeout" in report["errors"]["rag_retriever"]
+    # Within the backoff the failure is reused instead of calling the factory again.
+    now[0] = 30.0
+    assert resources.analyzer(model="m").rag_retriever is None
+    assert len(outcomes) == 1
+
+    now[0] = 61.0
+    assert resources.analyzer(model="m").rag_retriever is retriever
+    report = resources.health()
+    assert report["ok"]
+    assert report["rag"] == {"enabled": True, "warning": None}
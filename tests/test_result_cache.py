@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from pathlib import Path
+
+import refund_engine.pipeline as pipeline
+from refund_engine.analysis.openai_analyzer import InvoiceEvidence, RowEvidence
+from refund_engine.benchmarking import BenchmarkSettings, WorkloadSpec, build_fake_analyzer, generate_workload
+from refund_engine.dataset_session import DatasetSession
+from refund_engine.datasets import get_dataset_config
+from refund_engine.pipeline import AnalyzeOptions, analyze_dataset
+from refund_engine.result_cache import ResultCache, result_cache_key
+
+
+def _evidence(**overrides) -> RowEvidence:
+    evidence = RowEvidence(
+        dataset_id="use_tax_2023",
+        row_index=3,
+        vendor="Acme Cloud",
+        description="Hosting  services",
+        tax_amount=120.0,
+        tax_base=1200.0,
+        invoice_number="INV-1",
+        po_number="",
+        invoice_1=InvoiceEvidence("inv-1.pdf", "/data/2023/inv-1.pdf", "pdf_text", "Hosting services $1,200"),
+        invoice_2=None,
+    )
+    return replace(evidence, **overrides)
+
+
+def test_cache_key_ignores_dataset_position_but_not_model():
+    signature = {"model": "gpt-5.2", "reasoning_effort": "medium"}
+    key = result_cache_key(_evidence(), signature, knowledge_base="kb1")
+
+    same_row_elsewhere = _evidence(
+        dataset_id="use_tax_2024",
+        row_index=90,
+        vendor="ACME  CLOUD",
+        description="hosting services",
+        invoice_1=InvoiceEvidence("inv-1.pdf", "/data/2024/inv-1.pdf", "pdf_text", "Hosting services $1,200"),
+    )
+    assert result_cache_key(same_row_elsewhere, signature, knowledge_base="kb1") == key
+
+    assert result_cache_key(_evidence(tax_amount=121.0), signature, knowledge_base="kb1") != key
+    assert result_cache_key(_evidence(), {**signature, "model": "gpt-5.2-mini"}, knowledge_base="kb1") != key
+    assert result_cache_key(_evidence(), signature, knowledge_base="kb2") != key
+
+
+def test_cache_key_separates_sales_and_use_tax_datasets():
+    signature = {"model": "gpt-5.2", "reasoning_effort": "medium"}
+    use_key = result_cache_key(_evidence(dataset_id="use_tax_2023"), signature, knowledge_base="kb1")
+    sales_key = result_cache_key(_evidence(dataset_id="sales_2023"), signature, knowledge_base="kb1")
+
+    assert use_key != sales_key
+
+
+def test_cache_entries_expire_per_key(tmp_path: Path):
+    now = [1_000.0]
+    cache = ResultCache(tmp_path / "ledger.sqlite3", ttl_s=60.0, clock=lambda: now[0])
+    source = {"dataset_id": "ds", "row_index": 1}
+    cache.put("short", {"Final_Decision": "REFUND"}, {"model": "m"}, source=source, ttl_s=10.0)
+    cache.put("default", {"Final_Decision": "NO REFUND"}, {"model": "m"}, source=source)
+
+    hit = cache.get("short")
+    assert hit is not None and hit.result == {"Final_Decision": "REFUND"}
+    assert hit.hit_metadata()["source"] == source
+
+    now[0] += 30.0
+    assert cache.get("short") is None
+    assert cache.get("default") is not None
+    assert cache.stats()["expired"] == 1
+    assert cache.purge_expired() == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_pipeline_reuses_cached_results_across_runs(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(pipeline, "RUNS_DIR", tmp_path / "runs")
+    spec = WorkloadSpec(rows=4, vendors=2, invoice_pool=4)
+    config_path = generate_workload(tmp_path / "workload", spec)
+    config = get_dataset_config(spec.dataset_id, config_path=config_path)
+    analyzer, openai_client, _ = build_fake_analyzer(BenchmarkSettings())
+
+    def run(snapshot: str):
+        options = AnalyzeOptions(
+            dataset_id=spec.dataset_id,
+            limit=10,
+            write_output=False,
+            resume=False,
+            ledger_path=tmp_path / "ledger.sqlite3",
+            config_path=config_path,
+        )
+        session = DatasetSession(config, snapshot_dir=tmp_path / snapshot)
+        return analyze_dataset(options, session=session, analyzer=analyzer)
+
+    first = run("first")
+    assert first["status_counts"]["ok"] == 4
+    assert first["result_cache"] == {"enabled": True, "hits": 0, "stored": 4}
+    assert first["memory"] is None
+    calls = openai_client.calls["responses"]
+
+    second = run("second")
+    assert second["status_counts"]["cached"] == 4
+    assert second["result_cache"]["hits"] == 4
+    assert second["token_usage"]["input_tokens"] == 0
+    assert openai_client.calls["responses"] == calls
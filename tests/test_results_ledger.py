@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+import pytest
+import yaml
+
+import refund_engine.pipeline as pipeline
+from refund_engine.benchmarking import BenchmarkSettings, WorkloadSpec, build_fake_analyzer, generate_workload
+from refund_engine.pipeline import AnalyzeOptions, analyze_dataset, export_dataset_output, validate_dataset_output
+from refund_engine.results_ledger import ResultsLedger
+
+
+def test_ledger_keeps_latest_result_per_row(tmp_path: Path):
+    ledger = ResultsLedger(tmp_path / "ledger.sqlite3")
+    ledger.append("ds", "run-1", 4, "fallback_review", {"Final_Decision": "REVIEW", "Estimated_Refund": 0.0})
+    ledger.append("ds", "run-1", 2, "ok", {"Final_Decision": "REFUND", "Estimated_Refund": 12.5})
+    ledger.append("ds", "run-2", 4, "retry_ok", {"Final_Decision": "REFUND", "Estimated_Refund": 7.5})
+    ledger.append("other", "run-2", 1, "ok", {"Final_Decision": "REFUND"})
+
+    latest = ledger.latest_results("ds")
+    assert list(latest) == [2, 4]
+    assert latest[4]["Estimated_Refund"] == 7.5
+    assert ledger.completed_rows("ds") == {2, 4}
+
+    summary = ledger.summary("ds")
+    assert summary["rows"] == 2
+    assert summary["runs"] == 2
+    assert summary["decision_counts"] == {"REFUND": 2}
+    assert summary["estimated_refund_total"] == 20.0
+
+
+def test_ledger_writer_commits_in_batches(tmp_path: Path):
+    ledger = ResultsLedger(tmp_path / "ledger.sqlite3")
+    writer = ledger.writer(commit_every=3)
+    for row in range(4):
+        writer.append("ds", "run-1", row, "ok", {"Final_Decision": "REFUND"})
+    # The fourth row waits for the next batch.
+    assert ledger.completed_rows("ds") == {0, 1, 2}
+    writer.close()
+    assert ledger.completed_rows("ds") == {0, 1, 2, 3}
+
+
+class _InterruptedAnalyzer:
+    """Answers `rows` rows, then behaves like Ctrl-C."""
+
+    def __init__(self, inner, rows: int):
+        self.inner = inner
+        self.rows = rows
+
+    def analyze_row(self, evidence):
+        if self.rows == 0:
+            raise KeyboardInterrupt
+        self.rows -= 1
+        return self.inner.analyze_row(evidence)
+
+    def repair_row(self, evidence, metadata, validation_errors):
+        return self.inner.repair_row(evidence, metadata, validation_errors)
+
+
+def test_interrupted_run_keeps_finished_rows_in_ledger(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(pipeline, "RUNS_DIR", tmp_path / "runs")
+    spec = WorkloadSpec(rows=5, vendors=2, invoice_pool=4)
+    config_path = generate_workload(tmp_path / "workload", spec)
+    analyzer = _InterruptedAnalyzer(build_fake_analyzer(BenchmarkSettings())[0], rows=3)
+    options = AnalyzeOptions(
+        dataset_id=spec.dataset_id,
+        limit=5,
+        write_output=False,
+        use_cache=False,
+        ledger_path=tmp_path / "ledger.sqlite3",
+        config_path=config_path,
+    )
+
+    with pytest.raises(KeyboardInterrupt):
+        analyze_dataset(options, analyzer=analyzer)
+
+    assert len(ResultsLedger(tmp_path / "ledger.sqlite3").completed_rows(spec.dataset_id)) == 3
+    (run_log,) = (tmp_path / "runs").glob("*.jsonl")
+    last = json.loads(run_log.read_text().splitlines()[-1])
+    assert last["type"] == "summary" and last["aborted"] is True
+    assert last["selected_rows"] == 4
+
+
+def test_export_materializes_output_from_ledger(tmp_path: Path):
+    source = tmp_path / "source.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws.append(["Vendor", "Tax", "Inv", "Notes"])
+    ws.append(["A", 1, "a.pdf", None])
+    ws.append(["B", 2, "b.pdf", None])
+    wb.save(source)
+    config_path = tmp_path / "datasets.yaml"
+    config_path.write_text(
+        yaml.safe_dump(
+            {
+                "datasets": {
+                    "ds": {
+                        "source_file": str(source),
+                        "output_file": str(tmp_path / "output.xlsx"),
+                        "sheet_name": "Data",
+                        "invoice_path": str(tmp_path),
+                        "columns": {
+                            "vendor": "Vendor",
+                            "tax_amount": "Tax",
+                            "invoice_1": "Inv",
+                            "analysis_col": "Notes",
+                        },
+                    }
+                }
+            }
+        )
+    )
+    ledger_path = tmp_path / "ledger.sqlite3"
+    ResultsLedger(ledger_path).append("ds", "run-1", 1, "ok", {"Final_Decision": "REFUND"})
+
+    result = export_dataset_output("ds", config_path=config_path, ledger_path=ledger_path)
+
+    assert result["ok"] and result["exported_rows"] == 1
+    ws = load_workbook(tmp_path / "output.xlsx")["Data"]
+    headers = [cell.value for cell in ws[1]]
+    assert ws.cell(row=3, column=headers.index("Final_Decision") + 1).value == "REFUND"
+
+    report = validate_dataset_output("ds", config_path=config_path, ledger_path=ledger_path)
+    assert report["source"] == "ledger"
+    assert report["checked_rows"] == 1
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from refund_engine.datasets import get_dataset_config, select_rows
+from refund_engine.row_selection import RowRanges, default_fields, parse_selection, selection_mask
+from refund_engine.web_analysis import parse_row_selection
+
+
+FIELDS = default_fields({"vendor": "Vendor", "tax_amount": "Tax", "analysis_col": "Notes", "po_number": None})
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Vendor": ["Oracle America", "ORACLE Corp", "Acme", "oracle", None],
+            "Tax": ["$5,000.00", 7200, "12", None, "9000"],
+            "Notes": [None, "done", "", "  ", None],
+            "Final_Decision": [None, "REFUND", None, None, "review"],
+        },
+        index=[10, 11, 12, 13, 14],
+    )
+
+
+def _rows(expression: str) -> list[int]:
+    df = _frame()
+    return df.index[selection_mask(parse_selection(expression), df, FIELDS)].tolist()
+
+
+def test_ranges_are_merged_intervals():
+    selection = parse_selection("20-25, 3, 0-99999, 100000")
+    assert selection == RowRanges(((0, 100000),))
+    assert parse_row_selection("1,3-5,9,5-4", max_rows=20) == [1, 3, 4, 5, 9]
+    assert len(parse_row_selection("0-99999", max_rows=1_000_000)) == 100_000
+    with pytest.raises(ValueError):
+        parse_row_selection('vendor~"x"', max_rows=10)
+
+
+def test_predicates_compile_to_one_mask():
+    assert _rows('vendor~"ORACLE" and tax_amount>=5000 and unanalyzed') == [10]
+    assert _rows('vendor~"oracle" and not unanalyzed') == [11]
+    assert _rows('decision="REVIEW" or 12-13') == [12, 13, 14]
+    assert _rows("(10, 12 or analyzed) and tax_amount < 8000") == [10, 11, 12]
+    assert _rows('vendor != "acme" and tax_amount > 6000') == [11, 14]
+    # Unmapped fields match nothing; unknown fields are an error.
+    assert _rows('po_number="1"') == []
+    with pytest.raises(ValueError, match="Unknown field"):
+        _rows('buyer~"x"')
+    with pytest.raises(ValueError):
+        parse_selection('tax_amount >= "big"')
+
+
+def test_select_rows_uses_the_expression_evaluator():
+    config = get_dataset_config("use_tax_2024")
+    cols = config.columns
+    df = pd.DataFrame(
+        {
+            cols.vendor: ["Oracle", "Oracle", "Acme", "Oracle"],
+            cols.tax_amount: ["6,000", "100", "9000", "8000"],
+            cols.analysis_col: ["", "", "", "seen"],
+        }
+    )
+    selected = select_rows(df, config, where='vendor~"oracle" and tax_amount>=5000', limit=10)
+    assert list(selected.index) == [0, 3]
+    assert list(select_rows(df, config, where="0-2", vendor="oracle", min_amount=50).index) == [0, 1]
+    assert list(select_rows(df, config, where="unanalyzed", row_index=3).index) == []
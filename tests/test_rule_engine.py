@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import refund_engine.vendor_profiles as vendor_profiles
+from refund_engine.analysis.openai_analyzer import RowEvidence
+from refund_engine.analysis.rule_engine import (
+    RULE_REFUND_SOURCE,
+    LabelledRow,
+    classify_row,
+    evaluate_rules,
+)
+from refund_engine.validation_rules import validate_output_row
+
+
+def _profile(total: int, claimed: int, agree: int, refund_basis: str = "MPU") -> dict:
+    return {
+        "total_rows": total,
+        "claimed_count": claimed,
+        "pass_count": total - claimed,
+        "dominant_tax_category": {"value": "License", "count": agree},
+        "dominant_product_type": {"value": "License", "count": agree},
+        "dominant_refund_basis": {"value": refund_basis, "count": agree},
+        "dominant_methodology": {"value": "User location", "count": agree},
+        "methodology_mix": {"User location": {"count": agree, "avg_pct": 0.8}},
+    }
+
+
+def _use_profiles(monkeypatch, vendors: dict):
+    monkeypatch.setattr(vendor_profiles, "_CACHE", vendors)
+    monkeypatch.setattr(vendor_profiles, "_VENDOR_NAMES", list(vendors))
+
+
+def _evidence(vendor: str, **overrides) -> RowEvidence:
+    fields = dict(
+        dataset_id="use_tax_2024",
+        row_index=7,
+        vendor=vendor,
+        description="Data subscription",
+        tax_amount=250.0,
+        tax_base=None,
+        invoice_number="INV-7",
+        po_number=None,
+        invoice_1=None,
+        invoice_2=None,
+    )
+    fields.update(overrides)
+    return RowEvidence(**fields)
+
+
+def test_classify_row_decides_consensus_vendor(monkeypatch):
+    _use_profiles(monkeypatch, {"DATA CO": _profile(total=50, claimed=49, agree=48)})
+
+    decision = classify_row(_evidence("Data Co"))
+
+    assert decision.decided
+    result = decision.result
+    assert result["Final_Decision"] == "REFUND"
+    assert result["Refund_Source"] == RULE_REFUND_SOURCE
+    assert result["Estimated_Refund"] == 200.0
+    assert "WAC 458-20-15502" in result["Citation"]
+    assert result["Sales_Use_Tax"] == "Use"
+    assert "- Tax Type: Use\n" in result["AI_Reasoning"]
+    assert validate_output_row(result) == []
+    assert classify_row(_evidence("Data Co", dataset_id="sales_2024")).result["Sales_Use_Tax"] == "Sales"
+    assert decision.metadata["scenario"] == "multi_point_use"
+
+
+def test_classify_row_defers_ambiguous_rows(monkeypatch):
+    _use_profiles(
+        monkeypatch,
+        {
+            "DATA CO": _profile(total=50, claimed=49, agree=48),
+            "SMALL CO": _profile(total=12, claimed=12, agree=12),
+            "MIXED CO": _profile(total=50, claimed=49, agree=30),
+            "SERVICES CO": _profile(total=50, claimed=50, agree=50, refund_basis="OOS services"),
+        },
+    )
+
+    reasons = {
+        vendor: classify_row(_evidence(vendor)).metadata["reason"]
+        for vendor in ("SMALL CO", "MIXED CO", "SERVICES CO", "UNKNOWN VENDOR")
+    }
+    anomaly = classify_row(_evidence("DATA CO", rate=0.2, jurisdiction="WA"))
+
+    assert reasons == {
+        "SMALL CO": "profile_not_high_confidence",
+        "MIXED CO": "profile_disagreement",
+        "SERVICES CO": "refund_basis_not_rule_backed",
+        "UNKNOWN VENDOR": "no_vendor_profile",
+    }
+    assert anomaly.metadata["reason"] == "rate_anomaly"
+
+
+def test_evaluate_rules_reports_precision(monkeypatch):
+    _use_profiles(monkeypatch, {"DATA CO": _profile(total=50, claimed=49, agree=48)})
+    rows = [
+        LabelledRow("DATA CO", "subscription", 100.0, True, "License", "MPU", "User location"),
+        LabelledRow("DATA CO", "subscription", 100.0, False, "License", "", "Headcount"),
+        LabelledRow("OTHER CO", "hardware", 100.0, False),
+    ]
+
+    report = evaluate_rules(rows)
+
+    assert report["decided"] == 2
+    assert report["coverage"] == round(2 / 3, 4)
+    assert report["decision_precision"] == 0.5
+    assert report["field_precision"]["methodology"] == 0.5
+    assert report["deferred"] == {"no_vendor_profile": 1}
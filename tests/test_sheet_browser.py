@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+import refund_engine.workbook_repository as workbook_repository
+from refund_engine.sheet_browser import SheetFilter, filtered_row_indices, sheet_page, sheet_shape
+from refund_engine.workbook_repository import compact_repository, import_uploaded_workbook, read_sheet_table
+
+
+def _import(tmp_path: Path) -> tuple[str, str]:
+    df = pd.DataFrame(
+        {
+            "Vendor": [f"Acme {i}" if i % 3 == 0 else f"Globex {i}" for i in range(25)],
+            "Tax": [float(i * 10) for i in range(25)],
+            # Mixed numbers and text, as Excel columns often are.
+            "PO": [i if i % 2 else f"PO-{i}" for i in range(25)],
+            "Notes": ["done" if i < 5 else None for i in range(25)],
+            "Final_Decision": ["REFUND" if i < 3 else ("NO REFUND" if i < 5 else None) for i in range(25)],
+        }
+    )
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="Data", index=False)
+    ref = import_uploaded_workbook(buffer.getvalue(), filename="big.xlsx", root=tmp_path)
+    return ref.workbook_id, ref.version_id
+
+
+def test_sheet_page_filters_and_reads_only_the_window(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(workbook_repository, "SHEET_CACHE_ROW_GROUP_SIZE", 4)
+    workbook_id, version_id = _import(tmp_path)
+
+    columns, rows = sheet_shape(workbook_id, version_id, "Data", root=tmp_path)
+    assert columns == ["Vendor", "Tax", "PO", "Notes", "Final_Decision"]
+    assert rows == 25
+
+    flt = SheetFilter(vendor_col="Vendor", vendor_contains="acme", amount_col="Tax", min_amount=30, unanalyzed_col="Notes")
+    assert filtered_row_indices(workbook_id, version_id, "Data", flt, root=tmp_path) == [6, 9, 12, 15, 18, 21, 24]
+
+    page = sheet_page(workbook_id, version_id, "Data", flt, page=1, page_size=3, root=tmp_path)
+    assert page.page_count == 3
+    assert page.rows.index.tolist() == [15, 18, 21]
+    assert page.rows["Vendor"].tolist() == ["Acme 15", "Acme 18", "Acme 21"]
+    assert page.rows["PO"].tolist() == ["15", "PO-18", "21"]
+
+    last = sheet_page(workbook_id, version_id, "Data", flt, page=99, page_size=3, root=tmp_path)
+    assert last.page == 2 and last.rows.index.tolist() == [24]
+
+    decided = SheetFilter(decision_col="Final_Decision", decision="no refund")
+    assert sheet_page(workbook_id, version_id, "Data", decided, root=tmp_path).matched_rows == [3, 4]
+    assert sheet_page(workbook_id, version_id, "Data", root=tmp_path).rows.index.tolist() == list(range(25))
+
+
+def test_sheet_cache_projects_columns_and_is_compacted(tmp_path: Path):
+    workbook_id, version_id = _import(tmp_path)
+    df = read_sheet_table(workbook_id, version_id, "Data", columns=["Vendor", "Tax"], root=tmp_path)
+    assert list(df.columns) == ["Vendor", "Tax"]
+    assert len(df) == 25
+
+    report = compact_repository(root=tmp_path, keep_materialized=0, materialized_grace_s=0)
+    assert report["sheet_caches_removed"] == 1
+    # Rebuilt on demand after compaction.
+    assert sheet_shape(workbook_id, version_id, "Data", root=tmp_path)[1] == 25
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from refund_engine.timing import profile_run_log, record_spans, span
+
+
+def test_spans_accumulate_only_inside_recorder():
+    with span("outside"):
+        pass
+
+    with record_spans() as spans:
+        with span("invoice.pdf_text"):
+            pass
+        with span("invoice.pdf_text"):
+            pass
+        with record_spans() as inner:
+            with span("openai.responses"):
+                pass
+
+    assert set(spans) == {"invoice.pdf_text"}
+    assert set(inner) == {"openai.responses"}
+    assert spans["invoice.pdf_text"] >= 0.0
+
+
+def test_profile_run_log_reports_percentiles_and_shares(tmp_path: Path):
+    events = [
+        {"type": "row", "row_index": i, "vendor": "V", "status": "ok", "duration_ms": 10.0 * (i + 1),
+         "timings_ms": {"openai.responses": 8.0 * (i + 1), "invoice.pdf_text": 2.0 * (i + 1)}}
+        for i in range(10)
+    ]
+    events[9]["timings_ms"]["retry.openai.responses"] = 110.0
+    events[9]["duration_ms"] = 210.0
+    summary = {"type": "summary", "ok": True, "timings_ms": {"output.write": 30.0}}
+    path = tmp_path / "run.jsonl"
+    path.write_text("\n".join(json.dumps(e) for e in [*events, summary]) + "\n")
+
+    report = profile_run_log(path, top=3)
+
+    assert report["rows"] == 10
+    stage = report["stages"]["openai.responses"]
+    assert stage["count"] == 10
+    assert stage["p50_ms"] == 40.0
+    assert stage["p95_ms"] == 80.0
+    assert stage["p99_ms"] == 80.0
+    assert report["stages"]["output.write"]["total_ms"] == 30.0
+    # openai = 440 + 110, invoice = 110, output = 30
+    assert report["subsystem_share"]["openai"] == round(550 / 690, 4)
+    assert [row["row_index"] for row in report["slowest_rows"]] == [9, 8, 7]
+    assert report["slowest_rows"][0]["slowest_stage"] == "retry.openai.responses"
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from refund_engine.validation_rules import (
+    auto_repair_output_row,
     normalize_final_decision,
     normalize_methodology,
     validate_output_row,
@@ -269,3 +270,52 @@ def test_validate_normalizes_before_vocabulary_check():
     }
     errors = validate_output_row(row)
     assert not any("controlled vocabulary" in err for err in errors)
+
+
+def test_auto_repair_snaps_vocabulary_drift():
+    row = {
+        "Final_Decision": "REFUND",
+        "Product_Type": "HW/SW Maintenance",
+        "Refund_Basis": "Out of state services",
+        "Tax_Category": "software maintenance",
+        "Methodology": "user locations",
+        "Sales_Use_Tax": "Use Tax",
+        "Citation": "rcw 82.08.0208 / WAC 458 -20-15502",
+        "Confidence": "85%",
+        "AI_Reasoning": "TAX ANALYSIS:\n- Product Type: HW/SW Maintenance\n- Tax Type: Use Tax\n",
+    }
+
+    repaired, repairs = auto_repair_output_row(row)
+
+    assert repaired["Product_Type"] == "HW\\SW maintenance"
+    assert repaired["Refund_Basis"] == "OOS services"
+    assert repaired["Tax_Category"] == "Software maintenance"
+    assert repaired["Methodology"] == "User location"
+    assert repaired["Sales_Use_Tax"] == "Use"
+    assert repaired["Citation"] == "RCW 82.08.0208, WAC 458-20-15502"
+    assert repaired["Confidence"] == 0.85
+    assert "- Product Type: HW\\SW maintenance\n" in repaired["AI_Reasoning"]
+    assert {repair["field"] for repair in repairs} == {
+        "Product_Type", "Refund_Basis", "Tax_Category", "Methodology",
+        "Sales_Use_Tax", "Citation", "Confidence",
+    }
+    assert row["Product_Type"] == "HW/SW Maintenance"
+
+
+def test_auto_repair_leaves_unmappable_values():
+    row = {"Product_Type": "Widget", "Refund_Basis": "OOS", "Citation": "RCW 99.99.999", "Confidence": 1.4}
+
+    repaired, repairs = auto_repair_output_row(row)
+
+    assert repaired["Product_Type"] == "Widget"
+    assert repaired["Refund_Basis"] == "OOS"
+    assert repaired["Citation"] == "RCW 99.99.999"
+    assert repairs == [{"field": "Confidence", "from": 1.4, "to": 1.0, "rule": "clamped"}]
+
+
+def test_auto_repair_keeps_in_range_confidence():
+    for confidence in (0.87654, "0.87654", 1, 0.0):
+        repaired, repairs = auto_repair_output_row({"Confidence": confidence})
+
+        assert repaired["Confidence"] == confidence
+        assert repairs == []
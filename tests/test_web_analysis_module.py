@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from refund_engine.web_analysis import parse_row_selection, suggest_column_mapping
+from refund_engine.constants import AI_OUTPUT_COLUMNS
+from refund_engine.web_analysis import ColumnMapping, parse_row_selection, row_delta, suggest_column_mapping
 
 
 def test_parse_row_selection_handles_ranges_and_values():
@@ -29,3 +30,22 @@ def test_suggest_column_mapping_prefers_known_names():
     assert mapping["tax_amount"] == "Tax Remit"
     assert mapping["invoice_1"] == "Inv-1PDF"
     assert mapping["analysis_col"] == "KOM Analysis & Notes"
+
+
+def test_row_delta_writes_analysis_column_only_when_the_sheet_has_it():
+    mapping = ColumnMapping(
+        vendor="Vendor",
+        tax_amount="Tax",
+        description="Description",
+        invoice_1="Invoice",
+        analysis_col="Notes",
+    )
+    result = {"Final_Decision": "REFUND", "AI_Reasoning": "DECISION: REFUND"}
+
+    with_notes = row_delta(result, mapping, ["Vendor", "Notes"])
+    assert with_notes["Notes"] == "DECISION: REFUND"
+    assert with_notes["Final_Decision"] == "REFUND"
+
+    without_notes = row_delta(result, mapping, ["Vendor"])
+    assert "Notes" not in without_notes
+    assert set(without_notes) == set(AI_OUTPUT_COLUMNS)
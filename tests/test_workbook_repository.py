@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
+import zipfile
 
 import pandas as pd
+import yaml
+
+from refund_engine.workbook_catalog import import_yaml_metadata
 
 from refund_engine.workbook_repository import (
     get_invoice_upload_dir,
@@ -14,6 +19,7 @@ from refund_engine.workbook_repository import (
     list_workbooks,
     read_diff_summary,
     read_sheet_dataframe,
+    write_sheet_updates_as_new_version,
     write_updated_sheet_as_new_version,
 )
 
@@ -110,6 +116,13 @@ def test_import_uploaded_invoice_files_and_list(tmp_path: Path):
     assert "INV-1001.pdf" in names
     assert "INV-1002.pdf" in names
 
+    # Files copied in or deleted outside the upload form are picked up.
+    (upload_dir / "INV-1003.pdf").write_bytes(b"dropped-in")
+    (upload_dir / "INV-1001.pdf").unlink()
+    listed = {row["filename"]: row for row in list_uploaded_invoice_files(root=tmp_path)}
+    assert set(listed) == {"INV-1002.pdf", "INV-1003.pdf"}
+    assert listed["INV-1003.pdf"]["size_bytes"] == len(b"dropped-in")
+
 
 def test_import_uploaded_invoice_files_without_overwrite_creates_unique_name(tmp_path: Path):
     import_uploaded_invoice_files([("INV-2001.pdf", b"original")], root=tmp_path, overwrite=True)
@@ -117,3 +130,278 @@ def test_import_uploaded_invoice_files_without_overwrite_creates_unique_name(tmp
 
     assert len(stored) == 1
     assert stored[0].name == "INV-2001_1.pdf"
+
+
+def test_write_updated_sheet_preserves_other_sheets_formatting_and_formulas(tmp_path: Path):
+    from openpyxl import Workbook, load_workbook
+    from openpyxl.styles import Font
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws.append(["Vendor", "Tax Remit"])
+    ws.append(["A", 10])
+    ws.append(["B", 20])
+    summary = wb.create_sheet("Summary")
+    summary["A1"] = "Total"
+    summary["A1"].font = Font(bold=True)
+    summary["B1"] = "=SUM(Data!B2:B3)"
+    buffer = BytesIO()
+    wb.save(buffer)
+
+    ref = import_uploaded_workbook(buffer.getvalue(), filename="calc.xlsx", root=tmp_path)
+    df = read_sheet_dataframe(ref.workbook_id, ref.version_id, "Data", root=tmp_path)
+    df.loc[1, "Tax Remit"] = 99
+    df["Final_Decision"] = None
+    df.loc[0, "Final_Decision"] = "REFUND"
+
+    ref2 = write_updated_sheet_as_new_version(
+        ref.workbook_id, ref.version_id, "Data", df, root=tmp_path
+    )
+
+    saved = load_workbook(ref2.file_path)
+    assert saved["Summary"]["B1"].value == "=SUM(Data!B2:B3)"
+    assert saved["Summary"]["A1"].font.b is True
+    out = pd.read_excel(ref2.file_path, sheet_name="Data")
+    assert out["Tax Remit"].tolist() == [10, 99]
+    assert out["Final_Decision"].tolist()[0] == "REFUND"
+
+
+def test_identical_uploads_share_one_blob(tmp_path: Path):
+    from refund_engine.blob_store import iter_blobs
+
+    data = _xlsx_bytes(pd.DataFrame({"Vendor": ["A"], "Tax Remit": [1]}))
+    import_uploaded_workbook(data, filename="a.xlsx", workbook_name="Book", root=tmp_path)
+    import_uploaded_workbook(data, filename="a.xlsx", workbook_name="Book", root=tmp_path)
+
+    assert len(list(iter_blobs(tmp_path))) == 1
+
+
+def test_delta_version_rematerializes_after_cache_removed(tmp_path: Path):
+    base_df = pd.DataFrame({"Vendor": ["A", "B"], "Tax Remit": [10, 20]})
+    ref = import_uploaded_workbook(_xlsx_bytes(base_df), filename="d.xlsx", root=tmp_path)
+    df = read_sheet_dataframe(ref.workbook_id, ref.version_id, "Sheet1", root=tmp_path)
+    df["Final_Decision"] = ["REFUND", None]
+
+    ref2 = write_updated_sheet_as_new_version(ref.workbook_id, ref.version_id, "Sheet1", df, root=tmp_path)
+    entry = get_workbook_metadata(ref.workbook_id, root=tmp_path)["versions"][-1]
+    assert entry["parent_version_id"] == ref.version_id
+    assert entry["delta_blob"]
+
+    ref2.file_path.unlink()
+    out = read_sheet_dataframe(ref.workbook_id, ref2.version_id, "Sheet1", root=tmp_path)
+    assert out["Final_Decision"].tolist()[0] == "REFUND"
+
+    diff = read_diff_summary(ref.workbook_id, ref2.version_id, root=tmp_path)
+    assert diff["per_sheet"][0]["added_columns"] == ["Final_Decision"]
+
+
+def test_sheet_updates_are_saved_as_cell_delta(tmp_path: Path):
+    base_df = pd.DataFrame({"Vendor": ["A", "B", "C"], "Tax Remit": [10, 20, 30]})
+    ref = import_uploaded_workbook(_xlsx_bytes(base_df), filename="d.xlsx", root=tmp_path)
+
+    updates = {1: {"Tax Remit": 25, "Final_Decision": "REFUND"}, 2: {"Final_Decision": "NO REFUND"}}
+    ref2 = write_sheet_updates_as_new_version(ref.workbook_id, ref.version_id, "Sheet1", updates, root=tmp_path)
+    entry = get_workbook_metadata(ref.workbook_id, root=tmp_path)["versions"][-1]
+    assert entry["parent_version_id"] == ref.version_id
+    assert entry["delta_blob"]
+    # Saving writes only the delta; the workbook file is built on first read.
+    assert not Path(entry["stored_path"]).exists()
+
+    out = read_sheet_dataframe(ref.workbook_id, ref2.version_id, "Sheet1", root=tmp_path)
+    assert Path(entry["stored_path"]).exists()
+    assert out["Vendor"].tolist() == ["A", "B", "C"]
+    assert out["Tax Remit"].tolist() == [10, 25, 30]
+    assert out["Final_Decision"].tolist()[1:] == ["REFUND", "NO REFUND"]
+    assert pd.isna(out["Final_Decision"].iloc[0])
+
+    diff = read_diff_summary(ref.workbook_id, ref2.version_id, root=tmp_path)
+    assert diff["per_sheet"][0]["added_columns"] == ["Final_Decision"]
+
+
+def test_dates_and_offset_headers_survive_sheet_updates(tmp_path: Path):
+    base_df = pd.DataFrame({"Vendor": ["A", "B"]})
+    ref = import_uploaded_workbook(_xlsx_bytes(base_df), filename="d.xlsx", root=tmp_path)
+    updates = {0: {"Reviewed": pd.Timestamp("2024-03-05")}}
+    ref2 = write_sheet_updates_as_new_version(ref.workbook_id, ref.version_id, "Sheet1", updates, root=tmp_path)
+    ref2.file_path.unlink()
+    out = read_sheet_dataframe(ref.workbook_id, ref2.version_id, "Sheet1", root=tmp_path)
+    assert out["Reviewed"].iloc[0] == pd.Timestamp("2024-03-05")
+
+    # pandas counts rows from sheet row 1, so a header lower down is not patched as a delta.
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        base_df.to_excel(writer, sheet_name="Sheet1", index=False, startrow=2)
+    ref3 = import_uploaded_workbook(buffer.getvalue(), filename="o.xlsx", root=tmp_path)
+    df = read_sheet_dataframe(ref3.workbook_id, ref3.version_id, "Sheet1", root=tmp_path)
+    ref4 = write_sheet_updates_as_new_version(
+        ref3.workbook_id, ref3.version_id, "Sheet1", {len(df) - 1: {"Notes": "last"}}, root=tmp_path
+    )
+    assert not get_workbook_metadata(ref3.workbook_id, root=tmp_path)["versions"][-1].get("delta_blob")
+    out = read_sheet_dataframe(ref3.workbook_id, ref4.version_id, "Sheet1", root=tmp_path)
+    assert out["Notes"].tolist()[-1] == "last"
+
+
+def test_compact_repository_rebases_and_collects_unreferenced_blobs(tmp_path: Path):
+    from refund_engine.blob_store import iter_blobs
+    from refund_engine.workbook_repository import compact_repository
+
+    ref = import_uploaded_workbook(
+        _xlsx_bytes(pd.DataFrame({"Vendor": ["A"], "Tax Remit": [1]})), filename="c.xlsx", root=tmp_path
+    )
+    current = ref
+    for value in (2, 3):
+        df = read_sheet_dataframe(ref.workbook_id, current.version_id, "Sheet1", root=tmp_path)
+        df.loc[0, "Tax Remit"] = value
+        current = write_updated_sheet_as_new_version(
+            ref.workbook_id, current.version_id, "Sheet1", df, root=tmp_path
+        )
+
+    held = ref.file_path
+    report = compact_repository(root=tmp_path, keep_versions=1)
+
+    versions = get_workbook_metadata(ref.workbook_id, root=tmp_path)["versions"]
+    assert [v["version_id"] for v in versions] == [current.version_id]
+    assert report["versions_dropped"] == 2
+    assert report["versions_rebased"] == 1
+    assert len(list(iter_blobs(tmp_path))) == 1
+    # Recently handed-out files outlive their version until the grace period ends.
+    assert held.exists()
+    assert report["materialized_files_removed"] == 0
+    report = compact_repository(root=tmp_path, materialized_grace_s=0)
+    assert not held.exists()
+    assert report["materialized_files_removed"] >= 1
+    out = read_sheet_dataframe(ref.workbook_id, current.version_id, "Sheet1", root=tmp_path)
+    assert out["Tax Remit"].tolist() == [3]
+
+
+def test_compaction_keeps_parents_of_versions_appended_meanwhile(tmp_path: Path, monkeypatch):
+    import refund_engine.workbook_repository as repository
+
+    ref = import_uploaded_workbook(
+        _xlsx_bytes(pd.DataFrame({"Vendor": ["A"], "Tax Remit": [1]})), filename="c.xlsx", root=tmp_path
+    )
+    middle = write_sheet_updates_as_new_version(
+        ref.workbook_id, ref.version_id, "Sheet1", {0: {"Tax Remit": 2}}, root=tmp_path
+    )
+    write_sheet_updates_as_new_version(ref.workbook_id, middle.version_id, "Sheet1", {0: {"Tax Remit": 3}}, root=tmp_path)
+
+    appended = []
+    original = repository._materialize
+
+    def materialize_and_append(*args, **kwargs):
+        path = original(*args, **kwargs)
+        if not appended:
+            appended.append(None)
+            # Another writer branches off a version compaction is about to drop.
+            appended[0] = write_sheet_updates_as_new_version(
+                ref.workbook_id, middle.version_id, "Sheet1", {0: {"Tax Remit": 4}}, root=tmp_path
+            )
+        return path
+
+    monkeypatch.setattr(repository, "_materialize", materialize_and_append)
+    report = repository.compact_repository(root=tmp_path, keep_versions=1)
+    monkeypatch.setattr(repository, "_materialize", original)
+
+    ids = [v["version_id"] for v in get_workbook_metadata(ref.workbook_id, root=tmp_path)["versions"]]
+    assert middle.version_id in ids and ref.version_id in ids
+    assert report["versions_dropped"] == 0
+    appended[0].file_path.unlink()
+    out = read_sheet_dataframe(ref.workbook_id, appended[0].version_id, "Sheet1", root=tmp_path)
+    assert out["Tax Remit"].tolist() == [4]
+
+
+def test_legacy_yaml_metadata_is_imported_into_catalog(tmp_path: Path):
+    legacy_dir = tmp_path / "workbooks" / "old-book"
+    (legacy_dir / "versions").mkdir(parents=True)
+    stored = legacy_dir / "versions" / "20240101_000000_000000_old.xlsx"
+    stored.write_bytes(_xlsx_bytes(pd.DataFrame({"Vendor": ["A"]})))
+    (legacy_dir / "metadata.yaml").write_text(
+        yaml.safe_dump(
+            {
+                "workbook_id": "old-book",
+                "display_name": "Old Book",
+                "created_at": "2024-01-01T00:00:00",
+                "versions": [
+                    {
+                        "version_id": "20240101_000000_000000",
+                        "filename": "old.xlsx",
+                        "stored_path": str(stored),
+                        "created_at": "2024-01-01T00:00:00",
+                        "sheet_names": ["Sheet1"],
+                        "diff_summary_path": None,
+                    }
+                ],
+            }
+        )
+    )
+    invoices = tmp_path / "invoices"
+    invoices.mkdir()
+    (invoices / "inv.pdf").write_bytes(b"pdf")
+
+    books = list_workbooks(root=tmp_path)
+    assert [(b["workbook_id"], b["version_count"]) for b in books] == [("old-book", 1)]
+    assert read_sheet_dataframe("old-book", "20240101_000000_000000", "Sheet1", root=tmp_path)["Vendor"].tolist() == ["A"]
+    assert [f["filename"] for f in list_uploaded_invoice_files(root=tmp_path)] == ["inv.pdf"]
+
+    # Re-running the importer does not duplicate anything.
+    assert import_yaml_metadata(tmp_path)["versions"] == 0
+
+
+def test_concurrent_uploads_append_versions_in_order(tmp_path: Path):
+    payloads = [_xlsx_bytes(pd.DataFrame({"Vendor": [f"V{i}"]})) for i in range(6)]
+
+    def upload(data: bytes):
+        return import_uploaded_workbook(data, filename="use-tax.xlsx", workbook_name="Shared", root=tmp_path)
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        refs = list(pool.map(upload, payloads))
+
+    versions = get_workbook_metadata("shared", root=tmp_path)["versions"]
+    assert sorted(v["version_id"] for v in versions) == sorted(r.version_id for r in refs)
+    assert list_workbooks(root=tmp_path)[0]["version_count"] == 6
+
+
+def test_sheet_updates_fall_back_for_prefixed_worksheet_xml(tmp_path: Path):
+    main_ns = b"http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    source = BytesIO(_xlsx_bytes(pd.DataFrame({"Vendor": ["A", "B"]})))
+    prefixed = BytesIO()
+    with zipfile.ZipFile(source) as zin, zipfile.ZipFile(prefixed, "w") as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data = data.replace(b"<sheetData>", b'<x:sheetData xmlns:x="' + main_ns + b'">')
+                data = data.replace(b"</sheetData>", b"</x:sheetData>")
+            zout.writestr(item, data)
+    ref = import_uploaded_workbook(prefixed.getvalue(), filename="p.xlsx", root=tmp_path)
+
+    ref2 = write_sheet_updates_as_new_version(
+        ref.workbook_id, ref.version_id, "Sheet1", {1: {"Notes": "checked"}}, root=tmp_path
+    )
+
+    assert not get_workbook_metadata(ref.workbook_id, root=tmp_path)["versions"][-1].get("delta_blob")
+    out = read_sheet_dataframe(ref.workbook_id, ref2.version_id, "Sheet1", root=tmp_path)
+    assert out["Notes"].tolist()[1] == "checked"
+
+
+def test_reused_blob_survives_a_concurrent_sweep(tmp_path: Path, monkeypatch):
+    import os
+
+    import refund_engine.workbook_repository as repository
+    from refund_engine.blob_store import blob_path, iter_blobs, put_bytes
+
+    digest = put_bytes(tmp_path, b"orphan")
+    os.utime(blob_path(tmp_path, digest), (0, 0))
+
+    def reuse_then_iter(root):
+        # A save deduplicates onto the old orphan while compaction runs.
+        assert put_bytes(root, b"orphan") == digest
+        return iter_blobs(root)
+
+    monkeypatch.setattr(repository, "iter_blobs", reuse_then_iter)
+    assert repository.compact_repository(root=tmp_path)["blobs_removed"] == 0
+    assert blob_path(tmp_path, digest).exists()
+
+    monkeypatch.setattr(repository, "iter_blobs", iter_blobs)
+    os.utime(blob_path(tmp_path, digest), (0, 0))
+    assert repository.compact_repository(root=tmp_path)["blobs_removed"] == 1
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import Path
+import zipfile
+
+from openpyxl import Workbook, load_workbook
+import pandas as pd
+import pytest
+
+from refund_engine.xlsx_patch import (
+    UnsupportedSheetXML,
+    header_row_number,
+    patch_sheet_cells,
+    read_header_row,
+)
+
+
+def _write_workbook(path: Path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Rows"
+    ws.append(["Vendor", "Amount", "Notes"])
+    ws.append(["Acme", 100, "keep"])
+    ws.append(["Globex", 200, "old"])
+    other = wb.create_sheet("Other")
+    other["A1"] = "untouched"
+    wb.save(path)
+
+
+def test_read_header_row_resolves_shared_strings(tmp_path: Path):
+    path = tmp_path / "book.xlsx"
+    _write_workbook(path)
+    assert read_header_row(path, "Rows") == {"Vendor": 1, "Amount": 2, "Notes": 3}
+
+
+def test_patch_sheet_cells_updates_and_adds_headers(tmp_path: Path):
+    src = tmp_path / "book.xlsx"
+    dst = tmp_path / "patched.xlsx"
+    _write_workbook(src)
+
+    result = patch_sheet_cells(
+        src,
+        dst,
+        "Rows",
+        {1: {"Notes": "new & <escaped>", "Decision": "REFUND", "Amount": None}, 9: {"Notes": "x"}},
+        ensure_headers=("Confidence",),
+    )
+
+    assert result.updated_rows == 1
+    assert result.skipped_rows == (9,)
+    assert result.added_headers == ("Confidence", "Decision")
+
+    wb = load_workbook(dst)
+    ws = wb["Rows"]
+    assert [c.value for c in ws[1]] == ["Vendor", "Amount", "Notes", "Confidence", "Decision"]
+    assert ws["C2"].value == "keep"
+    assert ws["C3"].value == "new & <escaped>"
+    assert ws["B3"].value is None
+    assert ws["E3"].value == "REFUND"
+    assert wb["Other"]["A1"].value == "untouched"
+
+
+def test_patch_sheet_cells_can_append_rows(tmp_path: Path):
+    src = tmp_path / "book.xlsx"
+    dst = tmp_path / "patched.xlsx"
+    _write_workbook(src)
+
+    result = patch_sheet_cells(src, dst, "Rows", {3: {"Vendor": "Initech", "Amount": 5.5}}, allow_new_rows=True)
+
+    assert result.updated_rows == 1
+    ws = load_workbook(dst)["Rows"]
+    assert ws["A5"].value == "Initech"
+    assert ws["B5"].value == 5.5
+
+
+def test_patch_sheet_cells_finds_a_header_below_row_one(tmp_path: Path):
+    src = tmp_path / "book.xlsx"
+    dst = tmp_path / "patched.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Rows"
+    ws["A3"], ws["B3"] = "Vendor", "Notes"
+    ws["A4"], ws["A5"] = "Acme", "Globex"
+    wb.save(src)
+
+    assert header_row_number(src, "Rows") == 3
+    assert read_header_row(src, "Rows") == {"Vendor": 1, "Notes": 2}
+    result = patch_sheet_cells(src, dst, "Rows", {1: {"Notes": "seen", "Decision": "REFUND"}})
+
+    assert result.updated_rows == 1
+    ws = load_workbook(dst)["Rows"]
+    assert [c.value for c in ws[3]] == ["Vendor", "Notes", "Decision"]
+    assert ws["B5"].value == "seen" and ws["C5"].value == "REFUND"
+    assert ws["B4"].value is None
+
+
+def test_patch_sheet_cells_writes_dates_as_date_cells(tmp_path: Path):
+    src = tmp_path / "book.xlsx"
+    dst = tmp_path / "patched.xlsx"
+    _write_workbook(src)
+
+    patch_sheet_cells(
+        src,
+        dst,
+        "Rows",
+        {0: {"Reviewed": pd.Timestamp("2024-03-05")}, 1: {"Reviewed": datetime(2024, 3, 6, 14, 30)}},
+    )
+
+    ws = load_workbook(dst)["Rows"]
+    assert ws["D2"].value == datetime(2024, 3, 5) and ws["D2"].is_date
+    assert ws["D3"].value == datetime(2024, 3, 6, 14, 30) and ws["D3"].is_date
+    assert ws["D2"].number_format != ws["D3"].number_format
+    assert ws["A2"].value == "Acme"
+
+
+def test_patch_sheet_cells_validates_rows_and_rejects_prefixed_xml(tmp_path: Path):
+    src = tmp_path / "book.xlsx"
+    dst = tmp_path / "patched.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Rows"
+    ws.append(["Vendor"])
+    ws.append(["Acme"])
+    ws["A4"] = "Globex"  # sheet row 3 is a blank gap
+    wb.save(src)
+
+    with pytest.raises(ValueError, match="0 or greater"):
+        patch_sheet_cells(src, dst, "Rows", {-1: {"Vendor": "x"}})
+
+    result = patch_sheet_cells(src, dst, "Rows", {1: {"Vendor": "gap"}, 2: {"Vendor": "Initech"}})
+    assert result.updated_rows == 1
+    assert result.skipped_rows == (1,)
+    ws = load_workbook(dst)["Rows"]
+    assert ws["A3"].value is None
+    assert ws["A4"].value == "Initech"
+
+    prefixed = tmp_path / "prefixed.xlsx"
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(prefixed, "w") as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data = data.replace(b"<sheetData>", b"<x:sheetData>").replace(b"</sheetData>", b"</x:sheetData>")
+            zout.writestr(item, data)
+    with pytest.raises(UnsupportedSheetXML):
+        patch_sheet_cells(prefixed, dst, "Rows", {0: {"Vendor": "x"}})